@@ -1,881 +1,4679 @@
-import subprocess
-import time
-import logging
-from logging.handlers import RotatingFileHandler
-import sys
-import os
-import random
-import shutil
-import platform
-import getpass
-import json
-import ctypes
-import psutil
-import requests
-import re
-import threading
-import argparse
-import configparser
-from datetime import datetime
-from typing import List, Dict, Optional
-from pathlib import Path
-import hashlib
-import socket
-import getmac
-import urllib.parse
-import ipaddress
-import xml.etree.ElementTree as ET
-
-# Configuration file path
-CONFIG_FILE = "no_trace_config.ini"
-
-# Initialize logging with rotation
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        RotatingFileHandler('no_trace.log', maxBytes=10*1024*1024, backupCount=5),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-logger = logging.getLogger(__name__)
-
-# ASCII Banner
-BANNER = """
-███╗   ██╗ ██████╗    ████████╗██████╗  █████╗  ██████╗███████╗
-████╗  ██║██╔═══██╗   ╚══██╔══╝██╔══██╗██╔══██╗██╔════╝██╔════╝
-██╔██╗ ██║██║   ██║█████╗██║   ██████╔╝███████║██║     █████╗  
-██║╚██╗██║██║   ██║╚════╝██║   ██╔══██╗██╔══██║██║     ██╔══╝  
-██║ ╚████║╚██████╔╝      ██║   ██║  ██║██║  ██║╚██████╗███████╗
-╚═╝  ╚═══╝ ╚═════╝       ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝ ╚═════╝╚══════╝
-"""
-
-# Default configuration
-DEFAULT_CONFIG = {
-    'mullvad': {
-        'account_number': 'YOUR_ACCOUNT_NUMBER_HERE',
-        'rotation_interval': '300',
-        'preferred_countries': 'us,ca,uk',
-        'connection_timeout': '10'
-    },
-    'privacy': {
-        'browsers_to_clear': 'Edge,Chrome,Opera,Opera GX,Brave,Firefox',
-        'clear_temp': 'True',
-        'clear_logs': 'True'
-    },
-    'network': {
-        'spoof_mac': 'False',
-        'randomize_user_agent': 'True',
-        'disable_webrtc': 'True'
-    }
-}
-
-class ConfigManager:
-    """Manage configuration file operations."""
-    def __init__(self, config_file: str):
-        self.config_file = config_file
-        self.config = configparser.ConfigParser()
-        
-    def load_config(self) -> configparser.ConfigParser:
-        """Load or create configuration file."""
-        if not os.path.exists(self.config_file):
-            self.config.read_dict(DEFAULT_CONFIG)
-            with open(self.config_file, 'w') as f:
-                self.config.write(f)
-        else:
-            self.config.read(self.config_file)
-        return self.config
-    
-    def save_config(self, updates: Dict) -> None:
-        """Update and save configuration."""
-        for section, settings in updates.items():
-            if section not in self.config:
-                self.config[section] = {}
-            self.config[section].update(settings)
-        with open(self.config_file, 'w') as f:
-            self.config.write(f)
-        logger.info("Configuration updated and saved.")
-
-def check_admin_privileges():
-    """Check and elevate privileges if needed."""
-    if platform.system() == "Windows":
-        if not ctypes.windll.shell32.IsUserAnAdmin():
-            logger.info("Elevating to admin privileges...")
-            ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
-            sys.exit(0)
-    else:
-        if os.geteuid() != 0:
-            logger.info("Elevating to root with sudo...")
-            os.execvp("sudo", ["sudo", sys.executable] + sys.argv)
-            sys.exit(1)
-
-def center_text(text: str) -> str:
-    """Center text based on terminal width."""
-    terminal_width = shutil.get_terminal_size().columns
-    centered_lines = []
-    for line in text.splitlines():
-        padding = (terminal_width - len(line)) // 2
-        centered_lines.append(" " * max(0, padding) + line)
-    return "\n".join(centered_lines)
-
-def clear_screen():
-    """Clear the console screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
-
-def display_menu():
-    """Display the advanced menu with centered banner."""
-    clear_screen()
-    print(center_text(BANNER))
-    print(center_text("Advanced No-Trace Anonymization Tool"))
-    print("\nMenu Options:")
-    print("1. Mullvad IP Rotator")
-    print("2. Advanced MAC Address Spoofer")
-    print("3. Clear System Logs and Cache")
-    print("4. Disable WebRTC")
-    print("5. Randomize User Agent")
-    print("6. Log Out All Accounts")
-    print("7. Network Privacy Scan")
-    print("8. Configure Settings")
-    print("9. DNS Leak Protection")
-    print("10. System Fingerprint Randomizer")
-    print("11. Exit")
-    return input("Select an option (1-11): ")
-
-def run_command(command: str, shell: bool = True, powershell: bool = False, timeout: int = 30) -> Optional[str]:
-    """Execute a shell or PowerShell command with timeout."""
-    try:
-        if powershell:
-            result = subprocess.run(["powershell", "-Command", command], capture_output=True, text=True, check=True, timeout=timeout)
-        else:
-            result = subprocess.run(command, shell=shell, capture_output=True, text=True, check=True, timeout=timeout)
-        return result.stdout.strip()
-    except subprocess.TimeoutExpired:
-        logger.error(f"Command timed out: {command}")
-        return None
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Command failed: {command}, Error: {e.stderr}")
-        return None
-
-def login_mullvad(account_number: str) -> bool:
-    """Log in to Mullvad with provided account number."""
-    logger.info("Attempting Mullvad login...")
-    result = run_command(f"mullvad account login {account_number}")
-    if result and "success" in result.lower():
-        logger.info("Mullvad login successful.")
-        return True
-    logger.error("Mullvad login failed.")
-    return False
-
-def get_mullvad_servers(preferred_countries: List[str] = None) -> List[str]:
-    """Retrieve and filter Mullvad server locations."""
-    logger.info("Fetching Mullvad server list...")
-    result = run_command("mullvad relay list")
-    if not result:
-        logger.error("Failed to fetch server list.")
-        return []
-    
-    servers = []
-    for line in result.splitlines():
-        line = line.strip()
-        if line and not line.startswith(" ") and "wireguard" in line.lower():
-            country_code = line.split('-')[0]
-            if country_code and (not preferred_countries or country_code in preferred_countries):
-                servers.append(country_code)
-    logger.info(f"Parsed {len(servers)} server locations.")
-    return list(set(servers))
-
-def connect_to_server(location: str, timeout: int = 10) -> bool:
-    """Connect to a specific Mullvad server location."""
-    logger.info(f"Connecting to {location}...")
-    result = run_command(f"mullvad relay set location {location}")
-    if result:
-        run_command("mullvad connect")
-        time.sleep(2)
-        if check_connection(timeout):
-            logger.info(f"Connected to {location}")
-            return True
-    logger.error(f"Failed to connect to {location}")
-    return False
-
-def check_connection(timeout: int = 10) -> bool:
-    """Check if VPN connection is active."""
-    result = run_command("mullvad status", timeout=timeout)
-    return result and "Connected" in result
-
-def disconnect_vpn() -> bool:
-    """Disconnect from the current VPN server."""
-    logger.info("Disconnecting VPN...")
-    run_command("mullvad disconnect")
-    time.sleep(2)
-    if not check_connection():
-        logger.info("VPN disconnected successfully.")
-        return True
-    logger.error("Failed to disconnect VPN.")
-    return False
-
-def spoof_mac_address(interface: str = None, specific_mac: str = None):
-    """Spoof MAC address for the specified or primary network interface."""
-    logger.info("Attempting to spoof MAC address...")
-    if platform.system() == "Windows":
-        adapter = run_command(
-            "Get-NetAdapter | Where-Object {$_.Status -eq 'Up' -and $_.InterfaceDescription -notlike '*Virtual*'} | Select-Object -First 1 | Select-Object -ExpandProperty Name",
-            powershell=True
-        )
-        if not adapter:
-            logger.error("No active network adapter found.")
-            print("Error: No active network adapter found.")
-            return False
-
-        mac = specific_mac or ":".join([f"{random.randint(0x00, 0xff):02x}" for _ in range(6)])
-        logger.info(f"Using MAC address: {mac}")
-
-        result = run_command(
-            f"Set-NetAdapter -Name '{adapter}' -MacAddress '{mac}'",
-            powershell=True
-        )
-        if result:
-            run_command(f"netsh interface set interface '{adapter}' admin=disable")
-            time.sleep(1)
-            run_command(f"netsh interface set interface '{adapter}' admin=enable")
-            logger.info(f"Spoofed MAC address to {mac} on {adapter}")
-            print(f"MAC address changed to {mac} on {adapter}.")
-            return True
-        logger.error("Failed to spoof MAC address.")
-        print("Error: Failed to spoof MAC address. Run as Administrator.")
-        return False
-    else:
-        interface = interface or run_command("ip link | grep 'state UP' | awk '{print $2}' | cut -d':' -f1 | head -n1")
-        if not interface:
-            logger.error("No active network interface found.")
-            print("Error: No active network interface found.")
-            return False
-
-        mac = specific_mac or ":".join([f"{random.randint(0x00, 0xff):02x}" for _ in range(6)])
-        logger.info(f"Using MAC address: {mac}")
-
-        run_command(f"sudo ip link set {interface} down")
-        result = run_command(f"sudo ip link set {interface} address {mac}")
-        run_command(f"sudo ip link set {interface} up")
-
-        if result:
-            logger.info(f"Spoofed MAC address to {mac} on {interface}")
-            print(f"MAC address changed to {mac} on {interface}.")
-            return True
-        logger.error("Failed to spoof MAC address.")
-        print("Error: Failed to spoof MAC address.")
-        return False
-
-def clear_logs_and_cache(clear_logs: bool = True, clear_temp: bool = True):
-    """Clear system logs and cache with granular control."""
-    logger.info("Clearing system logs and cache...")
-    system = platform.system()
-    user = getpass.getuser()
-
-    if system == "Windows":
-        if clear_logs:
-            run_command("wevtutil el | ForEach-Object {wevtutil cl $_}", powershell=True)
-            logger.info("Cleared Windows Event Logs")
-        if clear_temp:
-            temp_dir = os.environ.get("TEMP", os.path.expandvars("%TEMP%"))
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                os.makedirs(temp_dir, exist_ok=True)
-                logger.info("Cleared Windows temporary files")
-        print("Windows logs and temp files cleared.")
-    elif system == "Darwin":
-        if clear_logs:
-            log_dirs = ["/private/var/log/system.log"]
-            for log_file in log_dirs:
-                if os.path.exists(log_file):
-                    run_command(f"sudo truncate -s 0 {log_file}")
-                    logger.info(f"Cleared log file: {log_file}")
-        if clear_temp:
-            if os.path.exists("/private/tmp"):
-                shutil.rmtree("/private/tmp", ignore_errors=True)
-                os.mkdir("/private/tmp")
-                logger.info("Cleared /private/tmp directory")
-        print("macOS logs and temp files cleared.")
-    else:  # Linux
-        if clear_logs:
-            log_dirs = ["/var/log/syslog", "/var/log/messages", "/var/log/auth.log"]
-            for log_file in log_dirs:
-                if os.path.exists(log_file):
-                    run_command(f"sudo truncate -s 0 {log_file}")
-                    logger.info(f"Cleared log file: {log_file}")
-        if clear_temp:
-            if os.path.exists("/tmp"):
-                shutil.rmtree("/tmp", ignore_errors=True)
-                os.mkdir("/tmp")
-                logger.info("Cleared /tmp directory")
-        print("Linux logs and temp files cleared.")
-    input("Press Enter to return to menu...")
-
-def disable_webrtc(browsers: List[str]):
-    """Disable WebRTC for specified browsers."""
-    logger.info("Disabling WebRTC...")
-    user = getpass.getuser()
-    system = platform.system()
-
-    for browser in browsers:
-        if browser == "Firefox":
-            profile_path = get_browser_paths().get("Firefox")
-            if profile_path and os.path.exists(profile_path):
-                profiles_ini = os.path.join(profile_path, "profiles.ini")
-                if os.path.exists(profiles_ini):
-                    profile = None
-                    with open(profiles_ini, 'r') as f:
-                        for line in f:
-                            if line.startswith("Path="):
-                                profile = line.strip().split("=")[1]
-                                break
-                    if profile:
-                        prefs_js = os.path.join(profile_path, profile, "prefs.js")
-                        webrtc_setting = 'user_pref("media.peerconnection.enabled", false);'
-                        if os.path.exists(prefs_js):
-                            with open(prefs_js, 'a') as f:
-                                f.write(webrtc_setting + "\n")
-                            logger.info(f"Disabled WebRTC for Firefox profile: {profile}")
-                            print(f"WebRTC disabled for Firefox.")
-                        else:
-                            logger.error("Firefox prefs.js not found.")
-                            print("Error: Firefox profile not found.")
-                else:
-                    logger.warning("Firefox profiles.ini not found.")
-                    print("Firefox not found.")
-            else:
-                logger.warning("Firefox data directory not found.")
-                print("Firefox not found.")
-        else:
-            prefs_path = get_browser_paths().get(browser)
-            if prefs_path and os.path.exists(prefs_path):
-                prefs_file = os.path.join(prefs_path, "Preferences")
-                try:
-                    with open(prefs_file, 'r') as f:
-                        prefs = json.load(f)
-                    prefs["webrtc"] = {"enabled": False}
-                    with open(prefs_file, 'w') as f:
-                        json.dump(prefs, f, indent=2)
-                    logger.info(f"Disabled WebRTC for {browser}.")
-                    print(f"WebRTC disabled for {browser}.")
-                except Exception as e:
-                    logger.error(f"Failed to modify {browser} preferences: {str(e)}")
-                    print(f"Error: Failed to modify {browser} preferences.")
-            else:
-                logger.warning(f"{browser} preferences file not found.")
-                print(f"{browser} not found.")
-    input("Press Enter to return to menu...")
-
-def randomize_user_agent(browsers: List[str]):
-    """Randomize user agent for specified browsers."""
-    logger.info("Randomizing user agents...")
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (X11; Linux x86_64; rv:89.0) Gecko/20100101 Firefox/89.0",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:89.0) Gecko/20100101 Firefox/89.0"
-    ]
-    user = getpass.getuser()
-
-    for browser in browsers:
-        if browser == "Firefox":
-            profile_path = get_browser_paths().get("Firefox")
-            if profile_path and os.path.exists(profile_path):
-                profiles_ini = os.path.join(profile_path, "profiles.ini")
-                if os.path.exists(profiles_ini):
-                    profile = None
-                    with open(profiles_ini, 'r') as f:
-                        for line in f:
-                            if line.startswith("Path="):
-                                profile = line.strip().split("=")[1]
-                                break
-                    if profile:
-                        prefs_js = os.path.join(profile_path, profile, "prefs.js")
-                        new_user_agent = random.choice(user_agents)
-                        user_agent_setting = f'user_pref("general.useragent.override", "{new_user_agent}");'
-                        if os.path.exists(prefs_js):
-                            with open(prefs_js, 'a') as f:
-                                f.write(user_agent_setting + "\n")
-                            logger.info(f"Set Firefox user agent to: {new_user_agent}")
-                            print(f"Firefox user agent set to: {new_user_agent}")
-                        else:
-                            logger.error("Firefox prefs.js not found.")
-                            print("Error: Firefox profile not found.")
-                else:
-                    logger.warning("Firefox profiles.ini not found.")
-                    print("Firefox not found.")
-            else:
-                logger.warning("Firefox data directory not found.")
-                print("Firefox not found.")
-        else:
-            prefs_path = get_browser_paths().get(browser)
-            if prefs_path and os.path.exists(prefs_path):
-                prefs_file = os.path.join(prefs_path, "Preferences")
-                try:
-                    with open(prefs_file, 'r') as f:
-                        prefs = json.load(f)
-                    new_user_agent = random.choice(user_agents)
-                    prefs["custom_user_agent"] = new_user_agent
-                    with open(prefs_file, 'w') as f:
-                        json.dump(prefs, f, indent=2)
-                    logger.info(f"Set {browser} user agent to: {new_user_agent}")
-                    print(f"{browser} user agent set to: {new_user_agent}")
-                except Exception as e:
-                    logger.error(f"Failed to modify {browser} preferences: {str(e)}")
-                    print(f"Error: Failed to modify {browser} preferences.")
-            else:
-                logger.warning(f"{browser} preferences file not found.")
-                print(f"{browser} not found.")
-    input("Press Enter to return to menu...")
-
-def is_browser_running(browser_name: str) -> bool:
-    """Check if a browser process is running."""
-    browser_executables = {
-        "Edge": ["msedge.exe"],
-        "Chrome": ["chrome.exe"],
-        "Opera": ["opera.exe"],
-        "Opera GX": ["opera.exe"],
-        "Brave": ["brave.exe"],
-        "Firefox": ["firefox.exe"]
-    }
-    for proc in psutil.process_iter(['name']):
-        if proc.info['name'].lower() in browser_executables.get(browser_name, []):
-            return True
-    return False
-
-def ensure_browsers_closed(browsers: List[str]) -> bool:
-    """Ensure specified browsers are closed."""
-    browser_executables = {
-        "Edge": ["msedge.exe"],
-        "Chrome": ["chrome.exe"],
-        "Opera": ["opera.exe"],
-        "Opera GX": ["opera.exe"],
-        "Brave": ["brave.exe"],
-        "Firefox": ["firefox.exe"]
-    }
-    running_browsers = [b for b in browsers if is_browser_running(b)]
-    if running_browsers:
-        print(f"Error: The following browsers are running: {', '.join(running_browsers)}")
-        choice = input("Close them automatically? (y/n): ").strip().lower()
-        if choice == 'y':
-            for browser in running_browsers:
-                for proc in psutil.process_iter(['name', 'pid']):
-                    if proc.info['name'].lower() in browser_executables.get(browser, []):
-                        try:
-                            if psutil.pid_exists(proc.info['pid']):
-                                proc.terminate()
-                                proc.wait(timeout=5)
-                                logger.info(f"Terminated {proc.info['name']} (pid={proc.info['pid']}).")
-                            else:
-                                logger.info(f"Process {proc.info['name']} (pid={proc.info['pid']}) no longer exists.")
-                        except psutil.NoSuchProcess:
-                            logger.info(f"Process {proc.info['name']} (pid={proc.info['pid']}) no longer exists.")
-                        except psutil.TimeoutExpired:
-                            logger.error(f"Failed to terminate {proc.info['name']} (pid={proc.info['pid']}): Timeout.")
-                            print(f"Error: {proc.info['name']} did not close properly.")
-                        except psutil.Error as e:
-                            logger.error(f"Failed to terminate {proc.info['name']} (pid={proc.info['pid']}): {str(e)}")
-                            print(f"Error: Failed to terminate {proc.info['name']}.")
-                time.sleep(1)
-            still_running = [b for b in browsers if is_browser_running(b)]
-            if still_running:
-                print(f"Error: Could not close: {', '.join(still_running)}. Please close manually.")
-                return False
-        else:
-            print("Please close the browsers and try again.")
-            return False
-    return True
-
-def get_browser_paths() -> Dict[str, str]:
-    """Get browser data paths."""
-    user = getpass.getuser()
-    system = platform.system()
-    if system == "Windows":
-        return {
-            "Edge": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Local\\Microsoft\\Edge\\User Data\\Default"),
-            "Chrome": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Local\\Google\\Chrome\\User Data\\Default"),
-            "Opera": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Roaming\\Opera Software\\Opera Stable"),
-            "Opera GX": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Roaming\\Opera Software\\Opera GX Stable"),
-            "Brave": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Local\\BraveSoftware\\Brave-Browser\\User Data\\Default"),
-            "Firefox": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Roaming\\Mozilla\\Firefox\\Profiles")
-        }
-    elif system == "Linux":
-        return {
-            "Chrome": f"/home/{user}/.config/google-chrome/Default",
-            "Opera": f"/home/{user}/.config/opera",
-            "Brave": f"/home/{user}/.config/BraveSoftware/Brave-Browser/Default",
-            "Firefox": f"/home/{user}/.mozilla/firefox"
-        }
-    elif system == "Darwin":
-        home = os.path.expanduser("~")
-        return {
-            "Edge": f"{home}/Library/Application Support/Microsoft Edge/Default",
-            "Chrome": f"{home}/Library/Application Support/Google/Chrome/Default",
-            "Opera": f"{home}/Library/Application Support/com.operasoftware.Opera",
-            "Brave": f"{home}/Library/Application Support/BraveSoftware/Brave-Browser/Default",
-            "Firefox": f"{home}/Library/Application Support/Firefox/Profiles"
-        }
-    return {}
-
-def clear_browser_data(browsers: List[str]):
-    """Clear cookies and cache for specified browsers."""
-    if not ensure_browsers_closed(browsers):
-        input("Press Enter to return to menu...")
-        return
-
-    browser_paths = get_browser_paths()
-    for browser in browsers:
-        path = browser_paths.get(browser)
-        if not path or not os.path.exists(path):
-            logger.warning(f"{browser} data directory not found.")
-            print(f"{browser} not found. Skipping...")
-            continue
-
-        if browser == "Firefox":
-            clear_firefox_data(path)
-            print(f"Cleared cookies and cache for {browser}.")
-        else:
-            cookies_path = os.path.join(path, "Cookies")
-            cache_paths = [
-                os.path.join(path, "Cache"),
-                os.path.join(path, "Cache2"),
-                os.path.join(path, "Code Cache"),
-                os.path.join(path, "GPUCache"),
-                os.path.join(path, "Service Worker", "CacheStorage")
-            ]
-            if os.path.exists(cookies_path):
-                try:
-                    os.remove(cookies_path)
-                    logger.info(f"Cleared cookies for {browser}")
-                    print(f"Cleared cookies for {browser}.")
-                except PermissionError:
-                    logger.error(f"Permission denied for {browser} cookies.")
-                    print(f"Error: Permission denied for {browser} cookies.")
-                except Exception as e:
-                    logger.error(f"Failed to clear cookies for {browser}: {str(e)}")
-                    print(f"Error: Failed to clear cookies for {browser}.")
-            for cache_path in cache_paths:
-                if os.path.exists(cache_path):
-                    try:
-                        shutil.rmtree(cache_path, ignore_errors=False)
-                        logger.info(f"Cleared cache at {cache_path} for {browser}")
-                        print(f"Cleared cache for {browser}.")
-                    except PermissionError:
-                        logger.error(f"Permission denied for {browser} cache.")
-                        print(f"Error: Permission denied for {browser} cache.")
-                    except Exception as e:
-                        logger.error(f"Failed to clear cache at {cache_path}: {str(e)}")
-                        print(f"Error: Failed to clear cache for {browser}.")
-    input("Press Enter to return to menu...")
-
-def clear_firefox_data(firefox_path: str):
-    """Clear cookies and cache for all Firefox profiles."""
-    if platform.system() in ["Windows", "Darwin"]:
-        for profile in os.listdir(firefox_path):
-            profile_path = os.path.join(firefox_path, profile)
-            if os.path.isdir(profile_path):
-                cookies_path = os.path.join(profile_path, "cookies.sqlite")
-                cache_path = os.path.join(profile_path, "cache")
-                cache2_path = os.path.join(profile_path, "cache2")
-                try:
-                    if os.path.exists(cookies_path):
-                        os.remove(cookies_path)
-                        logger.info(f"Cleared cookies for Firefox profile: {profile}")
-                    if os.path.exists(cache_path):
-                        shutil.rmtree(cache_path, ignore_errors=True)
-                        logger.info(f"Cleared cache for Firefox profile: {profile}")
-                    if os.path.exists(cache2_path):
-                        shutil.rmtree(cache2_path, ignore_errors=True)
-                        logger.info(f"Cleared cache2 for Firefox profile: {profile}")
-                except PermissionError:
-                    logger.error(f"Permission denied for Firefox profile: {profile}")
-                    print(f"Error: Permission denied for Firefox profile {profile}.")
-                except Exception as e:
-                    logger.error(f"Failed to clear Firefox profile {profile}: {str(e)}")
-                    print(f"Error: Failed to clear Firefox profile {profile}.")
-    else:  # Linux
-        profiles_ini = os.path.join(firefox_path, "profiles.ini")
-        if os.path.exists(profiles_ini):
-            profile_path = None
-            with open(profiles_ini, 'r') as f:
-                for line in f:
-                    if line.startswith("Path="):
-                        profile_path = line.strip().split("=")[1]
-                        break
-            if profile_path:
-                full_profile_path = os.path.join(firefox_path, profile_path)
-                cookies_path = os.path.join(full_profile_path, "cookies.sqlite")
-                cache_path = os.path.join(full_profile_path, "cache")
-                cache2_path = os.path.join(full_profile_path, "cache2")
-                try:
-                    if os.path.exists(cookies_path):
-                        os.remove(cookies_path)
-                        logger.info(f"Cleared cookies for Firefox profile: {profile_path}")
-                    if os.path.exists(cache_path):
-                        shutil.rmtree(cache_path, ignore_errors=True)
-                        logger.info(f"Cleared cache for Firefox profile: {profile_path}")
-                    if os.path.exists(cache2_path):
-                        shutil.rmtree(cache2_path, ignore_errors=True)
-                        logger.info(f"Cleared cache2 for Firefox profile: {profile_path}")
-                except PermissionError:
-                    logger.error(f"Permission denied for Firefox profile: {profile_path}")
-                    print(f"Error: Permission denied for Firefox profile {profile_path}.")
-                except Exception as e:
-                    logger.error(f"Failed to clear Firefox profile {profile_path}: {str(e)}")
-                    print(f"Error: Failed to clear Firefox profile {profile_path}.")
-
-DESC="Perform a network privacy scan."
-def network_privacy_scan():
-    """Perform a network privacy scan."""
-    logger.info("Performing network privacy scan...")
-    print("Scanning network configuration...")
-
-    # Check DNS settings
-    dns_servers = []
-    if platform.system() == "Windows":
-        result = run_command("Get-DnsClientServerAddress | Select-Object -ExpandProperty ServerAddresses", powershell=True)
-        if result:
-            dns_servers = result.splitlines()
-    else:
-        result = run_command("cat /etc/resolv.conf | grep nameserver | awk '{print $2}'")
-        if result:
-            dns_servers = result.splitlines()
-
-    print("DNS Servers:")
-    for dns in dns_servers:
-        try:
-            ip = ipaddress.ip_address(dns)
-            print(f" - {dns} ({'Public' if ip.is_global else 'Private'})")
-        except ValueError:
-            print(f" - {dns} (Invalid IP)")
-
-    # Check for DNS leaks
-    try:
-        response = requests.get("https://api.ipify.org?format=json", timeout=5)
-        public_ip = response.json().get("ip")
-        print(f"Current Public IP: {public_ip}")
-    except requests.RequestException as e:
-        logger.error(f"Failed to check public IP: {str(e)}")
-        print("Error: Unable to check public IP.")
-
-    # Check open ports
-    open_ports = []
-    for port in [80, 443, 8080, 22, 3389]:  # Common ports
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        result = sock.connect_ex(('127.0.0.1', port))
-        if result == 0:
-            open_ports.append(port)
-        sock.close()
-    if open_ports:
-        print(f"Open Ports: {', '.join(map(str, open_ports))}")
-    else:
-        print("No common ports open.")
-
-    # Check current MAC address
-    current_mac = getmac.get_mac_address()
-    if current_mac:
-        print(f"Current MAC Address: {current_mac}")
-    else:
-        print("Unable to retrieve current MAC address.")
-
-    print("Network scan complete.")
-    input("Press Enter to return to menu...")
-
-def configure_dns_protection():
-    """Configure DNS leak protection."""
-    logger.info("Configuring DNS leak protection...")
-    secure_dns = ["1.1.1.1", "8.8.8.8"]  # Cloudflare and Google DNS
-    system = platform.system()
-
-    if system == "Windows":
-        adapter = run_command(
-            "Get-NetAdapter | Where-Object {$_.Status -eq 'Up' -and $_.InterfaceDescription -notlike '*Virtual*'} | Select-Object -First 1 | Select-Object -ExpandProperty Name",
-            powershell=True
-        )
-        if adapter:
-            for dns in secure_dns:
-                run_command(f"Set-DnsClientServerAddress -InterfaceAlias '{adapter}' -ServerAddresses ('{dns}')", powershell=True)
-            logger.info(f"Set DNS servers to {', '.join(secure_dns)} on {adapter}")
-            print(f"DNS servers set to {', '.join(secure_dns)}.")
-        else:
-            logger.error("No active network adapter found.")
-            print("Error: No active network adapter found.")
-    else:
-        resolv_conf = "/etc/resolv.conf"
-        try:
-            with open(resolv_conf, 'w') as f:
-                for dns in secure_dns:
-                    f.write(f"nameserver {dns}\n")
-            logger.info(f"Updated {resolv_conf} with DNS servers: {', '.join(secure_dns)}")
-            print(f"DNS servers set to {', '.join(secure_dns)}.")
-        except PermissionError:
-            logger.error(f"Permission denied writing to {resolv_conf}.")
-            print("Error: Permission denied. Run as sudo.")
-        except Exception as e:
-            logger.error(f"Failed to update DNS: {str(e)}")
-            print(f"Error: Failed to update DNS.")
-    input("Press Enter to return to menu...")
-
-def system_fingerprint_randomizer():
-    """Randomize system fingerprint attributes."""
-    logger.info("Randomizing system fingerprint...")
-    
-    # Randomize hostname
-    if platform.system() != "Windows":
-        new_hostname = f"host-{random.randint(1000, 9999)}"
-        run_command(f"sudo hostnamectl set-hostname {new_hostname}")
-        logger.info(f"Set hostname to {new_hostname}")
-        print(f"Hostname set to {new_hostname}")
-
-    # Randomize system time zone
-    timezones = ["UTC", "America/New_York", "Europe/London", "Asia/Tokyo"]
-    new_timezone = random.choice(timezones)
-    if platform.system() == "Windows":
-        run_command(f"Set-TimeZone -Id '{new_timezone}'", powershell=True)
-    else:
-        run_command(f"sudo timedatectl set-timezone {new_timezone}")
-    logger.info(f"Set timezone to {new_timezone}")
-    print(f"Timezone set to {new_timezone}")
-
-    print("System fingerprint randomized.")
-    input("Press Enter to return to menu...")
-
-def configure_settings(config_manager: ConfigManager):
-    """Configure tool settings interactively."""
-    print("\nConfigure Settings:")
-    print("1. Mullvad Account Number")
-    print("2. VPN Rotation Interval (seconds)")
-    print("3. Preferred VPN Countries (comma-separated)")
-    print("4. Browsers to Clear")
-    print("5. Clear System Logs (True/False)")
-    print("6. Clear Temporary Files (True/False)")
-    print("7. Auto-Spoof MAC Address (True/False)")
-    print("8. Auto-Randomize User Agent (True/False)")
-    print("9. Auto-Disable WebRTC (True/False)")
-    print("10. Save and Return")
-
-    config = config_manager.load_config()
-    updates = {}
-    
-    while True:
-        choice = input("Select an option (1-10): ")
-        if choice == '1':
-            account = input("Enter Mullvad account number: ").strip()
-            updates.setdefault('mullvad', {})['account_number'] = account
-        elif choice == '2':
-            interval = input("Enter rotation interval in seconds (e.g., 300): ").strip()
-            updates.setdefault('mullvad', {})['rotation_interval'] = interval
-        elif choice == '3':
-            countries = input("Enter preferred countries (e.g., us,ca,uk): ").strip()
-            updates.setdefault('mullvad', {})['preferred_countries'] = countries
-        elif choice == '4':
-            browsers = input("Enter browsers to clear (e.g., Edge,Chrome,Firefox): ").strip()
-            updates.setdefault('privacy', {})['browsers_to_clear'] = browsers
-        elif choice == '5':
-            clear_logs = input("Clear system logs? (True/False): ").strip()
-            updates.setdefault('privacy', {})['clear_logs'] = clear_logs
-        elif choice == '6':
-            clear_temp = input("Clear temporary files? (True/False): ").strip()
-            updates.setdefault('privacy', {})['clear_temp'] = clear_temp
-        elif choice == '7':
-            spoof_mac = input("Auto-spoof MAC address? (True/False): ").strip()
-            updates.setdefault('network', {})['spoof_mac'] = spoof_mac
-        elif choice == '8':
-            randomize_ua = input("Auto-randomize user agent? (True/False): ").strip()
-            updates.setdefault('network', {})['randomize_user_agent'] = randomize_ua
-        elif choice == '9':
-            disable_webrtc = input("Auto-disable WebRTC? (True/False): ").strip()
-            updates.setdefault('network', {})['disable_webrtc'] = disable_webrtc
-        elif choice == '10':
-            config_manager.save_config(updates)
-            print("Settings saved.")
-            break
-        else:
-            print("Invalid option. Please select 1-10.")
-        input("Press Enter to continue...")
-
-def run_mullvad_rotator(config: configparser.ConfigParser):
-    """Run the Mullvad IP rotator with configuration."""
-    account_number = config['mullvad']['account_number']
-    rotation_interval = int(config['mullvad']['rotation_interval'])
-    preferred_countries = config['mullvad']['preferred_countries'].split(',')
-
-    if not login_mullvad(account_number):
-        logger.error("Login failed.")
-        input("Press Enter to return to menu...")
-        return
-
-    servers = get_mullvad_servers(preferred_countries)
-    if not servers:
-        logger.error("No servers available.")
-        input("Press Enter to return to menu...")
-        return
-
-    print(f"Starting Mullvad IP Rotator with {len(servers)} servers. Press Ctrl+C to stop.")
-    try:
-        while True:
-            for server in servers:
-                disconnect_vpn()
-                if connect_to_server(server):
-                    logger.info(f"Connected to {server}. Waiting {rotation_interval} seconds...")
-                    time.sleep(rotation_interval)
-                else:
-                    logger.warning(f"Failed to connect to {server}. Trying next server...")
-                    time.sleep(5)
-    except KeyboardInterrupt:
-        logger.info("Rotator interrupted.")
-        disconnect_vpn()
-        print("Returning to menu...")
-        time.sleep(1)
-
-def main():
-    """Main function to run the advanced anonymization tool."""
-    check_admin_privileges()
-    config_manager = ConfigManager(CONFIG_FILE)
-    config = config_manager.load_config()
-
-    while True:
-        choice = display_menu()
-        if choice == '1':
-            run_mullvad_rotator(config)
-        elif choice == '2':
-            interface = input("Enter network interface (leave blank for default): ").strip() or None
-            specific_mac = input("Enter specific MAC address (leave blank for random): ").strip() or None
-            spoof_mac_address(interface, specific_mac)
-        elif choice == '3':
-            clear_logs = config.getboolean('privacy', 'clear_logs', fallback=True)
-            clear_temp = config.getboolean('privacy', 'clear_temp', fallback=True)
-            clear_logs_and_cache(clear_logs, clear_temp)
-        elif choice == '4':
-            browsers = config['privacy']['browsers_to_clear'].split(',')
-            disable_webrtc(browsers)
-        elif choice == '5':
-            browsers = config['privacy']['browsers_to_clear'].split(',')
-            randomize_user_agent(browsers)
-        elif choice == '6':
-            browsers = config['privacy']['browsers_to_clear'].split(',')
-            clear_browser_data(browsers)
-        elif choice == '7':
-            network_privacy_scan()
-        elif choice == '8':
-            configure_settings(config_manager)
-        elif choice == '9':
-            configure_dns_protection()
-        elif choice == '10':
-            system_fingerprint_randomizer()
-        elif choice == '11':
-            logger.info("Exiting program.")
-            print("Goodbye!")
-            sys.exit(0)
-        else:
-            print("Invalid option. Please select 1-11.")
-            input("Press Enter to continue...")
-
-if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        disconnect_vpn()
-        sys.exit(1)
+import atexit
+import subprocess
+import time
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import sys
+import os
+import random
+import shutil
+import tempfile
+import stat
+import platform
+import getpass
+import json
+import errno
+import fnmatch
+import importlib
+import math
+import re
+import queue
+import shlex
+import signal
+import threading
+import types
+import uuid
+import argparse
+import configparser
+import contextlib
+import functools
+import gc
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
+from datetime import datetime
+from typing import Callable, List, Dict, Iterator, AsyncIterator, Optional, Tuple, Union
+import socket
+import struct
+import ipaddress
+
+class _LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# Heavy or single-use dependencies, loaded only by the features that need them
+asyncio = _LazyModule("asyncio")
+ctypes = _LazyModule("ctypes")
+getmac = _LazyModule("getmac")
+psutil = _LazyModule("psutil")
+requests = _LazyModule("requests")
+sqlite3 = _LazyModule("sqlite3")
+tracemalloc = _LazyModule("tracemalloc")
+
+try:
+    import fcntl
+    import pwd
+    import resource
+except ImportError:  # Windows
+    fcntl = None
+    pwd = None
+    resource = None
+
+# Configuration file path
+CONFIG_FILE = "no_trace_config.ini"
+
+# Rotation metrics exports (JSON summary and Prometheus textfile)
+METRICS_JSON_FILE = "no_trace_metrics.json"
+METRICS_PROM_FILE = "no_trace_metrics.prom"
+
+# Cached Mullvad relay list and how long it stays fresh (seconds)
+RELAY_CATALOG_FILE = "mullvad_relays.json"
+RELAY_CATALOG_TTL = 6 * 3600
+
+# Cached DNS resolver benchmark, and the failure rate above which a resolver is ranked last
+DNS_BENCHMARK_FILE = "dns_benchmark.json"
+DNS_MAX_FAILURE_RATE = 0.2
+
+# Log file, rotated at 10 MB with five backups
+LOG_FILE = "no_trace.log"
+
+# Launch time budget for bench-startup (milliseconds) and runs per measurement
+STARTUP_BUDGET_MS = 200
+STARTUP_RUNS = 5
+
+# Browser benchmark: baseline file, timed runs per operation, allowed regression (percent) and default workload
+BENCH_BASELINE_FILE = "no_trace_bench.json"
+BENCH_REPEAT = 3
+BENCH_THRESHOLD_PCT = 20
+BENCH_WORKLOAD = {"profiles": 3, "cache_files": 2000, "cache_file_kb": 8, "prefs_mb": 2.0, "cookies": 5000}
+
+# Structured fields copied from a record's ``extra`` into JSON log lines
+LOG_FIELDS = ("operation", "target", "duration", "bytes", "files", "rows", "status")
+
+logger = logging.getLogger(__name__)
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with any structured LOG_FIELDS."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queue records as they are; the listener thread does all formatting and I/O."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+_log_listener = None
+
+def setup_logging(config: Optional[configparser.ConfigParser] = None, console=None, verbosity: int = 0) -> None:
+    """Route logging through a queue to a background thread writing the rotating log and the console.
+
+    Levels and the file format (json or text) come from [logging];
+    verbosity raises (positive) or lowers (negative) the console level.
+    """
+    global _log_listener
+    if _log_listener:
+        return
+    try:
+        level = _parse_level(config_value(config, 'logging', 'level'))
+        console_level = _parse_level(config_value(config, 'logging', 'console_level'))
+    except ValueError:
+        level, console_level = logging.INFO, logging.WARNING
+    console_level = min(logging.CRITICAL, max(logging.DEBUG, console_level - 10 * verbosity))
+    text_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=10*1024*1024, backupCount=5)
+    file_handler.setLevel(level)
+    file_handler.setFormatter(JsonFormatter() if config_value(config, 'logging', 'format').strip().lower() == 'json'
+                              else text_format)
+    console_handler = logging.StreamHandler(console or sys.stdout)
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(text_format)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(min(level, console_level))
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    _log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background writer."""
+    global _log_listener
+    if _log_listener:
+        _log_listener.stop()
+        _log_listener = None
+
+# ASCII Banner
+BANNER = """
+███╗   ██╗ ██████╗    ████████╗██████╗  █████╗  ██████╗███████╗
+████╗  ██║██╔═══██╗   ╚══██╔══╝██╔══██╗██╔══██╗██╔════╝██╔════╝
+██╔██╗ ██║██║   ██║█████╗██║   ██████╔╝███████║██║     █████╗  
+██║╚██╗██║██║   ██║╚════╝██║   ██╔══██╗██╔══██║██║     ██╔══╝  
+██║ ╚████║╚██████╔╝      ██║   ██║  ██║██║  ██║╚██████╗███████╗
+╚═╝  ╚═══╝ ╚═════╝       ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝ ╚═════╝╚══════╝
+"""
+
+# Default configuration
+DEFAULT_CONFIG = {
+    'mullvad': {
+        'account_number': 'YOUR_ACCOUNT_NUMBER_HERE',
+        'rotation_interval': '300',
+        'preferred_countries': 'us,ca,uk',
+        'connection_timeout': '10',
+        'relay_selection': 'random',
+        'latency_top_n': '5',
+        'probe_interval': '900'
+    },
+    'privacy': {
+        'browsers_to_clear': 'Edge,Chrome,Opera,Opera GX,Brave,Firefox',
+        'clear_temp': 'True',
+        'clear_logs': 'True',
+        'temp_min_age': '86400',
+        'temp_min_size': '0',
+        'temp_patterns': '*',
+        'temp_exclude': '',
+        'cookie_allowlist': '',
+        'cookie_denylist': '',
+        'cookie_vacuum': 'False'
+    },
+    'network': {
+        'spoof_mac': 'False',
+        'randomize_user_agent': 'True',
+        'disable_webrtc': 'True',
+        'ip_endpoints': 'https://api.ipify.org?format=json,https://ipv4.icanhazip.com,https://checkip.amazonaws.com',
+        'ip_timeout': '3',
+        'ip_cache_ttl': '60',
+        'ip_quorum': '2'
+    },
+    'dns': {
+        'candidates': '1.1.1.1,1.0.0.1,9.9.9.9,149.112.112.112,8.8.8.8,8.8.4.4',
+        'probe_names': 'example.com,wikipedia.org,mozilla.org',
+        'queries': '10',
+        'timeout': '1.0',
+        'top_n': '2',
+        'benchmark': 'True',
+        'cache_ttl': '86400'
+    },
+    'logging': {
+        'level': 'INFO',
+        'console_level': 'WARNING',
+        'format': 'json'
+    },
+    'scan': {
+        'targets': '127.0.0.1',
+        'ports': '22,80,443,3389,8080',
+        'concurrency': '500',
+        'timeout': '1.0'
+    }
+}
+
+# Cache directories removed from browser profiles
+CHROMIUM_CACHE_DIRS = ["Cache", "Cache2", "Code Cache", "GPUCache", os.path.join("Service Worker", "CacheStorage")]
+FIREFOX_CACHE_DIRS = ["cache", "cache2"]
+
+# Cleanup engine thread pool size and number of files removed per job
+CLEANUP_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+CLEANUP_BATCH_SIZE = 256
+
+# Cookie stores purged in place: browser family -> (file names relative to the profile, table, host column)
+COOKIE_STORES = {
+    "chromium": ([os.path.join("Network", "Cookies"), "Cookies"], "cookies", "host_key"),
+    "firefox": (["cookies.sqlite"], "moz_cookies", "host")
+}
+COOKIE_BATCH_SIZE = 500
+COOKIE_BUSY_TIMEOUT = 5.0
+
+# Persistent per-directory size cache used by cleanup previews
+SIZE_INDEX_FILE = "no_trace_size_index.json"
+
+# Temp cleaner: names never removed, deletion batches allowed in flight, checkpoint file and interval (seconds)
+TEMP_SKIP_PATTERNS = ["*.lock", "*.lck", "*.pid", ".*-lock", ".X11-unix", ".ICE-unix", ".font-unix",
+                      "systemd-private-*", "ssh-*", "tmux-*", "no_trace_temp_checkpoint.json"]
+TEMP_MAX_PENDING = CLEANUP_MAX_WORKERS * 4
+TEMP_CHECKPOINT_FILE = "no_trace_temp_checkpoint.json"
+TEMP_CHECKPOINT_INTERVAL = 30
+TEMP_MAX_ERRORS = 100
+
+# Walk temp directories through directory descriptors where the platform allows (not Windows)
+TEMP_FD_WALK = (os.scandir in os.supports_fd and os.unlink in os.supports_dir_fd
+                and os.rmdir in os.supports_dir_fd and hasattr(os, "O_NOFOLLOW") and hasattr(os, "O_DIRECTORY"))
+
+def config_value(config: Optional[configparser.ConfigParser], section: str, key: str) -> str:
+    """Read a setting, falling back to DEFAULT_CONFIG for files written before it existed."""
+    default = DEFAULT_CONFIG[section][key]
+    return config.get(section, key, fallback=default) if config else default
+
+class SettingsError(ValueError):
+    """Raised when the configuration holds a value of the wrong type or out of range."""
+
+def _parse_bool(value: str) -> bool:
+    """Parse a boolean the way ConfigParser.getboolean does, naming the bad value otherwise."""
+    lowered = value.strip().lower()
+    if lowered not in configparser.ConfigParser.BOOLEAN_STATES:
+        raise ValueError("expected True or False")
+    return configparser.ConfigParser.BOOLEAN_STATES[lowered]
+
+def _parse_list(value: str) -> List[str]:
+    """Split a comma-separated value, dropping blanks."""
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+def _bounded(kind, minimum, exclusive: bool = False):
+    """Parser for numbers of the given kind that must be at least (or above) minimum."""
+    def parse(value: str):
+        number = kind(value.strip())
+        if number < minimum or (exclusive and number == minimum):
+            raise ValueError(f"must be {'greater than' if exclusive else 'at least'} {minimum}")
+        return number
+    return parse
+
+def _choice(*options: str):
+    """Parser for a case-insensitive value from a fixed set."""
+    def parse(value: str) -> str:
+        lowered = value.strip().lower()
+        if lowered not in options:
+            raise ValueError(f"expected one of {', '.join(options)}")
+        return lowered
+    return parse
+
+def _parse_level(value: str) -> int:
+    """Parse a logging level name into its number."""
+    level = logging.getLevelName(value.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError("expected DEBUG, INFO, WARNING, ERROR or CRITICAL")
+    return level
+
+def _parse_scan_targets(value: str) -> str:
+    """Check CIDR ranges in a scan target list without expanding them."""
+    for item in _parse_list(value):
+        if "/" in item and ipaddress.ip_network(item, strict=False).num_addresses > SCAN_MAX_HOSTS:
+            raise ValueError(f"{item} expands to more than {SCAN_MAX_HOSTS} hosts")
+    return value.strip()
+
+def _parse_resolvers(value: str) -> List[str]:
+    """Split a resolver list, checking each entry parses as an address and port."""
+    resolvers = _parse_list(value)
+    for resolver in resolvers:
+        parse_resolver(resolver)
+    return resolvers
+
+# Typed settings: section -> key -> parser raising ValueError on bad input
+SETTINGS_SCHEMA = {
+    'mullvad': {
+        'account_number': str.strip,
+        'rotation_interval': _bounded(int, 1),
+        'preferred_countries': _parse_list,
+        'connection_timeout': _bounded(int, 1),
+        'relay_selection': _choice('random', 'latency'),
+        'latency_top_n': _bounded(int, 1),
+        'probe_interval': _bounded(int, 0)
+    },
+    'privacy': {
+        'browsers_to_clear': _parse_list,
+        'clear_temp': _parse_bool,
+        'clear_logs': _parse_bool,
+        'temp_min_age': _bounded(float, 0),
+        'temp_min_size': _bounded(int, 0),
+        'temp_patterns': _parse_list,
+        'temp_exclude': _parse_list,
+        'cookie_allowlist': _parse_list,
+        'cookie_denylist': _parse_list,
+        'cookie_vacuum': _parse_bool
+    },
+    'network': {
+        'spoof_mac': _parse_bool,
+        'randomize_user_agent': _parse_bool,
+        'disable_webrtc': _parse_bool,
+        'ip_endpoints': _parse_list,
+        'ip_timeout': _bounded(float, 0, exclusive=True),
+        'ip_cache_ttl': _bounded(float, 0),
+        'ip_quorum': _bounded(int, 1)
+    },
+    'dns': {
+        'candidates': lambda value: _parse_resolvers(value),
+        'probe_names': _parse_list,
+        'queries': _bounded(int, 1),
+        'timeout': _bounded(float, 0, exclusive=True),
+        'top_n': _bounded(int, 1),
+        'benchmark': _parse_bool,
+        'cache_ttl': _bounded(float, 0)
+    },
+    'logging': {
+        'level': _parse_level,
+        'console_level': _parse_level,
+        'format': _choice('json', 'text')
+    },
+    'scan': {
+        'targets': _parse_scan_targets,
+        'ports': lambda value: parse_port_spec(value),
+        'concurrency': _bounded(int, 1),
+        'timeout': _bounded(float, 0, exclusive=True)
+    }
+}
+
+class Settings:
+    """Typed, validated view of a configuration with one attribute namespace per section.
+
+    Every value is parsed once on construction; all problems are collected
+    and raised together as SettingsError.
+    """
+    def __init__(self, config: Optional[configparser.ConfigParser] = None):
+        errors = []
+        for section, fields in SETTINGS_SCHEMA.items():
+            values = {}
+            for key, parse in fields.items():
+                raw = config_value(config, section, key)
+                try:
+                    values[key] = parse(raw)
+                except ValueError as e:
+                    errors.append(f"[{section}] {key} = {raw!r}: {e}")
+            setattr(self, section, types.SimpleNamespace(**values))
+        if errors:
+            raise SettingsError("Invalid configuration: " + "; ".join(errors))
+
+    def as_dict(self) -> Dict:
+        """Return the typed values as nested dicts."""
+        return {section: dict(vars(getattr(self, section))) for section in SETTINGS_SCHEMA}
+
+class ConfigManager:
+    """Manage configuration file operations and the validated settings built from it.
+
+    The file is re-read when its mtime changes (see reload_if_changed); the
+    shared ConfigParser is refreshed in place so holders of it see the new
+    values, and subscribers are called with the new Settings.
+    """
+    def __init__(self, config_file: str):
+        self.config_file = config_file
+        self.config = configparser.ConfigParser()
+        self.settings = None
+        self._mtime = None
+        self._subscribers = []
+
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def load_config(self, validate: bool = True) -> configparser.ConfigParser:
+        """Load or create configuration file, raising SettingsError on invalid values."""
+        fresh = configparser.ConfigParser()
+        if not os.path.exists(self.config_file):
+            fresh.read_dict(DEFAULT_CONFIG)
+            with open(self.config_file, 'w') as f:
+                fresh.write(f)
+        else:
+            fresh.read(self.config_file)
+        mtime = self._stat_mtime()
+        settings = Settings(fresh) if validate else None
+        self._replace(fresh, settings)
+        self._mtime = mtime
+        return self.config
+
+    def reload_if_changed(self) -> bool:
+        """Reload if the file's mtime changed; invalid edits are logged and the current settings kept."""
+        mtime = self._stat_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        fresh = configparser.ConfigParser()
+        try:
+            fresh.read(self.config_file)
+            settings = Settings(fresh)
+        except (configparser.Error, SettingsError) as e:
+            logger.error(f"Ignoring configuration change: {e}")
+            return False
+        self._replace(fresh, settings)
+        logger.info("Configuration reloaded.")
+        for callback in list(self._subscribers):
+            try:
+                callback(settings)
+            except Exception as e:
+                logger.error(f"Configuration subscriber failed: {str(e)}")
+        return True
+
+    def subscribe(self, callback: Callable[[Settings], None]) -> None:
+        """Call callback with the new Settings after each reload."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Settings], None]) -> None:
+        """Stop notifying callback."""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _replace(self, fresh: configparser.ConfigParser, settings: Optional[Settings]) -> None:
+        """Swap in new contents without replacing the ConfigParser object others hold."""
+        self.config.clear()
+        self.config.read_dict(fresh)
+        self.settings = settings
+
+    def save_config(self, updates: Dict) -> None:
+        """Validate, update and save configuration; nothing is written if a value is invalid."""
+        merged = configparser.ConfigParser()
+        merged.read_dict(self.config)
+        for section, settings in updates.items():
+            if section not in merged:
+                merged[section] = {}
+            merged[section].update(settings)
+        validated = Settings(merged)
+        with open(self.config_file, 'w') as f:
+            merged.write(f)
+        self._replace(merged, validated)
+        self._mtime = self._stat_mtime()
+        logger.info("Configuration updated and saved.")
+
+def check_admin_privileges(use_broker: bool = True):
+    """Check and elevate privileges if needed; a reachable privileged broker makes sudo unnecessary."""
+    if platform.system() == "Windows":
+        if not ctypes.windll.shell32.IsUserAnAdmin():
+            logger.info("Elevating to admin privileges...")
+            stop_logging()
+            ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
+            sys.exit(0)
+    else:
+        if os.geteuid() != 0:
+            if use_broker and broker_available():
+                logger.info("Privileged broker available, running unprivileged.")
+                return
+            logger.info("Elevating to root with sudo...")
+            stop_logging()
+            os.execvp("sudo", ["sudo", sys.executable] + sys.argv)
+            sys.exit(1)
+
+def center_text(text: str) -> str:
+    """Center text based on terminal width."""
+    terminal_width = shutil.get_terminal_size().columns
+    centered_lines = []
+    for line in text.splitlines():
+        padding = (terminal_width - len(line)) // 2
+        centered_lines.append(" " * max(0, padding) + line)
+    return "\n".join(centered_lines)
+
+def clear_screen():
+    """Clear the console screen."""
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+# False when running a headless subcommand: prompts are skipped
+INTERACTIVE = True
+
+def pause(message: str = "Press Enter to return to menu...") -> None:
+    """Wait for Enter in the interactive menu; no-op in headless runs."""
+    if INTERACTIVE:
+        input(message)
+
+def display_menu():
+    """Display the advanced menu with centered banner."""
+    clear_screen()
+    print(center_text(BANNER))
+    print(center_text("Advanced No-Trace Anonymization Tool"))
+    print("\nMenu Options:")
+    print("1. Mullvad IP Rotator")
+    print("2. Advanced MAC Address Spoofer")
+    print("3. Clear System Logs and Cache")
+    print("4. Disable WebRTC")
+    print("5. Randomize User Agent")
+    print("6. Log Out All Accounts")
+    print("7. Network Privacy Scan")
+    print("8. Configure Settings")
+    print("9. DNS Leak Protection")
+    print("10. System Fingerprint Randomizer")
+    print("11. Apply Browser Privacy Settings")
+    print("12. Compact Firefox Preferences")
+    print("13. Preview Browser Cleanup")
+    print("14. Exit")
+    return input("Select an option (1-14): ")
+
+# Number of long-lived shell sessions kept per backend
+COMMAND_SESSIONS = 4
+
+class ShellSession:
+    """A long-lived shell process running commands framed by unique sentinel lines.
+
+    Each command's stdout ends with a sentinel carrying its exit status and
+    its stderr with a matching sentinel, so many commands can share one
+    shell. A session that hangs or exits is killed and respawned. Shells
+    run in their own session (process group on Windows) so a Ctrl+C in the
+    terminal does not take them down with the program.
+    The plain shell backend is POSIX only; Windows uses PowerShell.
+    """
+    def __init__(self, powershell: bool = False):
+        self.powershell = powershell
+        if powershell:
+            self.argv = ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"]
+        elif platform.system() == "Windows":
+            raise ValueError("Shell sessions need a POSIX shell; use run_command on Windows.")
+        else:
+            bash = shutil.which("bash")
+            self.argv = [bash, "--noprofile", "--norc"] if bash else ["/bin/sh"]
+        self.proc = None
+        self._spawn()
+
+    def _spawn(self) -> None:
+        """Start the shell and the threads draining its output streams."""
+        if platform.system() == "Windows":
+            detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            detach = {"start_new_session": True}
+        self.proc = subprocess.Popen(
+            self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", errors="replace", bufsize=1, **detach
+        )
+        self._stdout = queue.Queue()
+        self._stderr = queue.Queue()
+        for stream, lines in ((self.proc.stdout, self._stdout), (self.proc.stderr, self._stderr)):
+            threading.Thread(target=self._drain, args=(stream, lines), daemon=True).start()
+
+    @staticmethod
+    def _drain(stream, lines: "queue.Queue") -> None:
+        """Forward lines from a stream to a queue, ending with None at EOF."""
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
+
+    def close(self) -> None:
+        """Terminate the shell together with any command still running in it."""
+        if not self.proc:
+            return
+        if platform.system() != "Windows":
+            # The shell leads its own process group, which the commands it starts share
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(self.proc.pid, signal.SIGKILL)
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        with contextlib.suppress(OSError):
+            self.proc.stdin.close()
+
+    def respawn(self) -> None:
+        """Replace a hung or dead shell with a fresh one."""
+        logger.warning("Restarting command session.")
+        self.close()
+        self._spawn()
+
+    def _script(self, command: str, sentinel: str) -> str:
+        """Wrap a command so each output stream ends with a newline and a sentinel line."""
+        if self.powershell:
+            return (
+                f"$__ok = $true; try {{ {command}; if (-not $?) {{ $__ok = $false }} }} "
+                f"catch {{ [Console]::Error.WriteLine($_.ToString()); $__ok = $false }}; "
+                f"[Console]::Out.WriteLine(''); [Console]::Out.WriteLine('{sentinel} ' + $(if ($__ok) {{ 0 }} else {{ 1 }})); "
+                f"[Console]::Error.WriteLine(''); [Console]::Error.WriteLine('{sentinel}')\n"
+            )
+        return (
+            f"( eval {shlex.quote(command)} ) </dev/null\n"
+            f"printf '\\n%s %d\\n' '{sentinel}' $?\n"
+            f"printf '\\n%s\\n' '{sentinel}' >&2\n"
+        )
+
+    def _collect(self, lines: "queue.Queue", sentinel: str, deadline: float) -> Tuple[List[str], Optional[str]]:
+        """Read lines until the sentinel, returning the output and the sentinel line."""
+        output = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.argv, 0)
+            try:
+                line = lines.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(self.argv, 0)
+            if line is None:
+                return output, None
+            if line.startswith(sentinel):
+                return output, line
+            output.append(line)
+
+    def run_batch(self, commands: List[str], timeout: float = 30) -> List[subprocess.CompletedProcess]:
+        """Send several commands in one write and collect each result in order.
+
+        If the shell has died, it is respawned and the commands without a
+        result are sent once more before being reported as failed.
+        """
+        deadline = time.monotonic() + timeout
+        results = []
+        error = None
+        for _ in range(2):
+            pending = commands[len(results):]
+            sentinels = [f"__NO_TRACE_{uuid.uuid4().hex}__" for _ in pending]
+            try:
+                self.proc.stdin.write("".join(self._script(c, m) for c, m in zip(pending, sentinels)))
+                self.proc.stdin.flush()
+                for command, sentinel in zip(pending, sentinels):
+                    stdout, marker = self._collect(self._stdout, sentinel, deadline)
+                    stderr, _ = self._collect(self._stderr, sentinel, deadline)
+                    if marker is None:
+                        raise BrokenPipeError("command session exited")
+                    # Drop the newlines written ahead of the sentinels
+                    stdout = "".join(stdout)[:-1]
+                    stderr = "".join(stderr)[:-1]
+                    returncode = int(marker.split()[-1])
+                    results.append(subprocess.CompletedProcess(command, returncode, stdout, stderr))
+                return results
+            except subprocess.TimeoutExpired:
+                self.respawn()
+                raise subprocess.TimeoutExpired(commands[len(results)], timeout)
+            except (BrokenPipeError, OSError, ValueError) as e:
+                self.respawn()
+                error = str(e)
+        return results + [subprocess.CompletedProcess(c, -1, "", error) for c in commands[len(results):]]
+
+class CommandRunner:
+    """Pool of persistent shell sessions that commands are pipelined through."""
+    def __init__(self, powershell: bool = False, size: int = COMMAND_SESSIONS):
+        self.powershell = powershell
+        self.size = size
+        self._idle = queue.Queue()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> ShellSession:
+        """Take an idle session, starting a new one while under the pool size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._sessions) < self.size:
+                session = ShellSession(self.powershell)
+                self._sessions.append(session)
+                return session
+        return self._idle.get()
+
+    def run_batch(self, commands: List[str], timeout: float = 30) -> List[subprocess.CompletedProcess]:
+        """Run commands back to back in one session round trip."""
+        session = self._acquire()
+        try:
+            return session.run_batch(commands, timeout)
+        finally:
+            self._idle.put(session)
+
+    def run(self, command: str, timeout: float = 30) -> subprocess.CompletedProcess:
+        """Run a single command in a pooled session."""
+        return self.run_batch([command], timeout)[0]
+
+    def close(self) -> None:
+        """Terminate every session in the pool."""
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+            self._idle = queue.Queue()
+
+_command_runners = {}
+
+def get_command_runner(powershell: bool = False) -> CommandRunner:
+    """Return the shared command runner for the shell or PowerShell backend."""
+    runner = _command_runners.get(powershell)
+    if runner is None:
+        runner = _command_runners.setdefault(powershell, CommandRunner(powershell))
+    return runner
+
+@atexit.register
+def _close_command_runners() -> None:
+    """Shut down pooled shell sessions at exit."""
+    for runner in _command_runners.values():
+        runner.close()
+
+def run_command(command: str, shell: bool = True, powershell: bool = False, timeout: int = 30) -> Optional[str]:
+    """Execute a shell or PowerShell command with timeout."""
+    try:
+        # Plain shell commands on Windows run under cmd.exe; there is no POSIX shell to pool
+        if powershell or (shell and platform.system() != "Windows"):
+            result = get_command_runner(powershell).run(command, timeout=timeout)
+            result.check_returncode()
+        else:
+            result = subprocess.run(command, shell=shell, capture_output=True, text=True, check=True, timeout=timeout)
+        return result.stdout.strip()
+    except subprocess.TimeoutExpired:
+        logger.error(f"Command timed out: {command}")
+        return None
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Command failed: {command}, Error: {e.stderr}")
+        return None
+    except OSError as e:
+        logger.error(f"Command failed: {command}, Error: {str(e)}")
+        return None
+
+# Privileged broker: default socket (override with NO_TRACE_BROKER_SOCKET), request size limit and client timeout (seconds)
+BROKER_SOCKET = "/run/no-trace/broker.sock"
+BROKER_MAX_REQUEST = 64 * 1024
+BROKER_TIMEOUT = 300
+
+# The only files and directories the broker touches for clients
+BROKER_LOG_FILES = ("/var/log/syslog", "/var/log/messages", "/var/log/auth.log", "/private/var/log/system.log")
+BROKER_TEMP_DIRS = ("/tmp", "/private/tmp")
+RESOLV_CONF = "/etc/resolv.conf"
+ZONEINFO_DIR = "/usr/share/zoneinfo"
+
+IFNAME_RE = re.compile(r'^[A-Za-z0-9_.:-]{1,15}$')
+HOSTNAME_RE = re.compile(r'^[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?$')
+TIMEZONE_RE = re.compile(r'^[A-Za-z0-9_+-]+(/[A-Za-z0-9_+-]+)*$')
+
+def broker_socket_path() -> str:
+    """Return the broker socket path from the environment or the default."""
+    return os.environ.get("NO_TRACE_BROKER_SOCKET", BROKER_SOCKET)
+
+def _run_argv(argv: List[str]) -> None:
+    """Run a fixed command line without a shell, raising CalledProcessError on failure."""
+    subprocess.run(argv, capture_output=True, text=True, check=True, timeout=30)
+
+def _broker_ping() -> Dict:
+    """Report that the broker is alive."""
+    return {"pid": os.getpid()}
+
+def _broker_set_mac(interface: str, mac: str) -> Dict:
+    """Set an interface's MAC address natively, else with ip link."""
+    if not IFNAME_RE.match(interface) or not MAC_RE.match(mac):
+        raise ValueError(f"bad interface or MAC address: {interface} {mac}")
+    mac = mac.replace("-", ":").lower()
+    try:
+        set_mac_native(interface, mac)
+    except OSError:
+        _run_argv(["ip", "link", "set", interface, "down"])
+        try:
+            _run_argv(["ip", "link", "set", interface, "address", mac])
+        finally:
+            _run_argv(["ip", "link", "set", interface, "up"])
+    return {"interface": interface, "mac": mac}
+
+def _broker_truncate_log(path: str) -> Dict:
+    """Empty one of BROKER_LOG_FILES."""
+    if path not in BROKER_LOG_FILES:
+        raise ValueError(f"not an allowed log file: {path}")
+    os.truncate(path, 0)
+    return {"path": path}
+
+def _broker_set_hostname(hostname: str) -> Dict:
+    """Set the hostname with hostnamectl."""
+    if not HOSTNAME_RE.match(hostname):
+        raise ValueError(f"bad hostname: {hostname}")
+    _run_argv(["hostnamectl", "set-hostname", hostname])
+    return {"hostname": hostname}
+
+def _broker_set_timezone(timezone: str) -> Dict:
+    """Set the time zone with timedatectl."""
+    if not TIMEZONE_RE.match(timezone) or not os.path.isfile(os.path.join(ZONEINFO_DIR, timezone)):
+        raise ValueError(f"unknown time zone: {timezone}")
+    _run_argv(["timedatectl", "set-timezone", timezone])
+    return {"timezone": timezone}
+
+def write_resolv_conf(servers: List[str]) -> Dict:
+    """Point RESOLV_CONF at the given resolver addresses."""
+    if not isinstance(servers, list) or not servers:
+        raise ValueError("expected a list of resolver addresses")
+    addresses = [str(ipaddress.ip_address(server)) for server in servers]
+    with open(RESOLV_CONF, 'w') as f:
+        for address in addresses:
+            f.write(f"nameserver {address}\n")
+    return {"servers": addresses}
+
+def _broker_clear_temp(path: str, dry_run: bool = False, min_age: float = 86400, min_size: int = 0,
+                       patterns: Optional[List[str]] = None, exclude: Optional[List[str]] = None) -> Dict:
+    """Clean one of BROKER_TEMP_DIRS with TempCleaner and the client's filters."""
+    if path not in BROKER_TEMP_DIRS:
+        raise ValueError(f"not an allowed temp directory: {path}")
+    return TempCleaner(path, min_age=float(min_age), min_size=int(min_size),
+                       patterns=[str(p) for p in patterns or ["*"]], exclude=[str(p) for p in exclude or []],
+                       dry_run=bool(dry_run)).run()
+
+# Broker allowlist: operation -> handler taking keyword arguments and returning a JSON-serializable dict
+BROKER_OPERATIONS = {
+    'ping': _broker_ping,
+    'set_mac': _broker_set_mac,
+    'truncate_log': _broker_truncate_log,
+    'set_hostname': _broker_set_hostname,
+    'set_timezone': _broker_set_timezone,
+    'write_resolv_conf': write_resolv_conf,
+    'clear_temp': _broker_clear_temp
+}
+
+class PrivilegedBroker:
+    """Serve BROKER_OPERATIONS to root and one allowed user over a Unix socket.
+
+    Requests and responses are JSON lines and a client may send any number
+    of requests on one connection. The socket is owned by the allowed user
+    with mode 0600, and every connection is also checked against the
+    kernel's peer credentials.
+    """
+    def __init__(self, path: str, allowed_uid: int):
+        self.path = path
+        self.allowed_uid = allowed_uid
+        self.requests = 0
+        self._listener = None
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def peer_uid(conn: socket.socket) -> int:
+        """Return the user id of the process at the other end of conn."""
+        if hasattr(socket, "SO_PEERCRED"):
+            size = struct.calcsize("3i")
+            _, uid, _ = struct.unpack("3i", conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, size))
+            return uid
+        # BSD and macOS: LOCAL_PEERCRED (1) at SOL_LOCAL (0) fills struct xucred {u_int version; uid_t uid; ...}
+        return struct.unpack("2I", conn.getsockopt(0, 1, 76)[:8])[1]
+
+    def bind(self) -> None:
+        """Create the listening socket, replacing a stale one from an earlier run."""
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o755, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            if stat.S_ISSOCK(os.lstat(self.path).st_mode):
+                os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.path)
+            os.chmod(self.path, 0o600)
+            os.chown(self.path, self.allowed_uid, -1)
+            listener.listen(16)
+        except OSError:
+            listener.close()
+            raise
+        self._listener = listener
+
+    def serve_forever(self) -> None:
+        """Accept connections until stop(), serving each on its own thread."""
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                if self._stopped.is_set():
+                    break
+                raise
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop accepting connections and remove the socket."""
+        self._stopped.set()
+        if self._listener:
+            self._listener.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        with conn:
+            try:
+                uid = self.peer_uid(conn)
+            except OSError as e:
+                logger.warning(f"Broker: cannot read peer credentials: {str(e)}")
+                return
+            if uid not in (0, self.allowed_uid):
+                logger.warning(f"Broker: rejected connection from uid {uid}")
+                conn.sendall(json.dumps({"ok": False, "error": "permission denied"}).encode() + b"\n")
+                return
+            reader = conn.makefile('rb')
+            try:
+                while True:
+                    line = reader.readline(BROKER_MAX_REQUEST + 1)
+                    if not line:
+                        return
+                    if len(line) > BROKER_MAX_REQUEST:
+                        conn.sendall(json.dumps({"ok": False, "error": "request too large"}).encode() + b"\n")
+                        return
+                    conn.sendall(json.dumps(self.dispatch(line, uid), default=str).encode() + b"\n")
+            except OSError:
+                return
+
+    def dispatch(self, line: bytes, uid: int) -> Dict:
+        """Run one JSON request {op, args} and return {ok, result} or {ok, error}."""
+        try:
+            request = json.loads(line)
+            op, args = request.get("op"), request.get("args") or {}
+        except (ValueError, AttributeError):
+            return {"ok": False, "error": "malformed request"}
+        handler = BROKER_OPERATIONS.get(op) if isinstance(op, str) else None
+        if handler is None or not isinstance(args, dict):
+            logger.warning(f"Broker: refused operation {op!r} from uid {uid}")
+            return {"ok": False, "error": f"operation not allowed: {op}"}
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            response = {"ok": True, "result": handler(**args)}
+        except (TypeError, ValueError) as e:
+            response = {"ok": False, "error": f"invalid arguments: {str(e)}"}
+        except subprocess.CalledProcessError as e:
+            response = {"ok": False, "error": (e.stderr or str(e)).strip()}
+        except (OSError, subprocess.TimeoutExpired) as e:
+            response = {"ok": False, "error": str(e)}
+        duration = time.perf_counter() - started
+        logger.info(f"Broker: {op} for uid {uid} {'done' if response['ok'] else 'failed'} in {duration:.3f}s",
+                    extra={"operation": f"broker.{op}", "duration": round(duration, 6),
+                           "status": "ok" if response["ok"] else "failed"})
+        return response
+
+class BrokerError(RuntimeError):
+    """Raised when the broker refuses or fails an operation."""
+
+class BrokerClient:
+    """Persistent connection to the privileged broker; calls are serialized."""
+    def __init__(self, path: str, timeout: float = BROKER_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock, self._reader = sock, sock.makefile('rb')
+
+    def _disconnect(self) -> None:
+        if self._sock:
+            self._sock.close()
+        self._sock = self._reader = None
+
+    def call(self, op: str, **args):
+        """Run op in the broker and return its result.
+
+        Raises OSError when the broker is unreachable and BrokerError when it
+        refuses or fails the operation. A connection the broker has dropped
+        is reopened once; timeouts are not retried.
+        """
+        request = json.dumps({"op": op, "args": args}).encode() + b"\n"
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(request)
+                    line = self._reader.readline()
+                    if not line:
+                        raise ConnectionResetError("broker closed the connection")
+                    break
+                except TimeoutError:
+                    self._disconnect()
+                    raise
+                except OSError:
+                    self._disconnect()
+                    if attempt:
+                        raise
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise BrokerError(response.get("error", "unknown error"))
+        return response.get("result")
+
+    def close(self) -> None:
+        """Close the connection."""
+        with self._lock:
+            self._disconnect()
+
+_broker_client = None
+
+def get_broker_client() -> Optional[BrokerClient]:
+    """Return the shared broker client, or None on Windows, as root, or when no broker socket exists."""
+    global _broker_client
+    if platform.system() == "Windows" or os.geteuid() == 0:
+        return None
+    if _broker_client is None:
+        path = broker_socket_path()
+        if not os.path.exists(path):
+            return None
+        _broker_client = BrokerClient(path)
+    return _broker_client
+
+def broker_call(op: str, **args) -> Tuple[bool, Optional[Dict]]:
+    """Run an allowlisted privileged operation through the broker.
+
+    Returns (False, None) when no broker is reachable so the caller can fall
+    back to sudo, else (True, result) with None as the result on failure.
+    """
+    client = get_broker_client()
+    if client is None:
+        return False, None
+    try:
+        return True, client.call(op, **args)
+    except BrokerError as e:
+        logger.error(f"Broker {op} failed: {str(e)}")
+        return True, None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Privileged broker unreachable ({str(e)}), falling back to sudo.")
+        return False, None
+
+def broker_available() -> bool:
+    """Check that a broker is listening and accepts this user."""
+    return broker_call("ping")[1] is not None
+
+# Upper bounds (seconds) of the operation latency histogram buckets
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram."""
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one observation."""
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Return (upper bound, cumulative count) pairs ending with +Inf."""
+        total, pairs = 0, []
+        for bound, count in zip([str(b) for b in self.buckets] + ["+Inf"], self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def to_dict(self) -> Dict:
+        """Summarize the histogram for JSON export."""
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "buckets": dict(self.cumulative())
+        }
+
+def _prom_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class RotationMetrics:
+    """Record Mullvad operation latencies, failures and time spent without a tunnel."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.failures = {}
+        self.relay_failures = {}
+        self.rotations = 0
+        self.unprotected_seconds = 0.0
+        self._unprotected_since = None
+
+    def observe(self, operation: str, seconds: float, ok: bool, target: Optional[str] = None) -> None:
+        """Record the duration and outcome of one operation."""
+        with self._lock:
+            self.histograms.setdefault(operation, LatencyHistogram()).observe(seconds)
+            if not ok:
+                self.failures[operation] = self.failures.get(operation, 0) + 1
+                if target:
+                    self.relay_failures[target] = self.relay_failures.get(target, 0) + 1
+            elif operation == "connect_to_server":
+                self.rotations += 1
+
+    def mark_unprotected(self) -> None:
+        """Note that the tunnel is going down."""
+        with self._lock:
+            if self._unprotected_since is None:
+                self._unprotected_since = time.monotonic()
+
+    def mark_protected(self) -> None:
+        """Note that the tunnel is confirmed up, closing any open downtime window."""
+        with self._lock:
+            if self._unprotected_since is not None:
+                self.unprotected_seconds += time.monotonic() - self._unprotected_since
+                self._unprotected_since = None
+
+    def summary(self) -> Dict:
+        """Return all metrics as a JSON-serializable dict."""
+        with self._lock:
+            unprotected = self.unprotected_seconds
+            if self._unprotected_since is not None:
+                unprotected += time.monotonic() - self._unprotected_since
+            return {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "rotations": self.rotations,
+                "unprotected_seconds": round(unprotected, 3),
+                "operations": {name: h.to_dict() for name, h in self.histograms.items()},
+                "failures": dict(self.failures),
+                "relay_failures": dict(self.relay_failures)
+            }
+
+    def to_prometheus(self) -> str:
+        """Render metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            "# HELP no_trace_operation_seconds Duration of Mullvad operations.",
+            "# TYPE no_trace_operation_seconds histogram"
+        ]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                label = f'operation="{_prom_label(name)}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'no_trace_operation_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f"no_trace_operation_seconds_sum{{{label}}} {histogram.sum:.6f}")
+                lines.append(f"no_trace_operation_seconds_count{{{label}}} {histogram.count}")
+        lines += ["# HELP no_trace_operation_failures_total Failed Mullvad operations.",
+                  "# TYPE no_trace_operation_failures_total counter"]
+        for name, count in sorted(summary["failures"].items()):
+            lines.append(f'no_trace_operation_failures_total{{operation="{_prom_label(name)}"}} {count}')
+        lines += ["# HELP no_trace_relay_failures_total Failed connections per relay.",
+                  "# TYPE no_trace_relay_failures_total counter"]
+        for relay, count in sorted(summary["relay_failures"].items()):
+            lines.append(f'no_trace_relay_failures_total{{relay="{_prom_label(relay)}"}} {count}')
+        lines += ["# HELP no_trace_rotations_total Successful relay switches.",
+                  "# TYPE no_trace_rotations_total counter",
+                  f"no_trace_rotations_total {summary['rotations']}",
+                  "# HELP no_trace_unprotected_seconds_total Time spent without a confirmed tunnel.",
+                  "# TYPE no_trace_unprotected_seconds_total counter",
+                  f"no_trace_unprotected_seconds_total {summary['unprotected_seconds']}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_file: str = METRICS_JSON_FILE, prom_file: str = METRICS_PROM_FILE) -> None:
+        """Write the JSON summary and Prometheus textfile."""
+        try:
+            atomic_write(json_file, json.dumps(self.summary(), indent=2))
+            atomic_write(prom_file, self.to_prometheus())
+        except OSError as e:
+            logger.warning(f"Could not export rotation metrics: {str(e)}")
+
+rotation_metrics = RotationMetrics()
+
+# Code flag marking "async def" functions (inspect.CO_COROUTINE, without importing inspect or asyncio)
+CO_COROUTINE = 0x80
+
+def _observe(operation: str, started: float, ok: bool, target: Optional[str]) -> None:
+    """Record an instrumented call in rotation_metrics and as a structured debug log record."""
+    duration = time.perf_counter() - started
+    rotation_metrics.observe(operation, duration, ok, target)
+    logger.debug("Operation finished", extra={"operation": operation, "target": target,
+                                              "duration": round(duration, 4), "status": "ok" if ok else "failed"})
+
+def instrumented(operation: str, per_target: bool = False):
+    """Decorate a sync or async function to record its duration and truthy result in rotation_metrics.
+
+    With per_target, the first argument is recorded as the relay on failure.
+    """
+    def decorator(func):
+        if func.__code__.co_flags & CO_COROUTINE:
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                ok = False
+                try:
+                    result = await func(*args, **kwargs)
+                    ok = bool(result)
+                    return result
+                finally:
+                    _observe(operation, started, ok, args[0] if per_target and args else None)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = bool(result)
+                return result
+            finally:
+                _observe(operation, started, ok, args[0] if per_target and args else None)
+        return wrapper
+    return decorator
+
+@instrumented("login_mullvad")
+def login_mullvad(account_number: str) -> bool:
+    """Log in to Mullvad with provided account number."""
+    logger.info("Attempting Mullvad login...")
+    result = run_command(f"mullvad account login {account_number}")
+    if result and "success" in result.lower():
+        logger.info("Mullvad login successful.")
+        return True
+    logger.error("Mullvad login failed.")
+    return False
+
+# Country codes people commonly use that differ from Mullvad's
+COUNTRY_ALIASES = {"uk": "gb"}
+
+RELAY_LINE_RE = re.compile(
+    r'^(?P<hostname>[a-z]{2}-[a-z0-9]+-[\w-]+) \((?P<addresses>[^)]*)\)'
+    r'\s*-\s*(?P<protocol>[\w ]+?)(?:,\s*hosted by (?P<provider>.+?))?'
+    r'(?:\s*\((?P<ownership>Mullvad-owned|rented)\))?\s*$'
+)
+LOCATION_LINE_RE = re.compile(r'^(?P<name>.+?) \((?P<code>[a-z0-9]+)\)')
+
+def parse_relay_list(output: str) -> Dict[str, Dict]:
+    """Parse `mullvad relay list` output into country -> city -> relays."""
+    countries = {}
+    country = city = None
+    for line in output.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        relay = RELAY_LINE_RE.match(stripped)
+        if relay and country and city:
+            addresses = [a.strip() for a in relay.group("addresses").split(",")]
+            city["relays"].append({
+                "hostname": relay.group("hostname"),
+                "country": country_code,
+                "city": city_code,
+                "ipv4": next((a for a in addresses if "." in a), None),
+                "ipv6": next((a for a in addresses if ":" in a), None),
+                "protocol": relay.group("protocol").strip().lower(),
+                "provider": relay.group("provider"),
+                "owned": relay.group("ownership") == "Mullvad-owned"
+            })
+            continue
+        location = LOCATION_LINE_RE.match(stripped)
+        if not location:
+            continue
+        if not line[0].isspace():
+            country_code = location.group("code")
+            country = countries.setdefault(country_code, {"name": location.group("name"), "cities": {}})
+            city = None
+        elif country is not None:
+            city_code = location.group("code")
+            city = country["cities"].setdefault(city_code, {"name": location.group("name"), "relays": []})
+    return countries
+
+class RelayCatalog:
+    """Mullvad relay list persisted to disk, refreshed in the background once stale."""
+    def __init__(self, cache_file: str = RELAY_CATALOG_FILE, ttl: int = RELAY_CATALOG_TTL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.fetched_at = 0.0
+        self.countries = {}
+        self._by_country = {}
+        self._lock = threading.Lock()
+        self._refreshing = None
+
+    def _index(self, countries: Dict[str, Dict], fetched_at: float) -> None:
+        """Swap in a new relay tree and rebuild the per-country index."""
+        by_country = {
+            code: [relay for city in country["cities"].values() for relay in city["relays"]]
+            for code, country in countries.items()
+        }
+        with self._lock:
+            self.countries = countries
+            self.fetched_at = fetched_at
+            self._by_country = by_country
+
+    def refresh(self) -> bool:
+        """Fetch the relay list from the Mullvad CLI and persist it."""
+        logger.info("Fetching Mullvad server list...")
+        result = run_command("mullvad relay list")
+        countries = parse_relay_list(result or "")
+        if not countries:
+            logger.error("Failed to fetch server list.")
+            return False
+        fetched_at = time.time()
+        self._index(countries, fetched_at)
+        try:
+            atomic_write(self.cache_file, json.dumps({"fetched_at": fetched_at, "countries": countries}))
+        except OSError as e:
+            logger.warning(f"Could not save relay catalog: {str(e)}")
+        logger.info(f"Cached {self.relay_count()} relays in {len(countries)} countries.")
+        return True
+
+    def _refresh_in_background(self) -> None:
+        """Start a refresh thread unless one is already running."""
+        if self._refreshing and self._refreshing.is_alive():
+            return
+        self._refreshing = threading.Thread(target=self.refresh, name="relay-catalog-refresh", daemon=True)
+        self._refreshing.start()
+
+    def load(self) -> bool:
+        """Load the cached catalog, fetching synchronously only when there is no cache."""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            self._index(cached["countries"], float(cached["fetched_at"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            return self.refresh()
+        if time.time() - self.fetched_at > self.ttl:
+            logger.info("Relay catalog is stale, refreshing in the background.")
+            self._refresh_in_background()
+        return bool(self.countries)
+
+    def relay_count(self) -> int:
+        """Return the number of relays in the catalog."""
+        with self._lock:
+            return sum(len(relays) for relays in self._by_country.values())
+
+    def select(self, countries: Optional[List[str]] = None, protocol: Optional[str] = "wireguard",
+               owned: Optional[bool] = None) -> List[Dict]:
+        """Return relays in the given countries matching protocol and ownership filters."""
+        with self._lock:
+            if countries:
+                codes = [COUNTRY_ALIASES.get(c.strip().lower(), c.strip().lower()) for c in countries if c.strip()]
+            else:
+                codes = list(self._by_country)
+            relays = [relay for code in codes for relay in self._by_country.get(code, [])]
+        return [
+            relay for relay in relays
+            if (protocol is None or relay["protocol"] == protocol) and (owned is None or relay["owned"] == owned)
+        ]
+
+def relay_location(relay: Dict) -> str:
+    """Format a relay as arguments for `mullvad relay set location`."""
+    return f"{relay['country']} {relay['city']} {relay['hostname']}"
+
+def get_mullvad_servers(preferred_countries: List[str] = None, catalog: Optional[RelayCatalog] = None) -> List[str]:
+    """Retrieve WireGuard relays in the preferred countries as relay locations."""
+    catalog = catalog or RelayCatalog()
+    if not catalog.load():
+        return []
+    servers = [relay_location(relay) for relay in catalog.select(preferred_countries)]
+    random.shuffle(servers)
+    logger.info(f"Selected {len(servers)} relays.")
+    return servers
+
+# Relay latency probe defaults: TCP port, per-probe timeout and concurrent probes
+PROBE_PORT = 443
+PROBE_TIMEOUT = 2.0
+PROBE_CONCURRENCY = 32
+
+async def tcp_connect_probe(host: str, port: int = PROBE_PORT, timeout: float = PROBE_TIMEOUT) -> Optional[float]:
+    """Measure TCP handshake round-trip time in seconds, or None when the host does not answer.
+
+    A refused connection still proves the host answered, so it counts as a
+    measurement.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        return loop.time() - started
+    except (OSError, asyncio.TimeoutError):
+        return None
+    elapsed = loop.time() - started
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return elapsed
+
+class RelayProber:
+    """Rank relays by round-trip latency measured concurrently with a pluggable probe.
+
+    ``probe`` is an async callable taking (host, port, timeout) and returning
+    seconds or None; relays are probed at their ``ipv4`` address and at their
+    ``port`` key when present, else at ``port``.
+    """
+    def __init__(self, probe=None, port: int = PROBE_PORT, timeout: float = PROBE_TIMEOUT,
+                 concurrency: int = PROBE_CONCURRENCY, attempts: int = 2):
+        self.probe = probe or tcp_connect_probe
+        self.port = port
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.attempts = attempts
+
+    async def measure(self, relays: List[Dict]) -> List[Tuple[Dict, Optional[float]]]:
+        """Probe every relay and return (relay, best latency) pairs in input order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe_relay(relay: Dict) -> Optional[float]:
+            if not relay.get("ipv4"):
+                return None
+            samples = []
+            async with semaphore:
+                for _ in range(self.attempts):
+                    sample = await self.probe(relay["ipv4"], relay.get("port", self.port), self.timeout)
+                    if sample is not None:
+                        samples.append(sample)
+            return min(samples) if samples else None
+
+        latencies = await asyncio.gather(*(probe_relay(relay) for relay in relays))
+        return list(zip(relays, latencies))
+
+    async def rank(self, relays: List[Dict], top_n: Optional[int] = None) -> List[Dict]:
+        """Return reachable relays ordered fastest first, limited to top_n."""
+        measured = [(relay, latency) for relay, latency in await self.measure(relays) if latency is not None]
+        measured.sort(key=lambda item: item[1])
+        for relay, latency in measured[:top_n]:
+            logger.info(f"Relay {relay['hostname']}: {latency * 1000:.1f} ms")
+        logger.info(f"{len(measured)} of {len(relays)} relays answered latency probes.")
+        return [relay for relay, _ in measured[:top_n]]
+
+class LatencySelector:
+    """Keep the fastest relays, re-probing once the ranking is older than probe_interval."""
+    def __init__(self, relays: List[Dict], prober: Optional[RelayProber] = None,
+                 top_n: int = 5, probe_interval: int = 900):
+        self.relays = relays
+        self.prober = prober or RelayProber()
+        self.top_n = top_n
+        self.probe_interval = probe_interval
+        self.probed_at = None
+        self._ranked = []
+
+    def set_relays(self, relays: List[Dict]) -> None:
+        """Replace the candidate relays; the next call to servers() re-probes."""
+        self.relays = relays
+        self.probed_at = None
+        self._ranked = []
+
+    async def servers(self) -> List[str]:
+        """Return the current fastest relay locations, re-probing when due."""
+        now = time.monotonic()
+        if not self._ranked or self.probed_at is None or now - self.probed_at >= self.probe_interval:
+            logger.info(f"Probing latency to {len(self.relays)} relays...")
+            ranked = await self.prober.rank(self.relays, self.top_n)
+            self.probed_at = now
+            if ranked:
+                self._ranked = ranked
+            elif not self._ranked:
+                logger.warning("No relay answered latency probes, using catalog order.")
+                self._ranked = self.relays[:self.top_n]
+        return [relay_location(relay) for relay in self._ranked]
+
+# Tunnel states reported by `mullvad status`
+TUNNEL_STATES = {"connected", "connecting", "disconnected", "disconnecting", "blocked", "error"}
+
+# Seconds between `mullvad status` polls when `mullvad status listen` is unavailable
+STATUS_POLL_INTERVAL = 0.5
+
+# Pause after a failed connection attempt, and cap (seconds) of the backoff after a pass with no connection
+ROTATION_RETRY_DELAY = 2.0
+ROTATION_BACKOFF_MAX = 300
+
+def parse_tunnel_state(output: str) -> Optional[str]:
+    """Extract the tunnel state from `mullvad status` output."""
+    for line in output.splitlines():
+        if not line.strip() or line[0].isspace():
+            continue
+        word = line.split()[0].rstrip(":.,").lower()
+        if word in TUNNEL_STATES:
+            return word
+    return None
+
+class TunnelStateWatcher:
+    """Track the Mullvad tunnel state by following `mullvad status listen`.
+
+    Falls back to polling `mullvad status` when the listen stream is not
+    available or ends.
+    """
+    def __init__(self):
+        self.state = None
+        self.transitions = 0
+        self._changed = asyncio.Condition()
+        self._proc = None
+        self._task = None
+
+    async def start(self) -> None:
+        """Read the current state and begin following state changes."""
+        output = await asyncio.to_thread(run_command, "mullvad status")
+        self.state = parse_tunnel_state(output or "")
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                "mullvad", "status", "listen",
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+        except OSError as e:
+            logger.warning(f"Cannot follow tunnel state, polling instead: {str(e)}")
+            self._proc = None
+        self._task = asyncio.create_task(self._follow())
+
+    async def stop(self) -> None:
+        """Stop following state changes."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._proc and self._proc.returncode is None:
+            self._proc.terminate()
+            await self._proc.wait()
+
+    async def _set(self, state: str) -> None:
+        """Record a new state and wake any waiters."""
+        async with self._changed:
+            if state != self.state:
+                logger.info(f"Tunnel state: {state}")
+                self.transitions += 1
+            self.state = state
+            self._changed.notify_all()
+
+    async def _follow(self) -> None:
+        """Consume the listen stream, then poll if it ends."""
+        if self._proc:
+            async for raw in self._proc.stdout:
+                state = parse_tunnel_state(raw.decode(errors="replace"))
+                if state:
+                    await self._set(state)
+            logger.warning("Tunnel state stream ended, polling instead.")
+        while True:
+            output = await asyncio.to_thread(run_command, "mullvad status")
+            state = parse_tunnel_state(output or "")
+            if state:
+                await self._set(state)
+            await asyncio.sleep(STATUS_POLL_INTERVAL)
+
+    async def wait_for(self, states: set, timeout: float, after: Optional[int] = None) -> bool:
+        """Wait until the tunnel reaches one of the given states; False on timeout.
+
+        With after (a previous transitions count), only a state entered since
+        then counts, so a stale state from before a command is not mistaken
+        for its outcome.
+        """
+        def reached() -> bool:
+            return self.state in states and (after is None or self.transitions > after)
+
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(reached), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def wait_while(self, state: str, timeout: float) -> bool:
+        """Wait up to timeout while the tunnel stays in a state; True if it left early."""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.state != state), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+@instrumented("check_connection")
+async def check_connection_async(watcher: TunnelStateWatcher, timeout: int = 10, after: Optional[int] = None) -> bool:
+    """Wait for the tunnel to settle and confirm it is connected.
+
+    With after, only a state entered since that transitions count counts
+    (see TunnelStateWatcher.wait_for).
+    """
+    settled = await watcher.wait_for({"connected", "blocked", "error"}, timeout, after=after)
+    if settled and watcher.state == "connected":
+        rotation_metrics.mark_protected()
+        return True
+    return False
+
+@instrumented("connect_to_server", per_target=True)
+async def connect_to_server_async(location: str, watcher: TunnelStateWatcher, timeout: int = 10) -> bool:
+    """Connect to a Mullvad server location and wait for the tunnel to come up."""
+    logger.info(f"Connecting to {location}...")
+    # Changing the relay of a live tunnel already reconnects, so mark before the first command
+    mark = watcher.transitions
+    result = await asyncio.to_thread(run_command, f"mullvad relay set location {location}")
+    if result is not None and await asyncio.to_thread(run_command, "mullvad connect") is not None:
+        if await check_connection_async(watcher, timeout, after=mark):
+            invalidate_public_ip()
+            logger.info(f"Connected to {location}")
+            return True
+    logger.error(f"Failed to connect to {location}")
+    return False
+
+@instrumented("disconnect_vpn")
+async def disconnect_vpn_async(watcher: TunnelStateWatcher, timeout: int = 10) -> bool:
+    """Disconnect the VPN and wait for the tunnel to go down."""
+    logger.info("Disconnecting VPN...")
+    rotation_metrics.mark_unprotected()
+    invalidate_public_ip()
+    if await asyncio.to_thread(run_command, "mullvad disconnect") is not None:
+        if await watcher.wait_for({"disconnected"}, timeout):
+            logger.info("VPN disconnected successfully.")
+            return True
+    logger.error("Failed to disconnect VPN.")
+    return False
+
+async def _with_watcher(operation) -> bool:
+    """Run a tunnel operation with a short-lived state watcher."""
+    watcher = TunnelStateWatcher()
+    await watcher.start()
+    try:
+        return await operation(watcher)
+    finally:
+        await watcher.stop()
+
+def disconnect_vpn(timeout: int = 10) -> bool:
+    """Disconnect from the current VPN server."""
+    return asyncio.run(_with_watcher(lambda watcher: disconnect_vpn_async(watcher, timeout)))
+
+async def rotate_servers(servers: List[str], rotation_interval: int, timeout: int = 10,
+                         selector: Optional[LatencySelector] = None, max_rotations: Optional[int] = None,
+                         config_manager: Optional['ConfigManager'] = None) -> None:
+    """Cycle through servers, advancing as soon as each tunnel transition completes.
+
+    A relay is kept for rotation_interval seconds unless the tunnel drops
+    first, in which case the next server is tried immediately. With a
+    selector, each pass uses its current fastest relays instead of servers.
+    Stops after max_rotations connection attempts when given. With a
+    config_manager, the file is checked before each attempt; a reload
+    starts a new pass so changed servers apply immediately.
+
+    Failed attempts are followed by ROTATION_RETRY_DELAY, and a pass
+    without any connection by a backoff starting at timeout and doubling
+    up to ROTATION_BACKOFF_MAX, so a stopped daemon is not hammered.
+    """
+    watcher = TunnelStateWatcher()
+    await watcher.start()
+    attempts = failed_passes = 0
+
+    def remaining() -> bool:
+        return max_rotations is None or attempts < max_rotations
+
+    try:
+        while remaining():
+            if selector:
+                servers = await selector.servers()
+            connected_in_pass = reloaded = False
+            for server in list(servers):
+                if not remaining():
+                    break
+                if config_manager and config_manager.reload_if_changed():
+                    rotation_interval = config_manager.settings.mullvad.rotation_interval
+                    timeout = config_manager.settings.mullvad.connection_timeout
+                    reloaded = True
+                    break
+                attempts += 1
+                await disconnect_vpn_async(watcher, timeout)
+                connected = await connect_to_server_async(server, watcher, timeout)
+                rotation_metrics.export()
+                if connected:
+                    connected_in_pass, failed_passes = True, 0
+                    logger.info(f"Connected to {server}. Waiting {rotation_interval} seconds...")
+                    if await watcher.wait_while("connected", rotation_interval):
+                        logger.warning(f"Tunnel to {server} dropped ({watcher.state}). Rotating early...")
+                elif remaining():
+                    logger.warning(f"Failed to connect to {server}. Trying next server...")
+                    await asyncio.sleep(ROTATION_RETRY_DELAY)
+            if not connected_in_pass and not reloaded and remaining():
+                failed_passes += 1
+                delay = min(ROTATION_BACKOFF_MAX, timeout * 2 ** (failed_passes - 1))
+                logger.warning(f"No server connected in this pass. Retrying in {delay} seconds...")
+                await asyncio.sleep(delay)
+    finally:
+        await watcher.stop()
+        rotation_metrics.export()
+
+# Linux network interface sysfs root and ioctl constants used to change MAC addresses
+SYS_CLASS_NET = "/sys/class/net"
+SIOCGIFFLAGS = 0x8913
+SIOCSIFFLAGS = 0x8914
+SIOCSIFHWADDR = 0x8924
+IFF_UP = 0x1
+ARPHRD_ETHER = 1
+
+MAC_RE = re.compile(r'^([0-9a-fA-F]{2}[:-]){5}[0-9a-fA-F]{2}$')
+
+def random_mac() -> str:
+    """Generate a random locally administered unicast MAC address."""
+    octets = [random.randint(0x00, 0xff) for _ in range(6)]
+    octets[0] = (octets[0] & 0xfc) | 0x02
+    return ":".join(f"{octet:02x}" for octet in octets)
+
+def _read_sysfs(path: str) -> Optional[str]:
+    """Read a one-line sysfs attribute."""
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def list_network_interfaces() -> List[Dict]:
+    """List Linux network interfaces with state and MAC address from /sys/class/net."""
+    interfaces = []
+    try:
+        names = sorted(os.listdir(SYS_CLASS_NET))
+    except OSError:
+        return interfaces
+    for name in names:
+        base = os.path.join(SYS_CLASS_NET, name)
+        if _read_sysfs(os.path.join(base, "type")) != str(ARPHRD_ETHER):
+            continue
+        interfaces.append({
+            "name": name,
+            "state": _read_sysfs(os.path.join(base, "operstate")) or "unknown",
+            "mac": _read_sysfs(os.path.join(base, "address")),
+            "virtual": "/virtual/" in os.path.realpath(base)
+        })
+    return interfaces
+
+def primary_interface() -> Optional[str]:
+    """Return the first physical interface that is up, else any Ethernet-type interface that is up."""
+    up = [i for i in list_network_interfaces() if i["state"] == "up"]
+    physical = [i for i in up if not i["virtual"]]
+    return (physical or up or [{}])[0].get("name")
+
+def current_mac_address() -> Optional[str]:
+    """Return the primary interface's MAC address."""
+    if os.path.isdir(SYS_CLASS_NET):
+        interface = primary_interface()
+        if interface:
+            return _read_sysfs(os.path.join(SYS_CLASS_NET, interface, "address"))
+    return getmac.get_mac_address()
+
+def set_mac_native(interface: str, mac: str) -> None:
+    """Take the interface down, set its hardware address and bring it up with ioctls.
+
+    Raises OSError when the native path is unavailable or the kernel refuses.
+    """
+    if fcntl is None or not os.path.isdir(SYS_CLASS_NET):
+        raise OSError("native interface control is unavailable on this platform")
+    name = interface.encode()
+    if len(name) > 15:
+        raise OSError(f"invalid interface name: {interface}")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ifreq = fcntl.ioctl(sock, SIOCGIFFLAGS, struct.pack('16sH14x', name, 0))
+        flags = struct.unpack('16sH', ifreq[:18])[1]
+        fcntl.ioctl(sock, SIOCSIFFLAGS, struct.pack('16sH14x', name, flags & ~IFF_UP))
+        try:
+            address = bytes.fromhex(mac.replace(":", "").replace("-", ""))
+            fcntl.ioctl(sock, SIOCSIFHWADDR, struct.pack('16sH6s8x', name, ARPHRD_ETHER, address))
+        finally:
+            fcntl.ioctl(sock, SIOCSIFFLAGS, struct.pack('16sH14x', name, flags | IFF_UP))
+
+def spoof_mac_address(interface: str = None, specific_mac: str = None):
+    """Spoof MAC address for the specified or primary network interface."""
+    logger.info("Attempting to spoof MAC address...")
+    if specific_mac and not MAC_RE.match(specific_mac):
+        logger.error(f"Invalid MAC address: {specific_mac}")
+        print("Error: Invalid MAC address. Use the form 02:00:00:00:00:01.")
+        return False
+    if specific_mac:
+        # ip link only accepts colon separators
+        specific_mac = specific_mac.replace("-", ":").lower()
+    if platform.system() == "Windows":
+        adapter = run_command(
+            "Get-NetAdapter | Where-Object {$_.Status -eq 'Up' -and $_.InterfaceDescription -notlike '*Virtual*'} | Select-Object -First 1 | Select-Object -ExpandProperty Name",
+            powershell=True
+        )
+        if not adapter:
+            logger.error("No active network adapter found.")
+            print("Error: No active network adapter found.")
+            return False
+
+        mac = specific_mac or random_mac()
+        logger.info(f"Using MAC address: {mac}")
+
+        result = run_command(
+            f"Set-NetAdapter -Name '{adapter}' -MacAddress '{mac}'",
+            powershell=True
+        )
+        if result:
+            run_command(f"netsh interface set interface '{adapter}' admin=disable")
+            time.sleep(1)
+            run_command(f"netsh interface set interface '{adapter}' admin=enable")
+            logger.info(f"Spoofed MAC address to {mac} on {adapter}")
+            print(f"MAC address changed to {mac} on {adapter}.")
+            return True
+        logger.error("Failed to spoof MAC address.")
+        print("Error: Failed to spoof MAC address. Run as Administrator.")
+        return False
+    else:
+        if not interface and os.path.isdir(SYS_CLASS_NET):
+            interface = primary_interface()
+        interface = interface or run_command("ip link | grep 'state UP' | awk '{print $2}' | cut -d':' -f1 | head -n1")
+        if not interface:
+            logger.error("No active network interface found.")
+            print("Error: No active network interface found.")
+            return False
+
+        mac = specific_mac or random_mac()
+        logger.info(f"Using MAC address: {mac}")
+
+        handled, result = broker_call("set_mac", interface=interface, mac=mac)
+        if handled:
+            if result:
+                logger.info(f"Spoofed MAC address to {mac} on {interface}")
+                print(f"MAC address changed to {mac} on {interface}.")
+                return True
+            print("Error: Failed to spoof MAC address.")
+            return False
+
+        try:
+            set_mac_native(interface, mac)
+            logger.info(f"Spoofed MAC address to {mac} on {interface}")
+            print(f"MAC address changed to {mac} on {interface}.")
+            return True
+        except OSError as e:
+            logger.info(f"Native MAC change unavailable ({str(e)}), falling back to ip link.")
+
+        results = get_command_runner().run_batch([
+            f"sudo ip link set {shlex.quote(interface)} down",
+            f"sudo ip link set {shlex.quote(interface)} address {mac}",
+            f"sudo ip link set {shlex.quote(interface)} up"
+        ])
+        for result in results:
+            if result.returncode != 0:
+                logger.error(f"Command failed: {result.args}, Error: {result.stderr}")
+
+        if results[1].returncode == 0:
+            logger.info(f"Spoofed MAC address to {mac} on {interface}")
+            print(f"MAC address changed to {mac} on {interface}.")
+            return True
+        logger.error("Failed to spoof MAC address.")
+        print("Error: Failed to spoof MAC address.")
+        return False
+
+def truncate_log_file(path: str) -> bool:
+    """Empty a system log file through the privileged broker, else with sudo."""
+    handled, result = broker_call("truncate_log", path=path)
+    if handled:
+        return result is not None
+    return run_command(f"sudo truncate -s 0 {shlex.quote(path)}") is not None
+
+def clear_logs_and_cache(clear_logs: bool = True, clear_temp: bool = True,
+                         settings: Optional[Settings] = None, dry_run: bool = False) -> Dict[str, List]:
+    """Clear system logs and cache with granular control.
+
+    Temporary directories are cleaned in place by TempCleaner using the
+    [privacy] temp_* filters; the directories themselves are kept. With
+    dry_run nothing is changed and the result lists what would be cleared.
+    """
+    logger.info("Clearing system logs and cache...")
+    system = platform.system()
+    cleared = {"logs": [], "temp": []}
+
+    if system == "Windows":
+        if clear_logs and dry_run:
+            cleared["logs"].append("Windows Event Logs")
+        elif clear_logs:
+            if run_command("wevtutil el | ForEach-Object {wevtutil cl $_}", powershell=True) is not None:
+                cleared["logs"].append("Windows Event Logs")
+            logger.info("Cleared Windows Event Logs")
+        if clear_temp:
+            temp_dir = os.environ.get("TEMP", os.path.expandvars("%TEMP%"))
+            if os.path.exists(temp_dir):
+                cleared["temp"].append(clean_temp_directory(temp_dir, settings, dry_run))
+        if dry_run:
+            print(f"Would clear {len(cleared['logs'])} log sources.")
+        else:
+            print("Windows logs and temp files cleared.")
+    elif system == "Darwin":
+        if clear_logs:
+            log_dirs = ["/private/var/log/system.log"]
+            for log_file in log_dirs:
+                if os.path.exists(log_file) and dry_run:
+                    cleared["logs"].append(log_file)
+                elif os.path.exists(log_file):
+                    if truncate_log_file(log_file):
+                        cleared["logs"].append(log_file)
+                    logger.info(f"Cleared log file: {log_file}")
+        if clear_temp:
+            if os.path.exists("/private/tmp"):
+                cleared["temp"].append(clean_temp_directory("/private/tmp", settings, dry_run))
+        if dry_run:
+            print(f"Would clear {len(cleared['logs'])} log sources.")
+        else:
+            print("macOS logs and temp files cleared.")
+    else:  # Linux
+        if clear_logs:
+            log_dirs = ["/var/log/syslog", "/var/log/messages", "/var/log/auth.log"]
+            for log_file in log_dirs:
+                if os.path.exists(log_file) and dry_run:
+                    cleared["logs"].append(log_file)
+                elif os.path.exists(log_file):
+                    if truncate_log_file(log_file):
+                        cleared["logs"].append(log_file)
+                    logger.info(f"Cleared log file: {log_file}")
+        if clear_temp:
+            if os.path.exists("/tmp"):
+                cleared["temp"].append(clean_temp_directory("/tmp", settings, dry_run))
+        if dry_run:
+            print(f"Would clear {len(cleared['logs'])} log sources.")
+        else:
+            print("Linux logs and temp files cleared.")
+    pause()
+    return cleared
+
+def atomic_write(path: str, data: str) -> None:
+    """Write a file via a temporary sibling and os.replace so readers never see a partial file.
+
+    The file keeps its mode and owner; a new file gets mode 0644 and the
+    directory's owner, so running under sudo never leaves root-owned files
+    in a user's browser profile.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        st = os.stat(path)
+        mode = stat.S_IMODE(st.st_mode)
+    except FileNotFoundError:
+        st = os.stat(directory)
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix=".no-trace-", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            if hasattr(os, "fchown"):
+                tmp_stat = os.fstat(f.fileno())
+                if (tmp_stat.st_uid, tmp_stat.st_gid) != (st.st_uid, st.st_gid):
+                    # Only root can give files away; others keep the file as their own
+                    with contextlib.suppress(PermissionError):
+                        os.fchown(f.fileno(), st.st_uid, st.st_gid)
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# Markers delimiting the block of Firefox prefs managed in user.js
+USER_JS_BEGIN = "// BEGIN no-trace managed prefs (rewritten on every run, do not edit)"
+USER_JS_END = "// END no-trace managed prefs"
+USER_PREF_RE = re.compile(r'^\s*user_pref\(\s*"((?:[^"\\]|\\.)*)"\s*,')
+
+def format_user_pref(key: str, value) -> str:
+    """Render a Firefox user_pref line."""
+    if isinstance(value, bool):
+        literal = "true" if value else "false"
+    elif isinstance(value, int):
+        literal = str(value)
+    else:
+        literal = json.dumps(str(value))
+    return f"user_pref({json.dumps(key)}, {literal});"
+
+def render_user_js(content: str, prefs: Dict[str, object]) -> str:
+    """Merge prefs into the managed user.js block, keeping everything outside it untouched."""
+    lines = content.splitlines()
+    managed = {}
+    before, after = lines, []
+    if USER_JS_BEGIN in lines:
+        start = lines.index(USER_JS_BEGIN)
+        end = lines.index(USER_JS_END, start) if USER_JS_END in lines[start:] else len(lines)
+        before, block, after = lines[:start], lines[start + 1:end], lines[end + 1:]
+        for line in block:
+            match = USER_PREF_RE.match(line)
+            if match:
+                managed[match.group(1)] = line.strip()
+    for key, value in prefs.items():
+        managed[key] = format_user_pref(key, value)
+    block = [USER_JS_BEGIN] + [managed[key] for key in sorted(managed)] + [USER_JS_END]
+    return "\n".join(before + block + after) + "\n"
+
+class PreferencesPatcher:
+    """Batch browser preference changes into one read and one atomic write per profile.
+
+    Chromium changes are applied to the profile's Preferences JSON; Firefox
+    changes are kept in a managed block of the profile's user.js.
+    """
+    def __init__(self):
+        self._patches = {}
+
+    def _entry(self, path: str, kind: str, label: str) -> Dict:
+        """Return the pending change list for a preferences file."""
+        return self._patches.setdefault(path, {"kind": kind, "label": label, "changes": []})
+
+    def set(self, browser: str, profile: Dict[str, str], key_path: str, value, description: str) -> None:
+        """Queue a value for a dotted preference path in a Chromium profile's Preferences file."""
+        entry = self._entry(os.path.join(profile["path"], "Preferences"), "chromium", f"{browser} ({profile['name']})")
+        entry["changes"].append((key_path.split("."), value, description))
+
+    def set_firefox(self, profile: Dict[str, str], key: str, value, description: str) -> None:
+        """Queue a pref for the managed block of a Firefox profile's user.js."""
+        entry = self._entry(os.path.join(profile["path"], "user.js"), "firefox", f"Firefox ({profile['name']})")
+        entry["changes"].append((key, value, description))
+
+    @staticmethod
+    def _apply(prefs: Dict, keys: List[str], value) -> bool:
+        """Set a nested key, returning True when the document changed."""
+        node = prefs
+        for key in keys[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if keys[-1] in node and node[keys[-1]] == value:
+            return False
+        node[keys[-1]] = value
+        return True
+
+    def _commit_chromium(self, prefs_file: str, changes: List) -> bool:
+        """Apply changes to a Preferences file, returning True when it was rewritten."""
+        with open(prefs_file, 'r', encoding='utf-8') as f:
+            prefs = json.load(f)
+        if not isinstance(prefs, dict):
+            raise ValueError("Preferences root is not an object")
+        changed = False
+        for keys, value, _ in changes:
+            changed = self._apply(prefs, keys, value) or changed
+        if changed:
+            atomic_write(prefs_file, json.dumps(prefs, separators=(',', ':')))
+        return changed
+
+    def _commit_firefox(self, user_js: str, changes: List) -> bool:
+        """Rewrite the managed user.js block, returning True when it was rewritten."""
+        content = ""
+        if os.path.exists(user_js):
+            with open(user_js, 'r', encoding='utf-8') as f:
+                content = f.read()
+        updated = render_user_js(content, {key: value for key, value, _ in changes})
+        if updated == content:
+            return False
+        atomic_write(user_js, updated)
+        return True
+
+    def commit(self) -> Dict[str, str]:
+        """Apply all queued changes and return the outcome for each preferences file."""
+        outcomes = {}
+        for path, entry in self._patches.items():
+            label = entry["label"]
+            try:
+                if entry["kind"] == "firefox":
+                    changed = self._commit_firefox(path, entry["changes"])
+                else:
+                    changed = self._commit_chromium(path, entry["changes"])
+                outcomes[path] = "written" if changed else "unchanged"
+                for _, _, description in entry["changes"]:
+                    logger.info(f"{label}: {description}")
+                    print(f"{label}: {description}")
+            except Exception as e:
+                outcomes[path] = f"error: {str(e)}"
+                logger.error(f"Failed to modify {label} preferences: {str(e)}")
+                print(f"Error: Failed to modify {label} preferences.")
+        self._patches = {}
+        return outcomes
+
+def compact_firefox_prefs(firefox_dir: Optional[str] = None) -> Dict[str, int]:
+    """Drop duplicate user_pref lines from every Firefox profile's prefs.js, keeping the last value."""
+    logger.info("Compacting Firefox prefs.js files...")
+    removed = {}
+    profiles = get_firefox_profiles(firefox_dir)
+    if not profiles:
+        logger.warning("Firefox profiles not found.")
+        print("Firefox not found.")
+    for profile in profiles:
+        prefs_js = os.path.join(profile["path"], "prefs.js")
+        if not os.path.exists(prefs_js):
+            continue
+        try:
+            with open(prefs_js, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            keys = [USER_PREF_RE.match(line) for line in lines]
+            keys = [match.group(1) if match else None for match in keys]
+            last_seen = {key: index for index, key in enumerate(keys) if key is not None}
+            keep = [line for index, (line, key) in enumerate(zip(lines, keys)) if key is None or last_seen[key] == index]
+            removed[profile["id"]] = len(lines) - len(keep)
+            if removed[profile["id"]]:
+                atomic_write(prefs_js, "\n".join(keep) + "\n")
+            logger.info(f"Removed {removed[profile['id']]} duplicate prefs from Firefox profile: {profile['id']}")
+            print(f"Firefox ({profile['name']}): removed {removed[profile['id']]} duplicate prefs.")
+        except Exception as e:
+            logger.error(f"Failed to compact prefs.js for Firefox profile {profile['id']}: {str(e)}")
+            print(f"Error: Failed to compact Firefox profile {profile['name']}.")
+    return removed
+
+def disable_webrtc(browsers: List[str], patcher: Optional[PreferencesPatcher] = None) -> Optional[Dict[str, str]]:
+    """Disable WebRTC for specified browsers.
+
+    Changes are queued on ``patcher`` when given and left for the caller
+    to commit; otherwise they are written and the outcomes returned.
+    """
+    logger.info("Disabling WebRTC...")
+    own_patcher = patcher is None
+    patcher = patcher or PreferencesPatcher()
+
+    for browser in browsers:
+        if browser == "Firefox":
+            profiles = get_firefox_profiles()
+            if not profiles:
+                logger.warning("Firefox profiles not found.")
+                print("Firefox not found.")
+            for profile in profiles:
+                patcher.set_firefox(profile, "media.peerconnection.enabled", False, "WebRTC disabled.")
+        else:
+            profiles = get_chromium_profiles(browser)
+            if not profiles:
+                logger.warning(f"{browser} preferences file not found.")
+                print(f"{browser} not found.")
+            for profile in profiles:
+                patcher.set(browser, profile, "webrtc.enabled", False, "WebRTC disabled.")
+    if own_patcher:
+        outcomes = patcher.commit()
+        pause()
+        return outcomes
+    return None
+
+def randomize_user_agent(browsers: List[str], patcher: Optional[PreferencesPatcher] = None) -> Optional[Dict[str, str]]:
+    """Randomize user agent for specified browsers.
+
+    Changes are queued on ``patcher`` when given and left for the caller
+    to commit; otherwise they are written and the outcomes returned.
+    """
+    logger.info("Randomizing user agents...")
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        "Mozilla/5.0 (X11; Linux x86_64; rv:89.0) Gecko/20100101 Firefox/89.0",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:89.0) Gecko/20100101 Firefox/89.0"
+    ]
+    own_patcher = patcher is None
+    patcher = patcher or PreferencesPatcher()
+
+    for browser in browsers:
+        if browser == "Firefox":
+            profiles = get_firefox_profiles()
+            if not profiles:
+                logger.warning("Firefox profiles not found.")
+                print("Firefox not found.")
+            for profile in profiles:
+                new_user_agent = random.choice(user_agents)
+                patcher.set_firefox(profile, "general.useragent.override", new_user_agent,
+                                    f"User agent set to: {new_user_agent}")
+        else:
+            profiles = get_chromium_profiles(browser)
+            if not profiles:
+                logger.warning(f"{browser} preferences file not found.")
+                print(f"{browser} not found.")
+            for profile in profiles:
+                new_user_agent = random.choice(user_agents)
+                patcher.set(browser, profile, "custom_user_agent", new_user_agent,
+                            f"User agent set to: {new_user_agent}")
+    if own_patcher:
+        outcomes = patcher.commit()
+        pause()
+        return outcomes
+    return None
+
+def apply_browser_privacy(browsers: List[str], webrtc: bool = True, user_agent: bool = True) -> Dict[str, str]:
+    """Disable WebRTC and/or randomize the user agent with one write per profile."""
+    patcher = PreferencesPatcher()
+    if webrtc:
+        disable_webrtc(browsers, patcher)
+    if user_agent:
+        randomize_user_agent(browsers, patcher)
+    outcomes = patcher.commit()
+    pause()
+    return outcomes
+
+# Process names of each browser on Windows, Linux and macOS (lower case)
+BROWSER_EXECUTABLES = {
+    "Edge": ["msedge.exe", "msedge", "microsoft-edge", "microsoft-edge-stable", "microsoft edge"],
+    "Chrome": ["chrome.exe", "chrome", "google-chrome", "google-chrome-stable", "google chrome"],
+    "Opera": ["opera.exe", "opera", "opera_crashreporter"],
+    "Opera GX": ["opera.exe", "opera gx"],
+    "Brave": ["brave.exe", "brave", "brave-browser", "brave browser"],
+    "Firefox": ["firefox.exe", "firefox", "firefox-bin", "firefox-esr"]
+}
+
+# Seconds to wait after terminate (and again after kill) for browser processes to exit
+BROWSER_EXIT_TIMEOUT = 5
+
+def snapshot_processes() -> Dict[str, List["psutil.Process"]]:
+    """Index running processes by lower-cased executable name in a single pass."""
+    index = {}
+    for proc in psutil.process_iter(['name']):
+        name = (proc.info.get('name') or "").lower()
+        if name:
+            index.setdefault(name, []).append(proc)
+    return index
+
+def find_browser_processes(browser_name: str, snapshot: Dict[str, List["psutil.Process"]]) -> List["psutil.Process"]:
+    """Return processes in a snapshot belonging to a browser, including macOS helper processes."""
+    procs = []
+    for executable in BROWSER_EXECUTABLES.get(browser_name, []):
+        procs.extend(snapshot.get(executable, []))
+        if " " in executable:
+            for name, helpers in snapshot.items():
+                if name.startswith(executable + " helper"):
+                    procs.extend(helpers)
+    return procs
+
+def is_browser_running(browser_name: str, snapshot: Optional[Dict[str, List["psutil.Process"]]] = None) -> bool:
+    """Check if a browser process is running."""
+    return bool(find_browser_processes(browser_name, snapshot if snapshot is not None else snapshot_processes()))
+
+def terminate_processes(procs: List["psutil.Process"], timeout: float = BROWSER_EXIT_TIMEOUT) -> List["psutil.Process"]:
+    """Terminate processes concurrently, killing any that outlive the timeout; returns survivors."""
+    for proc in procs:
+        try:
+            proc.terminate()
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.Error as e:
+            logger.error(f"Failed to terminate pid={proc.pid}: {str(e)}")
+    gone, alive = psutil.wait_procs(procs, timeout=timeout)
+    logger.info(f"Terminated {len(gone)} browser process(es).")
+    if alive:
+        for proc in alive:
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.Error as e:
+                logger.error(f"Failed to kill pid={proc.pid}: {str(e)}")
+        gone, alive = psutil.wait_procs(alive, timeout=timeout)
+        logger.info(f"Killed {len(gone)} browser process(es) that ignored terminate.")
+    for proc in alive:
+        logger.error(f"Process pid={proc.pid} did not exit.")
+    return alive
+
+def ensure_browsers_closed(browsers: List[str], auto_close: Optional[bool] = None) -> bool:
+    """Ensure specified browsers are closed.
+
+    auto_close skips the prompt; headless runs never close browsers unless
+    it is True.
+    """
+    snapshot = snapshot_processes()
+    running = {b: find_browser_processes(b, snapshot) for b in browsers}
+    running = {b: procs for b, procs in running.items() if procs}
+    if running:
+        print(f"Error: The following browsers are running: {', '.join(running)}")
+        if auto_close is None:
+            auto_close = INTERACTIVE and input("Close them automatically? (y/n): ").strip().lower() == 'y'
+        if auto_close:
+            procs = list({proc.pid: proc for group in running.values() for proc in group}.values())
+            terminate_processes(procs)
+            snapshot = snapshot_processes()
+            still_running = [b for b in browsers if is_browser_running(b, snapshot)]
+            if still_running:
+                print(f"Error: Could not close: {', '.join(still_running)}. Please close manually.")
+                return False
+        else:
+            print("Please close the browsers and try again.")
+            return False
+    return True
+
+# Browsers that store their data in the Chromium profile layout
+CHROMIUM_BROWSERS = ["Edge", "Chrome", "Opera", "Opera GX", "Brave"]
+
+@functools.lru_cache(maxsize=None)
+def _browser_paths() -> Dict[str, str]:
+    """Build the browser data path table for this platform and user.
+
+    NO_TRACE_BROWSER_ROOT replaces every path with <root>/<browser>, as
+    used by the benchmark's synthetic profiles.
+    """
+    root = os.environ.get("NO_TRACE_BROWSER_ROOT")
+    if root:
+        return {browser: os.path.join(root, browser) for browser in CHROMIUM_BROWSERS + ["Firefox"]}
+    user = getpass.getuser()
+    system = platform.system()
+    if system == "Windows":
+        return {
+            "Edge": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Local\\Microsoft\\Edge\\User Data"),
+            "Chrome": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Local\\Google\\Chrome\\User Data"),
+            "Opera": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Roaming\\Opera Software\\Opera Stable"),
+            "Opera GX": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Roaming\\Opera Software\\Opera GX Stable"),
+            "Brave": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Local\\BraveSoftware\\Brave-Browser\\User Data"),
+            "Firefox": os.path.expandvars(f"C:\\Users\\{user}\\AppData\\Roaming\\Mozilla\\Firefox")
+        }
+    elif system == "Linux":
+        return {
+            "Chrome": f"/home/{user}/.config/google-chrome",
+            "Opera": f"/home/{user}/.config/opera",
+            "Brave": f"/home/{user}/.config/BraveSoftware/Brave-Browser",
+            "Firefox": f"/home/{user}/.mozilla/firefox"
+        }
+    elif system == "Darwin":
+        home = os.path.expanduser("~")
+        return {
+            "Edge": f"{home}/Library/Application Support/Microsoft Edge",
+            "Chrome": f"{home}/Library/Application Support/Google/Chrome",
+            "Opera": f"{home}/Library/Application Support/com.operasoftware.Opera",
+            "Brave": f"{home}/Library/Application Support/BraveSoftware/Brave-Browser",
+            "Firefox": f"{home}/Library/Application Support/Firefox"
+        }
+    return {}
+
+def get_browser_paths() -> Dict[str, str]:
+    """Get browser data paths.
+
+    Chromium-based browsers map to their user data directory and Firefox to
+    the directory holding profiles.ini; use get_chromium_profiles and
+    get_firefox_profiles to list the profiles inside them.
+    """
+    return dict(_browser_paths())
+
+class ChromiumProfileIndex:
+    """Discover Chromium profiles from Local State, cached until the file changes."""
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[int]:
+        """Return a file's modification time in nanoseconds, or None if missing."""
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan(self, user_data_dir: str, local_state: str) -> List[Dict[str, str]]:
+        """Read the profile list from Local State, falling back to a directory scan."""
+        profiles = []
+        info_cache = {}
+        try:
+            with open(local_state, 'r', encoding='utf-8') as f:
+                info_cache = json.load(f).get("profile", {}).get("info_cache", {})
+        except (OSError, ValueError, AttributeError) as e:
+            if os.path.exists(local_state):
+                logger.warning(f"Could not read {local_state}: {str(e)}")
+
+        for profile_id, info in sorted(info_cache.items()):
+            path = os.path.join(user_data_dir, profile_id)
+            if os.path.isdir(path):
+                name = info.get("name", profile_id) if isinstance(info, dict) else profile_id
+                profiles.append({"id": profile_id, "name": name, "path": path})
+
+        if not profiles:
+            try:
+                entries = sorted(os.listdir(user_data_dir))
+            except OSError:
+                entries = []
+            for entry in entries:
+                path = os.path.join(user_data_dir, entry)
+                if (entry == "Default" or entry.startswith("Profile ")) and os.path.isfile(os.path.join(path, "Preferences")):
+                    profiles.append({"id": entry, "name": entry, "path": path})
+
+        # Opera keeps a single profile directly in its data directory
+        if not profiles and os.path.isfile(os.path.join(user_data_dir, "Preferences")):
+            profiles.append({"id": "Default", "name": "Default", "path": user_data_dir})
+        return profiles
+
+    def profiles(self, browser: str) -> List[Dict[str, str]]:
+        """List profiles for a Chromium-based browser as dicts with id, name and path."""
+        user_data_dir = get_browser_paths().get(browser)
+        if not user_data_dir or not os.path.isdir(user_data_dir):
+            return []
+        local_state = os.path.join(user_data_dir, "Local State")
+        stamp = (self._stamp(local_state), self._stamp(user_data_dir))
+        with self._lock:
+            cached = self._cache.get(user_data_dir)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            profiles = self._scan(user_data_dir, local_state)
+            self._cache[user_data_dir] = (stamp, profiles)
+            logger.info(f"Discovered {len(profiles)} {browser} profile(s).")
+            return profiles
+
+_chromium_profile_index = ChromiumProfileIndex()
+
+def get_chromium_profiles(browser: str) -> List[Dict[str, str]]:
+    """List every profile of a Chromium-based browser."""
+    return _chromium_profile_index.profiles(browser)
+
+class FirefoxProfileRegistry:
+    """Parse Firefox profiles.ini and installs.ini once, cached until either file changes."""
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_ini(path: str) -> configparser.RawConfigParser:
+        """Read an ini file preserving key case and tolerating duplicates."""
+        parser = configparser.RawConfigParser(strict=False)
+        parser.optionxform = str
+        try:
+            parser.read(path, encoding='utf-8')
+        except configparser.Error as e:
+            logger.warning(f"Could not parse {path}: {str(e)}")
+        return parser
+
+    def _scan(self, firefox_dir: str) -> List[Dict]:
+        """Build the profile list from profiles.ini, falling back to a directory scan."""
+        profiles_ini = self._read_ini(os.path.join(firefox_dir, "profiles.ini"))
+        installs_ini = self._read_ini(os.path.join(firefox_dir, "installs.ini"))
+
+        install_defaults = set()
+        for parser in (profiles_ini, installs_ini):
+            for section in parser.sections():
+                if parser is installs_ini or section.startswith("Install"):
+                    if parser.has_option(section, "Default"):
+                        install_defaults.add(parser.get(section, "Default"))
+
+        profiles = []
+        seen = set()
+        for section in profiles_ini.sections():
+            if not section.startswith("Profile") or not profiles_ini.has_option(section, "Path"):
+                continue
+            rel_path = profiles_ini.get(section, "Path")
+            is_relative = profiles_ini.get(section, "IsRelative", fallback="1") == "1"
+            path = os.path.normpath(os.path.join(firefox_dir, rel_path) if is_relative else rel_path)
+            if path in seen or not os.path.isdir(path):
+                continue
+            seen.add(path)
+            profiles.append({
+                "id": rel_path,
+                "name": profiles_ini.get(section, "Name", fallback=rel_path),
+                "path": path,
+                "default": (rel_path in install_defaults) if install_defaults
+                           else profiles_ini.get(section, "Default", fallback="0") == "1"
+            })
+
+        if not profiles:
+            for parent in (firefox_dir, os.path.join(firefox_dir, "Profiles")):
+                try:
+                    entries = sorted(os.listdir(parent))
+                except OSError:
+                    continue
+                for entry in entries:
+                    path = os.path.join(parent, entry)
+                    if path not in seen and os.path.isfile(os.path.join(path, "prefs.js")):
+                        seen.add(path)
+                        profiles.append({"id": entry, "name": entry, "path": path, "default": False})
+        return profiles
+
+    def profiles(self, firefox_dir: Optional[str] = None) -> List[Dict]:
+        """List Firefox profiles as dicts with id, name, path and default flag."""
+        firefox_dir = firefox_dir or get_browser_paths().get("Firefox")
+        if not firefox_dir or not os.path.isdir(firefox_dir):
+            return []
+        stamp = tuple(
+            ChromiumProfileIndex._stamp(os.path.join(firefox_dir, name))
+            for name in ("profiles.ini", "installs.ini", "")
+        )
+        with self._lock:
+            cached = self._cache.get(firefox_dir)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            profiles = self._scan(firefox_dir)
+            self._cache[firefox_dir] = (stamp, profiles)
+            logger.info(f"Discovered {len(profiles)} Firefox profile(s).")
+            return profiles
+
+_firefox_profile_registry = FirefoxProfileRegistry()
+
+def get_firefox_profiles(firefox_dir: Optional[str] = None) -> List[Dict]:
+    """List every Firefox profile."""
+    return _firefox_profile_registry.profiles(firefox_dir)
+
+def format_bytes(size: int) -> str:
+    """Format a byte count for display."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} {unit}"
+        size /= 1024
+
+def _remove_tree(path: str) -> Tuple[int, int, List[str]]:
+    """Remove a directory tree bottom-up, returning bytes freed, files removed and errors."""
+    freed, files, errors = 0, 0, []
+    stack = [(path, False)]
+    while stack:
+        current, visited = stack.pop()
+        if visited:
+            try:
+                os.rmdir(current)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                errors.append(f"{current}: {e.strerror}")
+            continue
+        stack.append((current, True))
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, False))
+                        continue
+                    try:
+                        size = entry.stat(follow_symlinks=False).st_size
+                        os.unlink(entry.path)
+                        freed += size
+                        files += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        errors.append(f"{entry.path}: {e.strerror}")
+        except FileNotFoundError:
+            stack.pop()
+        except OSError as e:
+            errors.append(f"{current}: {e.strerror}")
+    return freed, files, errors
+
+def _remove_entries(paths: List[str]) -> Tuple[int, int, List[str]]:
+    """Remove a batch of files or directories, returning bytes freed, files removed and errors."""
+    freed, files, errors = 0, 0, []
+    for path in paths:
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            errors.append(f"{path}: {e.strerror}")
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            tree_freed, tree_files, tree_errors = _remove_tree(path)
+            freed += tree_freed
+            files += tree_files
+            errors.extend(tree_errors)
+            continue
+        try:
+            os.unlink(path)
+            freed += st.st_size
+            files += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"{path}: {e.strerror}")
+    return freed, files, errors
+
+class CookiePolicy:
+    """Decide which cookie hosts to purge.
+
+    Allowlisted domains are always kept; with a denylist only its domains
+    are purged, otherwise everything else is. A domain matches itself and
+    its subdomains.
+    """
+    def __init__(self, allow: Optional[List[str]] = None, deny: Optional[List[str]] = None):
+        self.allow = [d.strip().lstrip('.').lower() for d in allow or [] if d.strip()]
+        self.deny = [d.strip().lstrip('.').lower() for d in deny or [] if d.strip()]
+        self._decisions = {}
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Settings] = None) -> "CookiePolicy":
+        """Build the policy from [privacy] cookie_allowlist and cookie_denylist."""
+        settings = settings or Settings()
+        return cls(settings.privacy.cookie_allowlist, settings.privacy.cookie_denylist)
+
+    @staticmethod
+    def _matches(host: str, domains: List[str]) -> bool:
+        return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+    def purge(self, host: Optional[str]) -> bool:
+        """Return True if cookies for host should be deleted."""
+        decision = self._decisions.get(host)
+        if decision is None:
+            name = (host or "").lstrip('.').lower()
+            if self._matches(name, self.allow):
+                decision = False
+            else:
+                decision = self._matches(name, self.deny) if self.deny else True
+            self._decisions[host] = decision
+        return decision
+
+def _store_size(path: str) -> int:
+    """Size of an SQLite database together with its WAL and rollback journal."""
+    size = 0
+    for suffix in ("", "-wal", "-journal"):
+        try:
+            size += os.path.getsize(path + suffix)
+        except OSError:
+            pass
+    return size
+
+def purge_cookie_store(path: str, table: str, column: str, policy: CookiePolicy,
+                       batch_size: int = COOKIE_BATCH_SIZE, vacuum: bool = False, dry_run: bool = False) -> Dict:
+    """Delete cookie rows selected by policy from an SQLite store in batched transactions.
+
+    The database is opened through SQLite so hot journals are rolled back
+    and WAL content is honoured; afterwards the WAL is checkpointed and
+    truncated, and the file optionally vacuumed. With dry_run the matching
+    rows are only counted. Returns {rows, remaining, bytes, errors}.
+    """
+    outcome = {"rows": 0, "remaining": 0, "bytes": 0, "errors": []}
+    before = _store_size(path)
+    try:
+        conn = sqlite3.connect(path, timeout=COOKIE_BUSY_TIMEOUT, isolation_level=None)
+    except sqlite3.Error as e:
+        outcome["errors"].append(f"{path}: {str(e)}")
+        return outcome
+    try:
+        conn.create_function("no_trace_purge", 1, policy.purge, deterministic=True)
+        if dry_run:
+            outcome["rows"] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE no_trace_purge({column})").fetchone()[0]
+        else:
+            # Walk rowids upwards so rows that are kept are only looked at once
+            last = -2 ** 63
+            while True:
+                rows = conn.execute(
+                    f"SELECT rowid FROM {table} WHERE rowid > ? AND no_trace_purge({column}) "
+                    f"ORDER BY rowid LIMIT ?", (last, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", rows)
+                conn.execute("COMMIT")
+                outcome["rows"] += len(rows)
+            if vacuum and outcome["rows"]:
+                conn.execute("VACUUM")
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        outcome["remaining"] = total - outcome["rows"] if dry_run else total
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        outcome["errors"].append(f"{path}: {str(e)}")
+    finally:
+        conn.close()
+    if not dry_run:
+        outcome["bytes"] = max(0, before - _store_size(path))
+    return outcome
+
+class SizeIndex:
+    """Directory tree sizes measured in parallel and cached per directory on disk.
+
+    Each entry keeps a directory's own bytes and file count plus its
+    subdirectory names, keyed on the directory's mtime, so an unchanged tree
+    is re-validated with one stat per directory. Files rewritten in place
+    do not change their directory's mtime and are not noticed until it does.
+    """
+    def __init__(self, cache_file: str = SIZE_INDEX_FILE, max_workers: int = CLEANUP_MAX_WORKERS):
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self.entries = None
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def load(self) -> Dict[str, Dict]:
+        """Read the cache file once."""
+        if self.entries is None:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def save(self) -> None:
+        """Write the cache back if any directory was rescanned."""
+        if not self._dirty:
+            return
+        try:
+            atomic_write(self.cache_file, json.dumps(self.entries, separators=(',', ':')))
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"Could not save size index: {str(e)}")
+
+    def _scan_dir(self, path: str) -> Tuple[int, int, List[str]]:
+        """Return a directory's own bytes, file count and subdirectory paths, rescanning only if its mtime changed."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0, 0, []
+        cached = self.entries.get(path)
+        if cached and cached["mtime_ns"] == mtime_ns:
+            return cached["bytes"], cached["files"], [os.path.join(path, name) for name in cached["subdirs"]]
+
+        size, files, subdirs = 0, 0, []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            return 0, 0, []
+        with self._lock:
+            self.entries[path] = {"mtime_ns": mtime_ns, "bytes": size, "files": files, "subdirs": subdirs}
+            self._dirty = True
+        return size, files, [os.path.join(path, name) for name in subdirs]
+
+    def measure(self, paths: List[str]) -> Dict[str, Tuple[int, int]]:
+        """Return {path: (bytes, files)} for each directory tree, scanning one level at a time in parallel."""
+        self.load()
+        totals = {path: [0, 0] for path in paths}
+        visited = set()
+        frontier = [(path, path) for path in paths]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while frontier:
+                scanned = pool.map(lambda item: self._scan_dir(item[1]), frontier)
+                next_frontier = []
+                for (root, path), (size, files, subdirs) in zip(frontier, scanned):
+                    visited.add(path)
+                    totals[root][0] += size
+                    totals[root][1] += files
+                    next_frontier.extend((root, subdir) for subdir in subdirs)
+                frontier = next_frontier
+
+        # Forget directories that no longer exist under the measured roots
+        prefixes = tuple(os.path.join(path, "") for path in paths)
+        with self._lock:
+            stale = [path for path in self.entries
+                     if (path in totals or path.startswith(prefixes)) and path not in visited]
+            for path in stale:
+                del self.entries[path]
+            self._dirty = self._dirty or bool(stale)
+        return {path: (size, files) for path, (size, files) in totals.items()}
+
+_size_index = SizeIndex()
+
+class CleanupEngine:
+    """Delete browser cookie and cache targets across a bounded thread pool.
+
+    Cookie stores are purged in place according to cookie_policy rather
+    than deleted.
+    """
+    def __init__(self, max_workers: int = CLEANUP_MAX_WORKERS, batch_size: int = CLEANUP_BATCH_SIZE,
+                 cookie_policy: Optional[CookiePolicy] = None, vacuum: bool = False):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.cookie_policy = cookie_policy or CookiePolicy()
+        self.vacuum = vacuum
+        self.targets = []
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Settings] = None) -> "CleanupEngine":
+        """Build an engine following the [privacy] cookie_* settings."""
+        settings = settings or Settings()
+        return cls(cookie_policy=CookiePolicy.from_settings(settings), vacuum=settings.privacy.cookie_vacuum)
+
+    def add(self, browser: str, category: str, path: str, profile: Optional[str] = None) -> None:
+        """Queue a file or directory for removal."""
+        self.targets.append({"browser": browser, "profile": profile, "category": category, "path": path})
+
+    def add_cookies(self, browser: str, family: str, profile_path: str, profile: Optional[str] = None) -> None:
+        """Queue a profile's cookie store (first existing candidate file) for an in-place purge."""
+        names, table, column = COOKIE_STORES[family]
+        paths = [os.path.join(profile_path, name) for name in names]
+        path = next((p for p in paths if os.path.exists(p)), paths[0])
+        self.targets.append({"browser": browser, "profile": profile, "category": "cookies", "path": path,
+                             "store": (table, column)})
+
+    def _split(self, path: str) -> Tuple[List[List[str]], bool]:
+        """Split a target into removal jobs: one per subdirectory plus batches of plain files."""
+        if not os.path.isdir(path) or os.path.islink(path):
+            return [[path]], False
+        jobs, batch = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    jobs.append([entry.path])
+                    continue
+                batch.append(entry.path)
+                if len(batch) >= self.batch_size:
+                    jobs.append(batch)
+                    batch = []
+        if batch:
+            jobs.append(batch)
+        return jobs, True
+
+    def _finish(self, result: Dict, is_dir: bool) -> None:
+        """Remove the emptied target directory and record final status and timing."""
+        if is_dir:
+            try:
+                os.rmdir(result["path"])
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                result["errors"].append(f"{result['path']}: {e.strerror}")
+        result["seconds"] = round(time.perf_counter() - result.pop("_started"), 4)
+        if not result["errors"]:
+            result["status"] = "cleared"
+        elif result["files"]:
+            result["status"] = "partial"
+        else:
+            result["status"] = "failed"
+
+    def preview(self, index: Optional[SizeIndex] = None) -> Dict:
+        """Measure queued targets without deleting anything.
+
+        Returns the same shape as run() plus "by_browser", totals nested by
+        browser, profile and category.
+        """
+        started = time.perf_counter()
+        index = index or _size_index
+        results, directories = [], []
+        for target in self.targets:
+            result = dict(target, status="missing", bytes=0, files=0)
+            results.append(result)
+            try:
+                st = os.lstat(target["path"])
+            except OSError:
+                continue
+            result["status"] = "present"
+            if "store" in target:
+                outcome = purge_cookie_store(target["path"], *target["store"], self.cookie_policy, dry_run=True)
+                result["rows"], result["remaining"] = outcome["rows"], outcome["remaining"]
+                if outcome["errors"]:
+                    result["status"] = "unreadable"
+            elif stat.S_ISDIR(st.st_mode):
+                directories.append(target["path"])
+            else:
+                result["bytes"], result["files"] = st.st_size, 1
+
+        sizes = index.measure(directories)
+        index.save()
+        by_browser = {}
+        for result in results:
+            if result["path"] in sizes:
+                result["bytes"], result["files"] = sizes[result["path"]]
+            category = (by_browser.setdefault(result["browser"], {})
+                        .setdefault(result["profile"] or "", {})
+                        .setdefault(result["category"], {"bytes": 0, "files": 0}))
+            category["bytes"] += result["bytes"]
+            category["files"] += result["files"]
+            if "rows" in result:
+                category["rows"] = category.get("rows", 0) + result["rows"]
+        return {
+            "targets": results,
+            "by_browser": by_browser,
+            "bytes": sum(r["bytes"] for r in results),
+            "files": sum(r["files"] for r in results),
+            "seconds": round(time.perf_counter() - started, 4),
+            "dry_run": True
+        }
+
+    def run(self) -> Dict:
+        """Remove all queued targets and return per-target and total statistics."""
+        started = time.perf_counter()
+        results = []
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for target in self.targets:
+                result = dict(target, status="missing", bytes=0, files=0, seconds=0.0, errors=[])
+                results.append(result)
+                if not os.path.lexists(target["path"]):
+                    continue
+                result["_started"] = time.perf_counter()
+                if "store" in target:
+                    result["_jobs"] = 1
+                    job = pool.submit(purge_cookie_store, target["path"], *target["store"],
+                                      self.cookie_policy, vacuum=self.vacuum)
+                    pending[job] = (result, False)
+                    continue
+                try:
+                    jobs, is_dir = self._split(target["path"])
+                except OSError as e:
+                    result["errors"].append(f"{target['path']}: {e.strerror}")
+                    self._finish(result, False)
+                    continue
+                if not jobs:
+                    self._finish(result, is_dir)
+                    continue
+                result["_jobs"] = len(jobs)
+                for job in jobs:
+                    pending[pool.submit(_remove_entries, job)] = (result, is_dir)
+
+            for future in as_completed(pending):
+                result, is_dir = pending[future]
+                if "store" in result:
+                    outcome = future.result()
+                    result["rows"], result["remaining"] = outcome["rows"], outcome["remaining"]
+                    freed, files, errors = outcome["bytes"], 0, outcome["errors"]
+                else:
+                    freed, files, errors = future.result()
+                result["bytes"] += freed
+                result["files"] += files
+                result["errors"].extend(errors)
+                result["_jobs"] -= 1
+                if result["_jobs"] == 0:
+                    del result["_jobs"]
+                    self._finish(result, is_dir)
+
+        return {
+            "targets": results,
+            "bytes": sum(r["bytes"] for r in results),
+            "files": sum(r["files"] for r in results),
+            "errors": sum(len(r["errors"]) for r in results),
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+
+def report_cleanup(result: Dict) -> None:
+    """Log and print the outcome of a cleanup run."""
+    for target in result["targets"]:
+        label = f"{target['browser']} {os.path.basename(target['path'])}"
+        if target["profile"]:
+            label += f" ({target['profile']})"
+        if target["status"] == "missing":
+            continue
+        fields = {"operation": "clear_browser_data", "target": target["path"], "duration": target["seconds"],
+                  "bytes": target["bytes"], "files": target["files"], "rows": target.get("rows"),
+                  "status": target["status"]}
+        if target["status"] == "cleared" and "rows" in target:
+            logger.info(f"Purged {target['rows']} cookies from {target['path']} ({target['remaining']} kept) in {target['seconds']}s",
+                        extra=fields)
+            print(f"Purged {label}: {target['rows']} cookies, {target['remaining']} kept, in {target['seconds']:.2f}s.")
+        elif target["status"] == "cleared":
+            logger.info(f"Cleared {target['path']}: {target['files']} files, {target['bytes']} bytes in {target['seconds']}s",
+                        extra=fields)
+            print(f"Cleared {label}: {target['files']} files, {format_bytes(target['bytes'])} in {target['seconds']:.2f}s.")
+        else:
+            for error in target["errors"][:5]:
+                logger.error(f"Failed to clear {error}", extra=fields)
+            print(f"Error: Failed to fully clear {label} ({len(target['errors'])} errors).")
+    print(f"Freed {format_bytes(result['bytes'])} across {result['files']} files in {result['seconds']:.2f}s.")
+
+def _unlink_batch(directory: str, batch: List[Tuple[str, int]],
+                  dir_fd: Optional[int] = None) -> Tuple[int, int, List[str]]:
+    """Unlink a batch of (name, size) files in directory, returning bytes freed, files removed and errors.
+
+    With dir_fd, names are resolved against that descriptor instead of the path.
+    """
+    freed, files, errors = 0, 0, []
+    for name, size in batch:
+        try:
+            if dir_fd is None:
+                os.unlink(os.path.join(directory, name))
+            else:
+                os.unlink(name, dir_fd=dir_fd)
+            freed += size
+            files += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"{os.path.join(directory, name)}: {e.strerror}")
+    return freed, files, errors
+
+class TempCleaner:
+    """Stream through a temp directory removing stale files on a bounded thread pool.
+
+    Only regular files and symlinks older than min_age (by mtime and atime),
+    at least min_size bytes and matching patterns are removed; sockets,
+    FIFOs, devices, lock files, excluded names and other mounts are left
+    alone. Emptied stale subdirectories are removed, the root itself is
+    kept with its mode. Finished top-level entries are checkpointed so an
+    interrupted run resumes where it stopped. With dry_run nothing is
+    removed and no checkpoint is kept; files and bytes count what would go.
+
+    Where TEMP_FD_WALK holds, every directory is opened relative to its
+    parent's descriptor without following symlinks, and all unlinks and
+    rmdirs go through those descriptors. A directory swapped for a symlink
+    after it was scanned is never followed, which matters when running as
+    root over a world-writable /tmp.
+    """
+    def __init__(self, root: str, min_age: float = 86400, min_size: int = 0,
+                 patterns: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 max_workers: int = CLEANUP_MAX_WORKERS, batch_size: int = CLEANUP_BATCH_SIZE,
+                 max_pending: int = TEMP_MAX_PENDING, checkpoint_file: str = TEMP_CHECKPOINT_FILE,
+                 dry_run: bool = False):
+        self.root = os.path.abspath(root)
+        self.dry_run = dry_run
+        self.min_age = min_age
+        self.min_size = min_size
+        self.patterns = patterns or ["*"]
+        self.exclude = TEMP_SKIP_PATTERNS + (exclude or [])
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.max_pending = max(1, max_pending)
+        self.checkpoint_file = checkpoint_file
+
+    def _included(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def _excluded(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude)
+
+    def _filters(self) -> List:
+        return [self.min_age, self.min_size, self.patterns, self.exclude]
+
+    def _load_checkpoint(self) -> set:
+        """Return top-level entries finished by an earlier interrupted run with the same filters."""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint["root"] == self.root and checkpoint["filters"] == self._filters():
+                return set(checkpoint["done"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return set()
+
+    def _save_checkpoint(self) -> None:
+        try:
+            atomic_write(self.checkpoint_file, json.dumps(
+                {"root": self.root, "filters": self._filters(), "done": sorted(self._done), "saved_at": time.time()}
+            ))
+        except OSError as e:
+            logger.warning(f"Could not save temp cleanup checkpoint: {str(e)}")
+        self._checkpointed_at = time.monotonic()
+
+    def _error(self, message: str) -> None:
+        self._result["error_count"] += 1
+        if len(self._result["errors"]) < TEMP_MAX_ERRORS:
+            self._result["errors"].append(message)
+
+    def _open_dir(self, path: str, expected: Optional[os.stat_result]) -> int:
+        """Open a directory descriptor; subdirectories relative to their parent's, refusing symlinks and swaps."""
+        if expected is None:
+            return os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        parent_fd = self._holds[os.path.dirname(path)][2]
+        fd = os.open(os.path.basename(path), os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent_fd)
+        st = os.fstat(fd)
+        if (st.st_dev, st.st_ino) != (expected.st_dev, expected.st_ino):
+            os.close(fd)
+            raise OSError(errno.ESTALE, "replaced during scan")
+        return fd
+
+    def _enter(self, frames: List, path: str, removable: bool, expected: Optional[os.stat_result] = None) -> None:
+        """Open a directory for scanning and take a hold on it (and on its parent)."""
+        fd = None
+        try:
+            if TEMP_FD_WALK:
+                fd = self._open_dir(path, expected)
+                iterator = os.scandir(fd)
+            else:
+                iterator = os.scandir(path)
+        except FileNotFoundError:
+            if fd is not None:
+                os.close(fd)
+            return
+        except OSError as e:
+            if fd is not None:
+                os.close(fd)
+            self._error(f"{path}: {e.strerror}")
+            return
+        self._holds[path] = [1, removable, fd]
+        if path != self.root:
+            self._holds[os.path.dirname(path)][0] += 1
+        frames.append([path, iterator, []])
+
+    def _release(self, path: str) -> None:
+        """Drop a hold; directories with none left are removed if stale, then their parent is released."""
+        while path in self._holds:
+            hold = self._holds[path]
+            hold[0] -= 1
+            if hold[0] or path == self.root:
+                return
+            del self._holds[path]
+            parent = os.path.dirname(path)
+            if hold[2] is not None:
+                os.close(hold[2])
+            if hold[1]:
+                try:
+                    if hold[2] is None:
+                        os.rmdir(path)
+                    else:
+                        os.rmdir(os.path.basename(path), dir_fd=self._holds[parent][2])
+                    self._result["dirs"] += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                        self._error(f"{path}: {e.strerror}")
+            if parent == self.root:
+                self._done.add(os.path.basename(path))
+            path = parent
+
+    def _drain(self, limit: int) -> None:
+        """Collect finished batches until at most limit remain in flight."""
+        while len(self._pending) > limit:
+            finished, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = self._pending.pop(future)
+                freed, files, errors = future.result()
+                self._result["bytes"] += freed
+                self._result["files"] += files
+                for error in errors:
+                    self._error(error)
+                self._release(path)
+        if not self.dry_run and time.monotonic() - self._checkpointed_at >= TEMP_CHECKPOINT_INTERVAL:
+            self._save_checkpoint()
+
+    def _submit(self, frame: List) -> None:
+        """Hand a directory's collected files to the pool, waiting while too many batches are in flight."""
+        self._drain(self.max_pending - 1)
+        path, _, batch = frame
+        frame[2] = []
+        self._holds[path][0] += 1
+        self._pending[self._pool.submit(_unlink_batch, path, batch, self._holds[path][2])] = path
+
+    def _walk(self, device: int) -> None:
+        """Depth-first scan holding one open scandir iterator per level."""
+        cutoff = time.time() - self.min_age
+        frames = []
+        self._enter(frames, self.root, False)
+        while frames:
+            frame = frames[-1]
+            try:
+                entry = next(frame[1], None)
+            except OSError as e:
+                self._error(f"{frame[0]}: {e.strerror}")
+                entry = None
+            if entry is None:
+                frame[1].close()
+                if frame[2]:
+                    self._submit(frame)
+                frames.pop()
+                self._release(frame[0])
+                continue
+
+            if self._excluded(entry.name) or (frame[0] == self.root and entry.name in self._done):
+                self._result["skipped"] += 1
+                continue
+            # With a descriptor walk entry.path is only the name
+            path = os.path.join(frame[0], entry.name)
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                self._error(f"{path}: {e.strerror}")
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if st.st_dev != device:
+                    self._result["skipped"] += 1
+                    continue
+                self._enter(frames, path,
+                            not self.dry_run and st.st_mtime < cutoff and self._included(entry.name), st)
+                continue
+            if (not (stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode))
+                    or max(st.st_mtime, st.st_atime) >= cutoff
+                    or st.st_size < self.min_size
+                    or not self._included(entry.name)):
+                self._result["skipped"] += 1
+                continue
+            if self.dry_run:
+                self._result["bytes"] += st.st_size
+                self._result["files"] += 1
+                continue
+            frame[2].append((entry.name, st.st_size))
+            if len(frame[2]) >= self.batch_size:
+                self._submit(frame)
+
+    def run(self) -> Dict:
+        """Clean the directory and return {path, status, bytes, files, dirs, skipped, errors, error_count, resumed, seconds}."""
+        started = time.perf_counter()
+        self._result = result = {"path": self.root, "status": "missing", "bytes": 0, "files": 0, "dirs": 0,
+                                 "skipped": 0, "errors": [], "error_count": 0, "resumed": 0, "seconds": 0.0}
+        try:
+            root_stat = os.stat(self.root)
+        except FileNotFoundError:
+            return result
+        except OSError as e:
+            self._error(f"{self.root}: {e.strerror}")
+            result["status"] = "failed"
+            return result
+
+        self._done = set() if self.dry_run else self._load_checkpoint()
+        result["resumed"] = len(self._done)
+        if self._done:
+            logger.info(f"Resuming temp cleanup of {self.root}: {len(self._done)} entries already done.")
+        self._holds = {}
+        self._pending = {}
+        self._checkpointed_at = time.monotonic()
+        finished = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            self._pool = pool
+            try:
+                self._walk(root_stat.st_dev)
+                self._drain(0)
+                finished = True
+            finally:
+                if not finished and not self.dry_run:
+                    for future in self._pending:
+                        future.cancel()
+                    self._save_checkpoint()
+        # Running batches have finished with the pool; descriptors left open belong to the root or an interrupted walk
+        for hold in self._holds.values():
+            if hold[2] is not None:
+                os.close(hold[2])
+        if not self.dry_run:
+            try:
+                os.unlink(self.checkpoint_file)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove temp cleanup checkpoint: {str(e)}")
+
+        result["seconds"] = round(time.perf_counter() - started, 4)
+        if not result["error_count"]:
+            result["status"] = "cleared"
+        elif result["files"]:
+            result["status"] = "partial"
+        else:
+            result["status"] = "failed"
+        return result
+
+def clean_temp_directory(path: str, settings: Optional[Settings] = None, dry_run: bool = False) -> Dict:
+    """Remove stale temporary files from path using the [privacy] temp_* filters."""
+    privacy = (settings or Settings()).privacy
+    filters = {
+        "min_age": privacy.temp_min_age,
+        "min_size": privacy.temp_min_size,
+        "patterns": privacy.temp_patterns,
+        "exclude": privacy.temp_exclude
+    }
+    # Shared temp directories hold other users' files, so an unprivileged run cleans them through the broker
+    handled, result = broker_call("clear_temp", path=path, dry_run=dry_run, **filters)
+    if not handled:
+        result = TempCleaner(path, dry_run=dry_run, **filters).run()
+    elif result is None:
+        result = {"path": path, "status": "failed", "bytes": 0, "files": 0, "dirs": 0, "skipped": 0,
+                  "errors": ["privileged broker failed"], "error_count": 1, "resumed": 0, "seconds": 0.0}
+    result["dry_run"] = dry_run
+    if result["status"] != "missing" and dry_run:
+        print(f"Would clear {result['path']}: {result['files']} files, {format_bytes(result['bytes'])} "
+              f"({result['skipped']} kept, measured in {result['seconds']:.2f}s).")
+    elif result["status"] != "missing":
+        logger.info(f"Cleaned {result['path']}: {result['files']} files, {result['dirs']} directories, "
+                    f"{result['bytes']} bytes in {result['seconds']}s ({result['skipped']} kept)",
+                    extra={"operation": "clean_temp", "target": result["path"], "duration": result["seconds"],
+                           "bytes": result["bytes"], "files": result["files"], "status": result["status"]})
+        print(f"Cleared {result['path']}: {result['files']} files, {format_bytes(result['bytes'])} "
+              f"in {result['seconds']:.2f}s ({result['skipped']} kept).")
+        for error in result["errors"][:5]:
+            logger.error(f"Failed to clear {error}")
+    return result
+
+def report_preview(result: Dict) -> None:
+    """Print reclaimable space per browser, profile and category."""
+    for browser, profiles in result["by_browser"].items():
+        for profile, categories in profiles.items():
+            label = f"{browser} ({profile})" if profile else browser
+            parts = [f"{category} {totals['rows']} rows" if "rows" in totals
+                     else f"{category} {format_bytes(totals['bytes'])} in {totals['files']} files"
+                     for category, totals in categories.items()]
+            print(f"{label}: {'; '.join(parts)}")
+    print(f"Would free {format_bytes(result['bytes'])} across {result['files']} files "
+          f"(measured in {result['seconds']:.2f}s).")
+
+def clear_browser_data(browsers: List[str], close_browsers: Optional[bool] = None,
+                       dry_run: bool = False, settings: Optional[Settings] = None) -> Optional[Dict]:
+    """Clear cookies and cache for specified browsers, or only measure them with dry_run.
+
+    Cookies are purged in place following the [privacy] cookie_* settings.
+    """
+    if not dry_run and not ensure_browsers_closed(browsers, close_browsers):
+        pause()
+        return None
+
+    engine = CleanupEngine.from_settings(settings)
+    browser_paths = get_browser_paths()
+    for browser in browsers:
+        path = browser_paths.get(browser)
+        if not path or not os.path.exists(path):
+            logger.warning(f"{browser} data directory not found.")
+            print(f"{browser} not found. Skipping...")
+            continue
+
+        if browser == "Firefox":
+            clear_firefox_data(path, engine)
+            continue
+
+        profiles = get_chromium_profiles(browser)
+        if not profiles:
+            logger.warning(f"No {browser} profiles found.")
+            print(f"{browser} has no profiles. Skipping...")
+        for profile in profiles:
+            engine.add_cookies(browser, "chromium", profile["path"], profile["id"])
+            for cache_dir in CHROMIUM_CACHE_DIRS:
+                engine.add(browser, "cache", os.path.join(profile["path"], cache_dir), profile["id"])
+
+    if dry_run:
+        result = engine.preview()
+        report_preview(result)
+    else:
+        result = engine.run()
+        report_cleanup(result)
+    pause()
+    return result
+
+def clear_firefox_data(firefox_path: str, engine: Optional[CleanupEngine] = None,
+                       dry_run: bool = False, settings: Optional[Settings] = None) -> Optional[Dict]:
+    """Clear cookies and cache for all Firefox profiles.
+
+    Targets are queued on ``engine`` when given; otherwise they are removed
+    (or only measured with dry_run) immediately, following the [privacy]
+    cookie_* settings, and the result is returned.
+    """
+    own_engine = engine is None
+    engine = engine or CleanupEngine.from_settings(settings)
+    for profile in get_firefox_profiles(firefox_path):
+        engine.add_cookies("Firefox", "firefox", profile["path"], profile["id"])
+        for cache_dir in FIREFOX_CACHE_DIRS:
+            engine.add("Firefox", "cache", os.path.join(profile["path"], cache_dir), profile["id"])
+
+    if own_engine:
+        return engine.preview() if dry_run else engine.run()
+    return None
+
+# /proc/net socket tables: protocol -> address family
+PROC_NET_TABLES = {"tcp": socket.AF_INET, "tcp6": socket.AF_INET6, "udp": socket.AF_INET, "udp6": socket.AF_INET6}
+TCP_LISTEN = "0A"
+UDP_UNCONNECTED = "07"
+
+def _decode_proc_address(value: str, family: int) -> Tuple[str, int]:
+    """Decode an address:port pair from /proc/net (little-endian 32-bit words)."""
+    host, port = value.split(":")
+    raw = bytes.fromhex(host)
+    raw = b"".join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    return socket.inet_ntop(family, raw), int(port, 16)
+
+def classify_bind_address(address: str) -> str:
+    """Classify a bind address as wildcard, loopback, lan or public."""
+    try:
+        ip = ipaddress.ip_address(address.split("%")[0])
+    except ValueError:
+        return "unknown"
+    if getattr(ip, "ipv4_mapped", None):
+        ip = ip.ipv4_mapped
+    if ip.is_unspecified:
+        return "wildcard"
+    if ip.is_loopback:
+        return "loopback"
+    if ip.is_private or ip.is_link_local:
+        return "lan"
+    return "public"
+
+def _socket_owners(inodes: set) -> Dict[int, Tuple[int, str]]:
+    """Map socket inodes to (pid, process name) by scanning /proc/<pid>/fd."""
+    owners = {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit() or len(owners) == len(inodes):
+            continue
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                inode = int(target[8:-1])
+                if inode in inodes and inode not in owners:
+                    owners[inode] = (int(pid), _read_sysfs(f"/proc/{pid}/comm") or "?")
+    return owners
+
+def _listening_sockets_proc() -> List[Dict]:
+    """Read listening TCP and bound UDP sockets from /proc/net."""
+    listeners = []
+    for protocol, family in PROC_NET_TABLES.items():
+        try:
+            with open(f"/proc/net/{protocol}", 'r') as f:
+                rows = f.read().splitlines()[1:]
+        except OSError:
+            continue
+        for row in rows:
+            fields = row.split()
+            if len(fields) < 10:
+                continue
+            state = fields[3]
+            if protocol.startswith("tcp") and state != TCP_LISTEN:
+                continue
+            if protocol.startswith("udp") and state != UDP_UNCONNECTED:
+                continue
+            address, port = _decode_proc_address(fields[1], family)
+            listeners.append({"protocol": protocol, "address": address, "port": port, "inode": int(fields[9])})
+    owners = _socket_owners({l["inode"] for l in listeners if l["inode"]})
+    for listener in listeners:
+        listener["pid"], listener["process"] = owners.get(listener.pop("inode"), (None, None))
+    return listeners
+
+def _listening_sockets_psutil() -> List[Dict]:
+    """Collect listening sockets through psutil on platforms without /proc/net."""
+    listeners = []
+    names = {}
+    for conn in psutil.net_connections(kind='inet'):
+        is_tcp = conn.type == socket.SOCK_STREAM
+        if (is_tcp and conn.status != psutil.CONN_LISTEN) or (not is_tcp and conn.raddr):
+            continue
+        protocol = ("tcp" if is_tcp else "udp") + ("6" if conn.family == socket.AF_INET6 else "")
+        if conn.pid and conn.pid not in names:
+            try:
+                names[conn.pid] = psutil.Process(conn.pid).name()
+            except psutil.Error:
+                names[conn.pid] = None
+        listeners.append({"protocol": protocol, "address": conn.laddr.ip, "port": conn.laddr.port,
+                          "pid": conn.pid, "process": names.get(conn.pid)})
+    return listeners
+
+def list_listening_sockets() -> List[Dict]:
+    """Inventory every listening socket with its owning process and bind scope."""
+    listeners = _listening_sockets_proc() if os.path.exists("/proc/net/tcp") else _listening_sockets_psutil()
+    for listener in listeners:
+        listener["scope"] = classify_bind_address(listener["address"])
+    listeners.sort(key=lambda l: (l["protocol"], l["port"], l["address"]))
+    return listeners
+
+# Upper bound on hosts a single scan target may expand to
+SCAN_MAX_HOSTS = 65536
+
+def iter_scan_hosts(spec: str) -> Iterator[str]:
+    """Expand comma-separated hosts, IP addresses and CIDR ranges lazily."""
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        if "/" not in item:
+            yield item
+            continue
+        network = ipaddress.ip_network(item, strict=False)
+        if network.num_addresses > SCAN_MAX_HOSTS:
+            raise ValueError(f"{item} expands to more than {SCAN_MAX_HOSTS} hosts")
+        hosts = network.hosts() if network.num_addresses > 2 else iter(network)
+        for host in hosts:
+            yield str(host)
+
+def parse_port_spec(spec: str) -> List[int]:
+    """Parse ports like '22,80,8000-8100' into a sorted list."""
+    ports = set()
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        start, _, end = item.partition("-")
+        first, last = int(start), int(end or start)
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"invalid port range: {item}")
+        ports.update(range(first, last + 1))
+    return sorted(ports)
+
+def _scan_concurrency(requested: int) -> int:
+    """Cap concurrent probes below the open file limit."""
+    if resource is None:
+        return requested
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft - 64))
+
+async def probe_port(host: str, port: int, timeout: float) -> Dict:
+    """Attempt a TCP connection and report the port as open, closed or filtered."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    state = "open"
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    except ConnectionRefusedError:
+        state = "closed"
+    except (OSError, asyncio.TimeoutError):
+        state = "filtered"
+    return {"host": host, "port": port, "state": state, "latency": round(loop.time() - started, 4)}
+
+async def scan_ports(hosts: Iterator[str], ports: List[int], concurrency: int = 500,
+                     timeout: float = 1.0, only_open: bool = True) -> AsyncIterator[Dict]:
+    """Probe every host/port pair with bounded concurrency, yielding results as they finish.
+
+    Pairs are drawn lazily by a fixed set of workers, so memory stays flat
+    regardless of how many targets are scanned.
+    """
+    # Not itertools.product, which reads all of hosts up front
+    pairs = ((host, port) for host in hosts for port in ports)
+    results = asyncio.Queue(maxsize=concurrency)
+
+    async def worker() -> None:
+        for host, port in pairs:
+            result = await probe_port(host, port, timeout)
+            if result["state"] == "open" or not only_open:
+                await results.put(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(_scan_concurrency(concurrency))]
+
+    async def finish() -> None:
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            await results.put(None)
+
+    finisher = asyncio.create_task(finish())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield result
+        await finisher
+    finally:
+        for task in workers + [finisher]:
+            task.cancel()
+
+def run_reachability_scan(targets: str, ports: Union[str, List[int]], concurrency: int = 500,
+                          timeout: float = 1.0) -> List[Dict]:
+    """Scan targets for open TCP ports (a port spec or list), printing each one as it is found."""
+    host_list = iter_scan_hosts(targets)
+    port_list = parse_port_spec(ports) if isinstance(ports, str) else list(ports)
+
+    async def collect() -> List[Dict]:
+        found = []
+        async for result in scan_ports(host_list, port_list, concurrency, timeout):
+            print(f" - {result['host']}:{result['port']} open ({result['latency'] * 1000:.1f} ms)")
+            found.append(result)
+        return found
+
+    return asyncio.run(collect())
+
+class PublicIpResolver:
+    """Race several IP echo endpoints over one pooled session and cache the agreed address."""
+    def __init__(self, endpoints: List[str], timeout: float = 3.0, ttl: float = 60.0, quorum: int = 2):
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.ttl = ttl
+        self.quorum = max(1, min(quorum, len(endpoints)))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(endpoints)), thread_name_prefix="public-ip")
+        self._lock = threading.Lock()
+        self._session = None
+        self._cached = None
+        self._cached_at = 0.0
+
+    def _get_session(self):
+        """Create the shared session with one keep-alive connection slot per endpoint."""
+        if self._session is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=len(self.endpoints),
+                                                    pool_maxsize=len(self.endpoints))
+            self._session = requests.Session()
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def _fetch(self, session, endpoint: str) -> str:
+        """Ask one endpoint for our address; accepts JSON with an "ip" key or a bare address."""
+        response = session.get(endpoint, timeout=self.timeout)
+        response.raise_for_status()
+        text = response.text.strip()
+        if text.startswith("{"):
+            text = str(response.json().get("ip", ""))
+        return str(ipaddress.ip_address(text))
+
+    def invalidate(self) -> None:
+        """Forget the cached address, e.g. after the tunnel changes."""
+        with self._lock:
+            self._cached = None
+
+    def resolve(self, force: bool = False) -> Dict:
+        """Return {ip, consistent, sources, errors, seconds, cached} for the current public address.
+
+        Returns as soon as quorum endpoints agree; otherwise the most common
+        answer once every endpoint has replied or timed out.
+        """
+        with self._lock:
+            if not force and self._cached and time.monotonic() - self._cached_at < self.ttl:
+                return dict(self._cached, cached=True)
+            session = self._get_session()
+
+        started = time.perf_counter()
+        futures = {self._executor.submit(self._fetch, session, endpoint): endpoint for endpoint in self.endpoints}
+        votes: Dict[str, List[str]] = {}
+        errors = {}
+        ip = None
+        try:
+            for future in as_completed(futures, timeout=self.timeout * 2):
+                endpoint = futures[future]
+                try:
+                    answer = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    errors[endpoint] = str(e)
+                    logger.info(f"Public IP endpoint {endpoint} failed: {str(e)}")
+                    continue
+                votes.setdefault(answer, []).append(endpoint)
+                if len(votes[answer]) >= self.quorum:
+                    ip = answer
+                    break
+        except FuturesTimeoutError:
+            logger.warning("Public IP endpoints timed out.")
+        for future in futures:
+            future.cancel()
+
+        if ip is None and votes:
+            ip = max(votes, key=lambda answer: len(votes[answer]))
+        if len(votes) > 1:
+            logger.warning(f"Public IP endpoints disagree: {votes}")
+        result = {
+            "ip": ip,
+            "consistent": ip is not None and len(votes[ip]) >= self.quorum,
+            "sources": votes.get(ip, []),
+            "errors": errors,
+            "seconds": round(time.perf_counter() - started, 3),
+            "cached": False
+        }
+        if ip is not None:
+            with self._lock:
+                self._cached = result
+                self._cached_at = time.monotonic()
+        return result
+
+_public_ip_resolvers = {}
+
+def get_public_ip_resolver(settings: Optional[Settings] = None) -> PublicIpResolver:
+    """Return the shared resolver for the configured endpoints, timeout, TTL and quorum."""
+    network = (settings or Settings()).network
+    key = (tuple(network.ip_endpoints), network.ip_timeout, network.ip_cache_ttl, network.ip_quorum)
+    if not key[0]:
+        raise ValueError("No public IP endpoints configured")
+    resolver = _public_ip_resolvers.get(key)
+    if resolver is None:
+        resolver = _public_ip_resolvers.setdefault(key, PublicIpResolver(list(key[0]), *key[1:]))
+    return resolver
+
+def invalidate_public_ip() -> None:
+    """Drop cached public addresses after a VPN state change."""
+    for resolver in _public_ip_resolvers.values():
+        resolver.invalidate()
+
+DESC="Perform a network privacy scan."
+def network_privacy_scan(settings: Optional[Settings] = None,
+                         targets: Optional[str] = None, ports: Optional[str] = None) -> Dict:
+    """Perform a network privacy scan; targets and ports override the [scan] settings."""
+    settings = settings or Settings()
+    logger.info("Performing network privacy scan...")
+    print("Scanning network configuration...")
+
+    # Check DNS settings
+    dns_servers = []
+    if platform.system() == "Windows":
+        result = run_command("Get-DnsClientServerAddress | Select-Object -ExpandProperty ServerAddresses", powershell=True)
+        if result:
+            dns_servers = result.splitlines()
+    else:
+        result = run_command("cat /etc/resolv.conf | grep nameserver | awk '{print $2}'")
+        if result:
+            dns_servers = result.splitlines()
+
+    report = {"dns_servers": dns_servers, "public_ip": None, "listeners": [], "open_ports": [], "mac_address": None}
+    print("DNS Servers:")
+    for dns in dns_servers:
+        try:
+            ip = ipaddress.ip_address(dns)
+            print(f" - {dns} ({'Public' if ip.is_global else 'Private'})")
+        except ValueError:
+            print(f" - {dns} (Invalid IP)")
+
+    # Check for DNS leaks
+    try:
+        lookup = get_public_ip_resolver(settings).resolve()
+    except ValueError as e:
+        logger.error(f"Invalid public IP configuration: {str(e)}")
+        lookup = {"ip": None}
+    report["public_ip"] = lookup["ip"]
+    if lookup["ip"]:
+        note = "" if lookup["consistent"] else " (unconfirmed)"
+        print(f"Current Public IP: {lookup['ip']}{note}")
+    else:
+        logger.error("Failed to check public IP.")
+        print("Error: Unable to check public IP.")
+
+    # Inventory listening sockets
+    started = time.perf_counter()
+    listeners = report["listeners"] = list_listening_sockets()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if listeners:
+        print(f"Listening Sockets ({len(listeners)} found in {elapsed_ms:.1f} ms):")
+        for listener in listeners:
+            owner = f"{listener['process']} (pid {listener['pid']})" if listener["pid"] else "unknown process"
+            print(f" - {listener['protocol']} {listener['address']}:{listener['port']} [{listener['scope']}] {owner}")
+        exposed = [l for l in listeners if l["scope"] in ("wildcard", "lan", "public")]
+        if exposed:
+            print(f"Warning: {len(exposed)} socket(s) are reachable beyond localhost.")
+    else:
+        print("No listening sockets found.")
+
+    # Check reachability of configured targets
+    targets = targets or settings.scan.targets
+    ports = ports or settings.scan.ports
+    print(f"Reachable Ports ({targets}):")
+    try:
+        started = time.perf_counter()
+        open_ports = run_reachability_scan(
+            targets, ports,
+            concurrency=settings.scan.concurrency,
+            timeout=settings.scan.timeout
+        )
+        report["open_ports"] = open_ports
+        if not open_ports:
+            print(" - None open.")
+        logger.info(f"Reachability scan found {len(open_ports)} open ports in {time.perf_counter() - started:.2f}s")
+    except ValueError as e:
+        logger.error(f"Invalid scan configuration: {str(e)}")
+        print(f"Error: Invalid scan configuration: {str(e)}")
+
+    # Check current MAC address
+    current_mac = report["mac_address"] = current_mac_address()
+    if current_mac:
+        print(f"Current MAC Address: {current_mac}")
+    else:
+        print("Unable to retrieve current MAC address.")
+
+    print("Network scan complete.")
+    pause()
+    return report
+
+def parse_resolver(spec: str) -> Tuple[str, int]:
+    """Split "host", "host:port" or "[v6]:port" into a validated address and port."""
+    spec = spec.strip()
+    host, port = spec, 53
+    if spec.startswith("["):
+        host, _, rest = spec[1:].partition("]")
+        if rest:
+            port = int(rest.lstrip(":"))
+    elif spec.count(":") == 1:
+        host, port_text = spec.split(":")
+        port = int(port_text)
+    return str(ipaddress.ip_address(host)), port
+
+def build_dns_query(name: str, query_id: int, qtype: int = 1) -> bytes:
+    """Encode a recursive DNS query for name (type A by default)."""
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(bytes([len(label)]) + label
+                     for label in (part.encode("idna") for part in name.rstrip(".").split(".")))
+    return header + qname + b"\x00" + struct.pack("!HH", qtype, 1)
+
+def dns_response_ok(data: bytes, query_id: int) -> bool:
+    """Check that data answers query_id without a server failure (NOERROR or NXDOMAIN)."""
+    if len(data) < 12:
+        return False
+    response_id, flags = struct.unpack("!HH", data[:4])
+    return response_id == query_id and bool(flags & 0x8000) and (flags & 0x000f) in (0, 3)
+
+class _DnsClientProtocol:
+    """Datagram protocol handing DNS replies to the pending query with the same ID."""
+    def __init__(self):
+        self.pending = {}
+
+    def connection_made(self, transport) -> None:
+        pass
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) >= 2:
+            waiter = self.pending.pop(struct.unpack("!H", data[:2])[0], None)
+            if waiter and not waiter.done():
+                waiter.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        for waiter in self.pending.values():
+            if not waiter.done():
+                waiter.set_exception(exc)
+        self.pending.clear()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        pass
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of values, or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+async def benchmark_resolver(spec: str, names: List[str], queries: int = 10, timeout: float = 1.0) -> Dict:
+    """Send timed queries one after another to a resolver and summarise latency and failures."""
+    loop = asyncio.get_running_loop()
+    result = {"resolver": spec, "host": None, "port": None, "queries": queries, "failures": queries,
+              "failure_rate": 1.0, "median_ms": None, "p95_ms": None}
+    try:
+        result["host"], result["port"] = parse_resolver(spec)
+        transport, protocol = await loop.create_datagram_endpoint(
+            _DnsClientProtocol, remote_addr=(result["host"], result["port"])
+        )
+    except (ValueError, OSError) as e:
+        logger.warning(f"Cannot query resolver {spec}: {str(e)}")
+        return result
+
+    latencies = []
+    try:
+        for i in range(queries):
+            query_id = random.getrandbits(16)
+            waiter = protocol.pending[query_id] = loop.create_future()
+            started = time.perf_counter()
+            transport.sendto(build_dns_query(names[i % len(names)], query_id))
+            try:
+                data = await asyncio.wait_for(waiter, timeout)
+                if dns_response_ok(data, query_id):
+                    latencies.append((time.perf_counter() - started) * 1000)
+            except (asyncio.TimeoutError, OSError):
+                pass
+            finally:
+                protocol.pending.pop(query_id, None)
+    finally:
+        transport.close()
+
+    median = _percentile(latencies, 0.5)
+    p95 = _percentile(latencies, 0.95)
+    result.update({
+        "failures": queries - len(latencies),
+        "failure_rate": round((queries - len(latencies)) / queries, 3) if queries else 1.0,
+        "median_ms": round(median, 2) if median is not None else None,
+        "p95_ms": round(p95, 2) if p95 is not None else None
+    })
+    return result
+
+def rank_resolvers(results: List[Dict]) -> List[Dict]:
+    """Order resolvers by reliability, then median and p95 latency."""
+    return sorted(results, key=lambda r: (
+        r["failure_rate"] > DNS_MAX_FAILURE_RATE,
+        r["median_ms"] is None,
+        r["median_ms"] or 0.0,
+        r["p95_ms"] or 0.0
+    ))
+
+async def benchmark_resolvers(candidates: List[str], names: List[str], queries: int = 10,
+                              timeout: float = 1.0) -> List[Dict]:
+    """Benchmark all candidates concurrently and return them ranked fastest first."""
+    return rank_resolvers(await asyncio.gather(
+        *(benchmark_resolver(candidate, names, queries, timeout) for candidate in candidates)
+    ))
+
+def dns_benchmark(settings: Optional[Settings] = None, force: bool = False,
+                  cache_file: str = DNS_BENCHMARK_FILE) -> Dict:
+    """Rank the [dns] candidates, reusing cached results while fresh and for the same candidates.
+
+    Returns {measured_at, candidates, results, top, cached}; top lists the
+    top_n resolvers whose failure rate is acceptable.
+    """
+    dns = (settings or Settings()).dns
+    candidates, names, top_n = dns.candidates, dns.probe_names, dns.top_n
+    if not candidates or not names:
+        raise ValueError("DNS benchmark needs at least one candidate and one probe name")
+
+    if not force:
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if (cached["candidates"] == candidates and cached["names"] == names
+                    and time.time() - cached["measured_at"] < dns.cache_ttl):
+                cached["top"] = cached["top"][:top_n]
+                cached["cached"] = True
+                return cached
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    logger.info(f"Benchmarking {len(candidates)} DNS resolvers...")
+    started = time.perf_counter()
+    results = asyncio.run(benchmark_resolvers(candidates, names, queries=dns.queries, timeout=dns.timeout))
+    usable = [r["resolver"] for r in results
+              if r["median_ms"] is not None and r["failure_rate"] <= DNS_MAX_FAILURE_RATE]
+    benchmark = {"measured_at": time.time(), "candidates": candidates, "names": names,
+                 "results": results, "top": usable[:top_n], "cached": False}
+    duration = time.perf_counter() - started
+    logger.info(f"DNS benchmark finished in {duration:.2f}s; top: {', '.join(benchmark['top']) or 'none'}",
+                extra={"operation": "dns_benchmark", "duration": round(duration, 4), "target": benchmark["top"]})
+    try:
+        atomic_write(cache_file, json.dumps(benchmark))
+    except OSError as e:
+        logger.warning(f"Could not save DNS benchmark: {str(e)}")
+    return benchmark
+
+def report_dns_benchmark(benchmark: Dict) -> None:
+    """Print the resolver ranking."""
+    age = "cached" if benchmark["cached"] else "measured now"
+    print(f"DNS resolver benchmark ({age}):")
+    for r in benchmark["results"]:
+        if r["median_ms"] is None:
+            print(f" - {r['resolver']}: no answers")
+        else:
+            print(f" - {r['resolver']}: median {r['median_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, "
+                  f"{r['failure_rate'] * 100:.0f}% failed")
+
+def configure_dns_protection(settings: Optional[Settings] = None) -> Optional[List[str]]:
+    """Configure DNS leak protection, returning the servers set or None on failure.
+
+    With [dns] benchmark enabled the fastest reliable resolvers are used,
+    in ranked order; otherwise the first top_n candidates.
+    """
+    logger.info("Configuring DNS leak protection...")
+    settings = settings or Settings()
+    top_n = settings.dns.top_n
+    candidates = settings.dns.candidates
+    if settings.dns.benchmark:
+        try:
+            benchmark = dns_benchmark(settings)
+            report_dns_benchmark(benchmark)
+            candidates = [r["resolver"] for r in benchmark["results"]
+                          if r["median_ms"] is not None and r["failure_rate"] <= DNS_MAX_FAILURE_RATE] or candidates
+        except ValueError as e:
+            logger.error(f"Invalid DNS configuration: {str(e)}")
+    # System resolver settings cannot carry a port
+    secure_dns = []
+    for candidate in candidates:
+        try:
+            host, port = parse_resolver(candidate)
+        except ValueError:
+            logger.warning(f"Ignoring invalid resolver: {candidate}")
+            continue
+        if port == 53 and host not in secure_dns:
+            secure_dns.append(host)
+    secure_dns = secure_dns[:top_n]
+    system = platform.system()
+    applied = None
+    if not secure_dns:
+        logger.error("No usable DNS resolvers.")
+        print("Error: No usable DNS resolvers.")
+        pause()
+        return applied
+
+    if system == "Windows":
+        adapter = run_command(
+            "Get-NetAdapter | Where-Object {$_.Status -eq 'Up' -and $_.InterfaceDescription -notlike '*Virtual*'} | Select-Object -First 1 | Select-Object -ExpandProperty Name",
+            powershell=True
+        )
+        if adapter:
+            addresses = ",".join(f"'{dns}'" for dns in secure_dns)
+            if run_command(f"Set-DnsClientServerAddress -InterfaceAlias '{adapter}' -ServerAddresses ({addresses})", powershell=True) is not None:
+                logger.info(f"Set DNS servers to {', '.join(secure_dns)} on {adapter}")
+                print(f"DNS servers set to {', '.join(secure_dns)}.")
+                applied = secure_dns
+            else:
+                print("Error: Failed to update DNS.")
+        else:
+            logger.error("No active network adapter found.")
+            print("Error: No active network adapter found.")
+    else:
+        try:
+            handled, result = broker_call("write_resolv_conf", servers=secure_dns)
+            if not handled:
+                write_resolv_conf(secure_dns)
+            elif result is None:
+                raise RuntimeError("privileged broker could not write it")
+            logger.info(f"Updated {RESOLV_CONF} with DNS servers: {', '.join(secure_dns)}")
+            print(f"DNS servers set to {', '.join(secure_dns)}.")
+            applied = secure_dns
+        except PermissionError:
+            logger.error(f"Permission denied writing to {RESOLV_CONF}.")
+            print("Error: Permission denied. Run as sudo.")
+        except Exception as e:
+            logger.error(f"Failed to update DNS: {str(e)}")
+            print(f"Error: Failed to update DNS.")
+    pause()
+    return applied
+
+def system_fingerprint_randomizer() -> Dict[str, Optional[str]]:
+    """Randomize system fingerprint attributes, returning the values that were applied."""
+    logger.info("Randomizing system fingerprint...")
+    applied = {"hostname": None, "timezone": None}
+
+    # Randomize hostname
+    if platform.system() != "Windows":
+        new_hostname = f"host-{random.randint(1000, 9999)}"
+        handled, result = broker_call("set_hostname", hostname=new_hostname)
+        if not handled:
+            result = run_command(f"sudo hostnamectl set-hostname {new_hostname}")
+        if result is not None:
+            applied["hostname"] = new_hostname
+        logger.info(f"Set hostname to {new_hostname}")
+        print(f"Hostname set to {new_hostname}")
+
+    # Randomize system time zone
+    timezones = ["UTC", "America/New_York", "Europe/London", "Asia/Tokyo"]
+    new_timezone = random.choice(timezones)
+    if platform.system() == "Windows":
+        result = run_command(f"Set-TimeZone -Id '{new_timezone}'", powershell=True)
+    else:
+        handled, result = broker_call("set_timezone", timezone=new_timezone)
+        if not handled:
+            result = run_command(f"sudo timedatectl set-timezone {new_timezone}")
+    if result is not None:
+        applied["timezone"] = new_timezone
+    logger.info(f"Set timezone to {new_timezone}")
+    print(f"Timezone set to {new_timezone}")
+
+    print("System fingerprint randomized.")
+    pause()
+    return applied
+
+def configure_settings(config_manager: ConfigManager):
+    """Configure tool settings interactively."""
+    print("\nConfigure Settings:")
+    print("1. Mullvad Account Number")
+    print("2. VPN Rotation Interval (seconds)")
+    print("3. Preferred VPN Countries (comma-separated)")
+    print("4. Browsers to Clear")
+    print("5. Clear System Logs (True/False)")
+    print("6. Clear Temporary Files (True/False)")
+    print("7. Auto-Spoof MAC Address (True/False)")
+    print("8. Auto-Randomize User Agent (True/False)")
+    print("9. Auto-Disable WebRTC (True/False)")
+    print("10. Save and Return")
+
+    updates = {}
+    
+    while True:
+        choice = input("Select an option (1-10): ")
+        if choice == '1':
+            account = input("Enter Mullvad account number: ").strip()
+            updates.setdefault('mullvad', {})['account_number'] = account
+        elif choice == '2':
+            interval = input("Enter rotation interval in seconds (e.g., 300): ").strip()
+            updates.setdefault('mullvad', {})['rotation_interval'] = interval
+        elif choice == '3':
+            countries = input("Enter preferred countries (e.g., us,ca,uk): ").strip()
+            updates.setdefault('mullvad', {})['preferred_countries'] = countries
+        elif choice == '4':
+            browsers = input("Enter browsers to clear (e.g., Edge,Chrome,Firefox): ").strip()
+            updates.setdefault('privacy', {})['browsers_to_clear'] = browsers
+        elif choice == '5':
+            clear_logs = input("Clear system logs? (True/False): ").strip()
+            updates.setdefault('privacy', {})['clear_logs'] = clear_logs
+        elif choice == '6':
+            clear_temp = input("Clear temporary files? (True/False): ").strip()
+            updates.setdefault('privacy', {})['clear_temp'] = clear_temp
+        elif choice == '7':
+            spoof_mac = input("Auto-spoof MAC address? (True/False): ").strip()
+            updates.setdefault('network', {})['spoof_mac'] = spoof_mac
+        elif choice == '8':
+            randomize_ua = input("Auto-randomize user agent? (True/False): ").strip()
+            updates.setdefault('network', {})['randomize_user_agent'] = randomize_ua
+        elif choice == '9':
+            disable_webrtc = input("Auto-disable WebRTC? (True/False): ").strip()
+            updates.setdefault('network', {})['disable_webrtc'] = disable_webrtc
+        elif choice == '10':
+            try:
+                config_manager.save_config(updates)
+            except SettingsError as e:
+                print(f"Error: {e}")
+                print("Settings not saved; correct the values above and save again.")
+                continue
+            print("Settings saved.")
+            break
+        else:
+            print("Invalid option. Please select 1-10.")
+        input("Press Enter to continue...")
+
+def run_mullvad_rotator(config: configparser.ConfigParser, max_rotations: Optional[int] = None,
+                        config_manager: Optional[ConfigManager] = None) -> Optional[Dict]:
+    """Run the Mullvad IP rotator with configuration, returning its metrics summary.
+
+    With a config_manager, edits to the file are picked up before the next
+    connection attempt; invalid edits are logged and ignored.
+    """
+    mullvad = (config_manager.settings if config_manager else Settings(config)).mullvad
+    connection_timeout = mullvad.connection_timeout
+    preferred_countries = mullvad.preferred_countries
+
+    if not login_mullvad(mullvad.account_number):
+        logger.error("Login failed.")
+        pause()
+        return None
+
+    catalog = RelayCatalog()
+    servers = get_mullvad_servers(preferred_countries, catalog)
+    if not servers:
+        logger.error("No servers available.")
+        pause()
+        return None
+
+    selector = None
+    if mullvad.relay_selection == 'latency':
+        selector = LatencySelector(
+            catalog.select(preferred_countries),
+            top_n=mullvad.latency_top_n,
+            probe_interval=mullvad.probe_interval
+        )
+
+    def on_reload(settings: Settings) -> None:
+        nonlocal connection_timeout, preferred_countries
+        connection_timeout = settings.mullvad.connection_timeout
+        if settings.mullvad.preferred_countries == preferred_countries:
+            return
+        updated = get_mullvad_servers(settings.mullvad.preferred_countries, catalog)
+        if not updated:
+            logger.warning("No servers for the new preferred countries; keeping the current list.")
+            return
+        preferred_countries = settings.mullvad.preferred_countries
+        servers[:] = updated
+        if selector:
+            selector.set_relays(catalog.select(preferred_countries))
+        logger.info(f"Rotating through {len(servers)} servers in {','.join(preferred_countries)}.")
+
+    print(f"Starting Mullvad IP Rotator with {len(servers)} servers. Press Ctrl+C to stop.")
+    if config_manager:
+        config_manager.subscribe(on_reload)
+    try:
+        asyncio.run(rotate_servers(servers, mullvad.rotation_interval, connection_timeout, selector,
+                                   max_rotations, config_manager))
+    except KeyboardInterrupt:
+        logger.info("Rotator interrupted.")
+        disconnect_vpn(connection_timeout)
+        rotation_metrics.export()
+        print("Returning to menu...")
+    finally:
+        if config_manager:
+            config_manager.unsubscribe(on_reload)
+    return rotation_metrics.summary()
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)')
+
+def measure_startup(runs: int = STARTUP_RUNS) -> Dict:
+    """Launch this script with -X importtime and report median wall and import times in ms."""
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--help"]
+    walls, totals, fastest = [], [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run(command, capture_output=True, text=True)
+        walls.append((time.perf_counter() - started) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Startup run failed: {proc.stderr.strip().splitlines()[-1:]}")
+        # Only top-level entries; nested imports are included in their parent's cumulative time
+        imports = {}
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match and not match.group(2):
+                imports[match.group(3)] = int(match.group(1)) / 1000
+        totals.append(sum(imports.values()))
+        if fastest is None or totals[-1] < sum(fastest.values()):
+            fastest = imports
+    slowest = sorted(fastest.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "runs": runs,
+        "wall_ms": round(sorted(walls)[len(walls) // 2], 1),
+        "import_ms": round(sorted(totals)[len(totals) // 2], 1),
+        "slowest_imports": {name: round(ms, 1) for name, ms in slowest}
+    }
+
+def _synthetic_preferences(rng: random.Random, size: int) -> Dict:
+    """Build a Chromium Preferences document of roughly size bytes, padded with extension entries."""
+    settings = {}
+    while len(settings) * 620 < size:
+        settings[rng.randbytes(16).hex()] = {
+            "state": 1,
+            "location": 1,
+            "manifest": {"name": f"Extension {len(settings)}", "version": "1.0.0",
+                         "description": rng.randbytes(250).hex()}
+        }
+    return {"browser": {"has_seen_welcome_page": True}, "extensions": {"settings": settings},
+            "profile": {"exit_type": "Normal"}}
+
+def _synthetic_cookies(path: str, table: str, column: str, rng: random.Random, count: int) -> None:
+    """Create a cookie database with count rows spread over a few hundred hosts."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hosts = [f".site{i}.example" for i in range(200)]
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f"CREATE TABLE {table} ({column} TEXT, name TEXT, value TEXT, path TEXT, expiry INTEGER)")
+        conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, '/', ?)",
+                         ((rng.choice(hosts), f"c{i}", rng.randbytes(16).hex(), 2000000000) for i in range(count)))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _synthetic_cache(directory: str, block: bytes, count: int) -> int:
+    """Write count cache files of one shared block, returning the bytes written."""
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(directory, f"f_{i:06x}"), 'wb') as f:
+            f.write(block)
+    return len(block) * count
+
+def generate_browser_profiles(root: str, browsers: Tuple[str, ...] = ("Chrome", "Firefox"), profiles: int = 3,
+                              cache_files: int = 2000, cache_file_kb: int = 8, prefs_mb: float = 2.0,
+                              cookies: int = 5000, seed: int = 0) -> Dict[str, Dict[str, int]]:
+    """Write synthetic Chromium and Firefox data under root, replacing any earlier tree.
+
+    The layout matches get_browser_paths with NO_TRACE_BROWSER_ROOT=root;
+    sizes are per profile. Returns the files and bytes written per browser.
+    """
+    rng = random.Random(seed)
+    block = rng.randbytes(cache_file_kb * 1024)
+    prefs_size = int(prefs_mb * 1024 * 1024)
+    written = {}
+    for browser in browsers:
+        base = os.path.join(root, browser)
+        shutil.rmtree(base, ignore_errors=True)
+        os.makedirs(base)
+        files, size = 0, 0
+        if browser == "Firefox":
+            ini = ["[General]", "StartWithLastProfile=1", "Version=2", ""]
+            for index in range(profiles):
+                profile_id = f"Profiles/bench{index}.default"
+                ini += [f"[Profile{index}]", f"Name=bench{index}", "IsRelative=1", f"Path={profile_id}",
+                        f"Default={int(index == 0)}", ""]
+                path = os.path.join(base, profile_id)
+                os.makedirs(path)
+                with open(os.path.join(path, "prefs.js"), 'w', encoding='utf-8') as f:
+                    for i in range(prefs_size // 230):
+                        f.write(f'user_pref("bench.pref.{i}", "{rng.randbytes(100).hex()}");\n')
+                _synthetic_cookies(os.path.join(path, "cookies.sqlite"), "moz_cookies", "host", rng, cookies)
+                size += _synthetic_cache(os.path.join(path, "cache2", "entries"), block, cache_files)
+                files += cache_files + 2
+            with open(os.path.join(base, "profiles.ini"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(ini))
+        else:
+            profile_ids = ["Default"] + [f"Profile {index}" for index in range(1, profiles)]
+            local_state = {"profile": {"info_cache": {pid: {"name": f"Person {i + 1}"} for i, pid in enumerate(profile_ids)}}}
+            with open(os.path.join(base, "Local State"), 'w', encoding='utf-8') as f:
+                json.dump(local_state, f)
+            for profile_id in profile_ids:
+                path = os.path.join(base, profile_id)
+                os.makedirs(path)
+                with open(os.path.join(path, "Preferences"), 'w', encoding='utf-8') as f:
+                    json.dump(_synthetic_preferences(rng, prefs_size), f, separators=(',', ':'))
+                _synthetic_cookies(os.path.join(path, "Network", "Cookies"), "cookies", "host_key", rng, cookies)
+                # Three quarters HTTP cache, the rest compiled script cache
+                size += _synthetic_cache(os.path.join(path, "Cache", "Cache_Data"), block, cache_files - cache_files // 4)
+                size += _synthetic_cache(os.path.join(path, "Code Cache", "js"), block, cache_files // 4)
+                files += cache_files + 2
+        written[browser] = {"files": files, "bytes": size}
+    return written
+
+def _bench_clear_browser_data(root: str) -> Tuple[int, int]:
+    result = clear_browser_data(["Chrome"], close_browsers=False)
+    if result is None:
+        raise RuntimeError("Chrome is running; close it to benchmark clear_browser_data.")
+    return result["files"], result["bytes"]
+
+def _bench_clear_firefox_data(root: str) -> Tuple[int, int]:
+    result = clear_firefox_data(os.path.join(root, "Firefox"))
+    return result["files"], result["bytes"]
+
+def _written_prefs(outcomes: Dict[str, str]) -> Tuple[int, int]:
+    """Count the preferences files an operation rewrote and their size."""
+    written = [path for path, outcome in outcomes.items() if outcome == "written"]
+    return len(written), sum(os.path.getsize(path) for path in written)
+
+def _bench_disable_webrtc(root: str) -> Tuple[int, int]:
+    return _written_prefs(disable_webrtc(["Chrome", "Firefox"]))
+
+def _bench_randomize_user_agent(root: str) -> Tuple[int, int]:
+    return _written_prefs(randomize_user_agent(["Chrome", "Firefox"]))
+
+# Benchmarked operations: name -> (runner returning files and bytes processed, browsers it needs, whether it reads caches)
+BENCH_OPERATIONS = {
+    'clear_browser_data': (_bench_clear_browser_data, ("Chrome",), True),
+    'clear_firefox_data': (_bench_clear_firefox_data, ("Firefox",), True),
+    'disable_webrtc': (_bench_disable_webrtc, ("Chrome", "Firefox"), False),
+    'randomize_user_agent': (_bench_randomize_user_agent, ("Chrome", "Firefox"), False)
+}
+
+def run_browser_bench(workload: Dict, repeat: int = BENCH_REPEAT, parent: Optional[str] = None) -> Dict:
+    """Time each BENCH_OPERATIONS entry end to end on freshly generated profiles.
+
+    Profiles are regenerated (untimed) before every run in a temporary
+    directory under parent, without caches for operations that never read
+    them. The median and best of repeat runs are reported; one extra run
+    under tracemalloc records peak Python memory, since tracing would
+    distort the timings.
+    """
+    if repeat < 1:
+        raise ValueError("repeat must be at least 1")
+    root = tempfile.mkdtemp(prefix="no-trace-bench-", dir=parent)
+    previous_root = os.environ.get("NO_TRACE_BROWSER_ROOT")
+    os.environ["NO_TRACE_BROWSER_ROOT"] = root
+    _browser_paths.cache_clear()
+    operations = {}
+    try:
+        with open(os.devnull, 'w') as devnull:
+            for name, (runner, browsers, with_cache) in BENCH_OPERATIONS.items():
+                timings, peak = [], 0
+                sizes = dict(workload, cache_files=workload["cache_files"] if with_cache else 0)
+                for run in range(repeat + 1):
+                    generate_browser_profiles(root, browsers, **sizes)
+                    traced = run == repeat
+                    gc.collect()
+                    if traced:
+                        tracemalloc.start()
+                    started = time.perf_counter()
+                    with contextlib.redirect_stdout(devnull):
+                        files, size = runner(root)
+                    elapsed = time.perf_counter() - started
+                    if traced:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    else:
+                        timings.append(elapsed)
+                seconds = sorted(timings)[len(timings) // 2]
+                operations[name] = {
+                    "seconds": round(seconds, 4),
+                    "best_seconds": round(min(timings), 4),
+                    "files": files,
+                    "bytes": size,
+                    "files_per_s": round(files / seconds, 1),
+                    "mb_per_s": round(size / seconds / (1024 * 1024), 2),
+                    "peak_bytes": peak
+                }
+    finally:
+        if previous_root is None:
+            os.environ.pop("NO_TRACE_BROWSER_ROOT", None)
+        else:
+            os.environ["NO_TRACE_BROWSER_ROOT"] = previous_root
+        _browser_paths.cache_clear()
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "workload": workload,
+        "operations": operations
+    }
+
+def compare_bench(results: Dict, baseline: Dict, threshold_pct: float = BENCH_THRESHOLD_PCT) -> List[str]:
+    """Return the time and peak memory regressions of results beyond threshold_pct over baseline.
+
+    Time is compared on the best run, which is far less noisy than the median.
+    """
+    if baseline.get("workload") != results["workload"]:
+        raise ValueError("Baseline was recorded with a different workload; re-run with --save to replace it.")
+    regressions = []
+    for name, current in results["operations"].items():
+        previous = baseline.get("operations", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("best_seconds", "peak_bytes"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold_pct / 100):
+                change = (current[metric] / previous[metric] - 1) * 100
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]} (+{change:.0f}%)")
+    return regressions
+
+def _browser_list(args: argparse.Namespace, settings: Settings) -> List[str]:
+    """Browsers named on the command line, else those from the configuration."""
+    value = getattr(args, 'browsers', None)
+    return _parse_list(value) if value else settings.privacy.browsers_to_clear
+
+def cmd_rotate(args, config, config_manager) -> Tuple[bool, Optional[Dict]]:
+    """Run the rotator, optionally for a fixed number of connection attempts."""
+    summary = run_mullvad_rotator(config, args.cycles, config_manager)
+    return summary is not None, summary
+
+def cmd_spoof_mac(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Spoof the MAC address of the given or primary interface."""
+    spoofed = spoof_mac_address(args.interface, args.mac)
+    return spoofed, {"interface": args.interface, "mac_address": current_mac_address() if spoofed else None}
+
+def cmd_clean_system(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Clear system logs and temporary files as configured."""
+    cleared = clear_logs_and_cache(
+        config_manager.settings.privacy.clear_logs and not args.no_logs,
+        config_manager.settings.privacy.clear_temp and not args.no_temp,
+        config_manager.settings,
+        args.dry_run
+    )
+    return all(r["status"] != "failed" for r in cleared["temp"]), cleared
+
+def cmd_webrtc(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Disable WebRTC in the selected browsers."""
+    outcomes = disable_webrtc(_browser_list(args, config_manager.settings)) or {}
+    return not any(o.startswith("error") for o in outcomes.values()), outcomes
+
+def cmd_user_agent(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Randomize the user agent in the selected browsers."""
+    outcomes = randomize_user_agent(_browser_list(args, config_manager.settings)) or {}
+    return not any(o.startswith("error") for o in outcomes.values()), outcomes
+
+def cmd_browser_privacy(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Apply WebRTC and user agent settings with one write per profile."""
+    outcomes = apply_browser_privacy(
+        _browser_list(args, config_manager.settings),
+        webrtc=config_manager.settings.network.disable_webrtc,
+        user_agent=config_manager.settings.network.randomize_user_agent
+    )
+    return not any(o.startswith("error") for o in outcomes.values()), outcomes
+
+def cmd_clean_browsers(args, config, config_manager) -> Tuple[bool, Optional[Dict]]:
+    """Clear cookies and cache of the selected browsers."""
+    result = clear_browser_data(_browser_list(args, config_manager.settings), args.close_browsers, args.dry_run,
+                                config_manager.settings)
+    return result is not None and not result.get("errors"), result
+
+def cmd_scan(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Run the network privacy scan, overriding scan targets and ports if given."""
+    return True, network_privacy_scan(config_manager.settings, targets=args.targets, ports=args.ports)
+
+def cmd_dns(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Configure DNS leak protection."""
+    servers = configure_dns_protection(config_manager.settings)
+    return servers is not None, {"dns_servers": servers}
+
+def cmd_dns_bench(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Benchmark the candidate resolvers without changing system settings."""
+    benchmark = dns_benchmark(config_manager.settings, force=args.force)
+    report_dns_benchmark(benchmark)
+    return bool(benchmark["top"]), benchmark
+
+def cmd_fingerprint(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Randomize hostname and timezone."""
+    applied = system_fingerprint_randomizer()
+    return all(applied.values()), applied
+
+def cmd_compact_prefs(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Compact Firefox prefs.js files."""
+    return True, compact_firefox_prefs()
+
+def _config_assignment(assignment: str) -> Tuple[str, str, str]:
+    """Split a --set argument of the form section.key=value."""
+    key, sep, value = assignment.partition('=')
+    section, dot, option = key.partition('.')
+    if not sep or not dot or not section or not option:
+        raise argparse.ArgumentTypeError(f"expected section.key=value, got {assignment!r}")
+    return section, option, value
+
+def cmd_config(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Apply section.key=value updates and return the resulting configuration."""
+    updates = {}
+    for section, option, value in args.set or []:
+        updates.setdefault(section, {})[option] = value
+    if updates:
+        config_manager.save_config(updates)
+    return True, {section: dict(config[section]) for section in config.sections()}
+
+def cmd_bench(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Benchmark browser operations on synthetic profiles, optionally saving or comparing a baseline."""
+    workload = {key: getattr(args, key) for key in BENCH_WORKLOAD}
+    results = run_browser_bench(workload, args.repeat, args.dir)
+    for name, op in results["operations"].items():
+        print(f"{name}: {op['seconds'] * 1000:.1f} ms, {op['files_per_s']:.0f} files/s, "
+              f"{op['mb_per_s']:.1f} MB/s, peak {format_bytes(op['peak_bytes'])}")
+    ok = True
+    if args.compare:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"No baseline at {args.baseline}; run with --save first.")
+        results["regressions"] = compare_bench(results, baseline, args.threshold)
+        for regression in results["regressions"]:
+            print(f"Regression: {regression}")
+        ok = not results["regressions"]
+        print(f"{len(results['regressions'])} regression(s) beyond {args.threshold}% against {args.baseline}.")
+    if args.save:
+        atomic_write(args.baseline, json.dumps(results, indent=2))
+        print(f"Baseline saved to {args.baseline}.")
+    return ok, results
+
+def cmd_broker(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Serve privileged operations over a Unix socket until interrupted."""
+    if platform.system() == "Windows":
+        raise RuntimeError("The privileged broker needs Unix domain sockets.")
+    user = args.user or os.environ.get("SUDO_UID")
+    if not user:
+        raise ValueError("Pass --user to name the user allowed to connect.")
+    try:
+        uid = int(user) if user.isdigit() else pwd.getpwnam(user).pw_uid
+    except KeyError:
+        raise ValueError(f"Unknown user: {user}")
+    path = args.socket or broker_socket_path()
+    broker = PrivilegedBroker(path, uid)
+    broker.bind()
+    print(f"Privileged broker listening on {path} for uid {uid}. Press Ctrl+C to stop.")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Broker interrupted.")
+    finally:
+        broker.stop()
+    return True, {"socket": path, "uid": uid, "requests": broker.requests}
+
+def cmd_bench_startup(args, config, config_manager) -> Tuple[bool, Dict]:
+    """Check launch time against the budget using -X importtime."""
+    result = measure_startup(args.runs)
+    result["budget_ms"] = args.budget_ms
+    result["within_budget"] = result["wall_ms"] <= args.budget_ms
+    print(f"Startup: {result['wall_ms']} ms wall, {result['import_ms']} ms importing "
+          f"(budget {args.budget_ms} ms, median of {args.runs} runs)")
+    for name, ms in result["slowest_imports"].items():
+        print(f" - {name}: {ms} ms")
+    if not result["within_budget"]:
+        print("Error: Startup time is over budget.")
+    return result["within_budget"], result
+
+# Headless subcommands: name -> (handler, needs admin privileges)
+COMMANDS = {
+    'rotate': (cmd_rotate, False),
+    'spoof-mac': (cmd_spoof_mac, True),
+    'clean-system': (cmd_clean_system, True),
+    'webrtc': (cmd_webrtc, False),
+    'user-agent': (cmd_user_agent, False),
+    'browser-privacy': (cmd_browser_privacy, False),
+    'clean-browsers': (cmd_clean_browsers, False),
+    'scan': (cmd_scan, False),
+    'dns': (cmd_dns, True),
+    'dns-bench': (cmd_dns_bench, False),
+    'fingerprint': (cmd_fingerprint, True),
+    'compact-prefs': (cmd_compact_prefs, False),
+    'config': (cmd_config, False),
+    'bench-startup': (cmd_bench_startup, False),
+    'bench': (cmd_bench, False),
+    'broker': (cmd_broker, True),
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser; with no subcommand the interactive menu runs."""
+    parser = argparse.ArgumentParser(
+        prog="no-trace",
+        description="Advanced anonymization tool. Run without a command for the interactive menu."
+    )
+    parser.add_argument('--config', default=CONFIG_FILE, help="configuration file (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="print a single JSON result on stdout")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="show more log output on the console (repeatable)")
+    parser.add_argument('-q', '--quiet', action='count', default=0, help="show less log output on the console (repeatable)")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    rotate = commands.add_parser('rotate', help="rotate Mullvad servers")
+    rotate.add_argument('--cycles', type=int, default=None, help="stop after this many connection attempts")
+
+    spoof = commands.add_parser('spoof-mac', help="spoof the MAC address")
+    spoof.add_argument('--interface', default=None, help="network interface (default: primary)")
+    spoof.add_argument('--mac', default=None, help="MAC address to set (default: random)")
+
+    clean_system = commands.add_parser('clean-system', help="clear system logs and temporary files")
+    clean_system.add_argument('--no-logs', action='store_true', help="keep system logs")
+    clean_system.add_argument('--no-temp', action='store_true', help="keep temporary files")
+    clean_system.add_argument('--dry-run', action='store_true', help="only report what would be cleared")
+
+    for name, help_text in (('webrtc', "disable WebRTC"),
+                            ('user-agent', "randomize the user agent"),
+                            ('browser-privacy', "disable WebRTC and randomize the user agent in one pass")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--browsers', default=None, help="comma-separated browsers (default: from config)")
+
+    clean_browsers = commands.add_parser('clean-browsers', help="clear browser cookies and cache")
+    clean_browsers.add_argument('--browsers', default=None, help="comma-separated browsers (default: from config)")
+    clean_browsers.add_argument('--close-browsers', action='store_true', default=None,
+                                help="terminate running browsers instead of aborting")
+    clean_browsers.add_argument('--dry-run', action='store_true',
+                                help="only report reclaimable space per browser, profile and category")
+
+    scan = commands.add_parser('scan', help="network privacy scan")
+    scan.add_argument('--targets', default=None, help="hosts, ranges or CIDRs (default: from config)")
+    scan.add_argument('--ports', default=None, help="ports or ranges (default: from config)")
+
+    commands.add_parser('dns', help="configure DNS leak protection")
+    dns_bench = commands.add_parser('dns-bench', help="rank the candidate DNS resolvers by latency")
+    dns_bench.add_argument('--force', action='store_true', help="ignore cached results")
+    commands.add_parser('fingerprint', help="randomize hostname and timezone")
+    commands.add_parser('compact-prefs', help="compact Firefox prefs.js files")
+
+    config = commands.add_parser('config', help="show or update the configuration")
+    config.add_argument('--set', action='append', type=_config_assignment, metavar='SECTION.KEY=VALUE',
+                        help="update a setting (repeatable)")
+
+    bench_startup = commands.add_parser('bench-startup', help="check launch time against a budget")
+    bench_startup.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                               help="maximum median launch time (default: %(default)s)")
+    bench_startup.add_argument('--runs', type=int, default=STARTUP_RUNS, help="launches to measure (default: %(default)s)")
+
+    bench = commands.add_parser('bench', help="benchmark browser cleanup and preference changes on synthetic profiles")
+    bench.add_argument('--profiles', type=int, default=BENCH_WORKLOAD["profiles"], help="profiles per browser (default: %(default)s)")
+    bench.add_argument('--cache-files', type=int, default=BENCH_WORKLOAD["cache_files"],
+                       help="cache files per profile (default: %(default)s)")
+    bench.add_argument('--cache-file-kb', type=int, default=BENCH_WORKLOAD["cache_file_kb"],
+                       help="size of each cache file (default: %(default)s)")
+    bench.add_argument('--prefs-mb', type=float, default=BENCH_WORKLOAD["prefs_mb"],
+                       help="size of each Preferences and prefs.js file (default: %(default)s)")
+    bench.add_argument('--cookies', type=int, default=BENCH_WORKLOAD["cookies"], help="cookies per profile (default: %(default)s)")
+    bench.add_argument('--repeat', type=int, default=BENCH_REPEAT, help="timed runs per operation (default: %(default)s)")
+    bench.add_argument('--dir', default=None, help="parent directory for the synthetic profiles (default: system temp)")
+    bench.add_argument('--baseline', default=BENCH_BASELINE_FILE, help="baseline file (default: %(default)s)")
+    bench.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    bench.add_argument('--compare', action='store_true', help="fail when an operation regresses past --threshold")
+    bench.add_argument('--threshold', type=float, default=BENCH_THRESHOLD_PCT,
+                       help="allowed increase in time or peak memory, in percent (default: %(default)s)")
+
+    broker = commands.add_parser('broker', help="serve privileged operations to an unprivileged user")
+    broker.add_argument('--socket', default=None,
+                        help=f"socket path (default: $NO_TRACE_BROKER_SOCKET or {BROKER_SOCKET})")
+    broker.add_argument('--user', default=None, help="user allowed to connect (default: the user who ran sudo)")
+    return parser
+
+def run_headless(args: argparse.Namespace, config_manager: ConfigManager, config: configparser.ConfigParser) -> int:
+    """Run one subcommand without prompts and return the process exit code."""
+    global INTERACTIVE
+    INTERACTIVE = False
+    command, needs_admin = COMMANDS[args.command]
+    if needs_admin and not getattr(args, 'dry_run', False):
+        check_admin_privileges(use_broker=args.command != 'broker')
+
+    # Keep stdout clean for the JSON document
+    output = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    with output:
+        try:
+            ok, result = command(args, config, config_manager)
+        except Exception as e:
+            logger.error(f"Command {args.command} failed: {str(e)}")
+            ok, result = False, {"error": str(e)}
+
+    if args.json:
+        print(json.dumps({"command": args.command, "ok": ok, "result": result}, default=str))
+    return 0 if ok else 1
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main function to run the advanced anonymization tool."""
+    args = build_parser().parse_args(argv)
+    config_manager = ConfigManager(args.config)
+    try:
+        # `config --set` must stay usable to repair a file that fails validation
+        config = config_manager.load_config(validate=args.command != 'config')
+    except (configparser.Error, SettingsError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    setup_logging(config, sys.stderr if args.json else sys.stdout, args.verbose - args.quiet)
+    if args.command:
+        return run_headless(args, config_manager, config)
+
+    check_admin_privileges()
+
+    while True:
+        choice = display_menu()
+        config_manager.reload_if_changed()
+        settings = config_manager.settings
+        if choice == '1':
+            run_mullvad_rotator(config, config_manager=config_manager)
+        elif choice == '2':
+            interface = input("Enter network interface (leave blank for default): ").strip() or None
+            specific_mac = input("Enter specific MAC address (leave blank for random): ").strip() or None
+            spoof_mac_address(interface, specific_mac)
+        elif choice == '3':
+            clear_logs_and_cache(settings.privacy.clear_logs, settings.privacy.clear_temp, settings)
+        elif choice == '4':
+            browsers = settings.privacy.browsers_to_clear
+            disable_webrtc(browsers)
+        elif choice == '5':
+            browsers = settings.privacy.browsers_to_clear
+            randomize_user_agent(browsers)
+        elif choice == '6':
+            browsers = settings.privacy.browsers_to_clear
+            clear_browser_data(browsers, settings=settings)
+        elif choice == '7':
+            network_privacy_scan(settings)
+        elif choice == '8':
+            configure_settings(config_manager)
+        elif choice == '9':
+            configure_dns_protection(settings)
+        elif choice == '10':
+            system_fingerprint_randomizer()
+        elif choice == '11':
+            browsers = settings.privacy.browsers_to_clear
+            apply_browser_privacy(
+                browsers,
+                webrtc=settings.network.disable_webrtc,
+                user_agent=settings.network.randomize_user_agent
+            )
+        elif choice == '12':
+            compact_firefox_prefs()
+            pause()
+        elif choice == '13':
+            browsers = settings.privacy.browsers_to_clear
+            clear_browser_data(browsers, dry_run=True, settings=settings)
+        elif choice == '14':
+            logger.info("Exiting program.")
+            print("Goodbye!")
+            return 0
+        else:
+            print("Invalid option. Please select 1-14.")
+            input("Press Enter to continue...")
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        disconnect_vpn()
+        sys.exit(1)
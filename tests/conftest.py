@@ -0,0 +1,19 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "no-trace.py")
+
+
+@pytest.fixture(scope="session")
+def no_trace():
+    """Load no-trace.py, whose hyphenated name cannot be imported directly."""
+    module = sys.modules.get("no_trace")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("no_trace", MODULE_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["no_trace"] = module
+        spec.loader.exec_module(module)
+    return module
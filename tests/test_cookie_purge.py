@@ -0,0 +1,137 @@
+import configparser
+import os
+import sqlite3
+
+import pytest
+
+HOSTS = [".example.com", "www.example.com", "ads.tracker.net", "tracker.net", "Mail.Example.COM", "other.org"]
+
+
+def make_store(path, rows, hosts=HOSTS, table="moz_cookies", column="host", wal=False):
+    """Create a cookie table with rows cookies cycling through hosts; returns the open connection."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    if wal:
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"CREATE TABLE {table} ({column} TEXT, name TEXT)")
+    conn.executemany(f"INSERT INTO {table} VALUES (?, ?)", ((hosts[i % len(hosts)], f"c{i}") for i in range(rows)))
+    conn.commit()
+    return conn
+
+
+def hosts_left(path, table="moz_cookies", column="host"):
+    with sqlite3.connect(path) as conn:
+        return sorted({row[0] for row in conn.execute(f"SELECT {column} FROM {table}")})
+
+
+def test_policy_matches_domains_and_subdomains(no_trace):
+    policy = no_trace.CookiePolicy(allow=[".Example.com", " "], deny=[])
+    assert not policy.purge(".example.com")
+    assert not policy.purge("www.example.com")
+    assert not policy.purge("Mail.Example.COM")
+    assert policy.purge("notexample.com")
+    assert policy.purge("tracker.net")
+    assert policy.purge(None)
+
+
+def test_denylist_limits_purging_and_allowlist_wins(no_trace):
+    policy = no_trace.CookiePolicy(allow=["safe.tracker.net"], deny=["tracker.net"])
+    assert policy.purge("tracker.net")
+    assert policy.purge("ads.tracker.net")
+    assert not policy.purge("safe.tracker.net")
+    assert not policy.purge("cdn.safe.tracker.net")
+    assert not policy.purge("example.com")
+
+
+def test_policy_from_settings(no_trace):
+    config = configparser.ConfigParser()
+    config.read_dict({"privacy": {"cookie_allowlist": "example.com", "cookie_denylist": "tracker.net, other.org"}})
+    policy = no_trace.CookiePolicy.from_settings(no_trace.Settings(config))
+    assert (policy.allow, policy.deny) == (["example.com"], ["tracker.net", "other.org"])
+
+
+def test_purge_runs_in_batches_across_the_batch_size(no_trace, tmp_path, monkeypatch):
+    path = str(tmp_path / "cookies.sqlite")
+    rows = 2 * no_trace.COOKIE_BATCH_SIZE * len(HOSTS) // 4 + 7
+    make_store(path, rows).close()
+    purged = sum(1 for i in range(rows) if "example" not in HOSTS[i % len(HOSTS)].lower())
+
+    statements = []
+    real_connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = real_connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(sqlite3, "connect", traced_connect)
+    policy = no_trace.CookiePolicy(allow=["example.com"])
+    outcome = no_trace.purge_cookie_store(path, "moz_cookies", "host", policy)
+    monkeypatch.undo()
+
+    assert outcome["errors"] == []
+    assert outcome["rows"] == purged
+    assert outcome["remaining"] == rows - purged
+    assert statements.count("BEGIN IMMEDIATE") == -(-purged // no_trace.COOKIE_BATCH_SIZE)
+    assert hosts_left(path) == [".example.com", "Mail.Example.COM", "www.example.com"]
+
+
+def test_small_batches_skip_kept_rows(no_trace, tmp_path):
+    path = str(tmp_path / "Cookies")
+    make_store(path, 100, table="cookies", column="host_key").close()
+    policy = no_trace.CookiePolicy(deny=["tracker.net"])
+    outcome = no_trace.purge_cookie_store(path, "cookies", "host_key", policy, batch_size=3)
+    assert (outcome["rows"], outcome["remaining"]) == (34, 66)
+    assert hosts_left(path, "cookies", "host_key") == [".example.com", "Mail.Example.COM", "other.org",
+                                                       "www.example.com"]
+
+
+def test_wal_content_is_purged_and_checkpointed(no_trace, tmp_path):
+    path = str(tmp_path / "cookies.sqlite")
+    # Keep the writer open so its rows stay in the WAL instead of being checkpointed on close
+    writer = make_store(path, 600, wal=True)
+    try:
+        assert os.path.getsize(path + "-wal") > 0
+        outcome = no_trace.purge_cookie_store(path, "moz_cookies", "host", no_trace.CookiePolicy(deny=["other.org"]))
+        assert (outcome["rows"], outcome["remaining"]) == (100, 500)
+        assert os.path.getsize(path + "-wal") == 0
+        assert outcome["bytes"] > 0
+        assert writer.execute("SELECT COUNT(*) FROM moz_cookies WHERE host = 'other.org'").fetchone()[0] == 0
+    finally:
+        writer.close()
+
+
+def test_dry_run_counts_rows_without_deleting(no_trace, tmp_path):
+    path = str(tmp_path / "cookies.sqlite")
+    make_store(path, 60).close()
+    before = os.path.getsize(path)
+    outcome = no_trace.purge_cookie_store(path, "moz_cookies", "host",
+                                          no_trace.CookiePolicy(allow=["example.com"]), dry_run=True)
+    assert (outcome["rows"], outcome["remaining"], outcome["bytes"]) == (30, 30, 0)
+    assert os.path.getsize(path) == before
+    assert len(hosts_left(path)) == len(HOSTS)
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_clear_firefox_data_follows_cookie_settings(no_trace, tmp_path, monkeypatch, dry_run):
+    # Dry-run previews cache directory sizes in a file in the working directory
+    monkeypatch.chdir(tmp_path)
+    no_trace.generate_browser_profiles(str(tmp_path), browsers=("Firefox",), profiles=2, cache_files=3,
+                                       prefs_mb=0.01, cookies=0)
+    firefox = str(tmp_path / "Firefox")
+    stores = [os.path.join(firefox, "Profiles", f"bench{i}.default", "cookies.sqlite") for i in range(2)]
+    for store in stores:
+        os.unlink(store)
+        make_store(store, 60).close()
+
+    config = configparser.ConfigParser()
+    config.read_dict({"privacy": {"cookie_allowlist": "example.com", "cookie_denylist": "tracker.net"}})
+    result = no_trace.clear_firefox_data(firefox, dry_run=dry_run, settings=no_trace.Settings(config))
+
+    if dry_run:
+        rows = sum(totals["rows"] for profile in result["by_browser"]["Firefox"].values()
+                   for category, totals in profile.items() if category == "cookies")
+        assert rows == 2 * 20
+    for store in stores:
+        expected = HOSTS if dry_run else [".example.com", "Mail.Example.COM", "other.org", "www.example.com"]
+        assert hosts_left(store) == sorted(expected)
@@ -0,0 +1,91 @@
+import asyncio
+import struct
+import time
+
+
+class FakeResolver(asyncio.DatagramProtocol):
+    """DNS stand-in on 127.0.0.1 answering after a fixed delay.
+
+    rcode sets the response code; drop_every=n leaves every n-th query
+    unanswered (1 drops all of them).
+    """
+    def __init__(self, delay=0.0, rcode=0, drop_every=0):
+        self.delay = delay
+        self.rcode = rcode
+        self.drop_every = drop_every
+        self.received = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if self.drop_every and self.received % self.drop_every == 0:
+            return
+        query_id, _flags, qdcount = struct.unpack("!HHH", data[:6])
+        reply = struct.pack("!HHHHHH", query_id, 0x8180 | self.rcode, qdcount, 0, 0, 0) + data[12:]
+        asyncio.get_running_loop().call_later(self.delay, self.transport.sendto, reply, addr)
+
+
+async def start_resolver(**behaviour):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: FakeResolver(**behaviour), local_addr=("127.0.0.1", 0)
+    )
+    return "127.0.0.1:%d" % transport.get_extra_info("sockname")[1], transport, protocol
+
+
+def run_benchmark(no_trace, behaviours, queries=4, timeout=0.5):
+    """Start one stand-in per behaviour and benchmark them all; returns (results by resolver, specs, seconds)."""
+    async def scenario():
+        servers = [await start_resolver(**behaviour) for behaviour in behaviours]
+        try:
+            started = time.perf_counter()
+            results = await no_trace.benchmark_resolvers(
+                [spec for spec, _, _ in servers], ["example.com", "example.org"], queries=queries, timeout=timeout
+            )
+            return results, [spec for spec, _, _ in servers], time.perf_counter() - started
+        finally:
+            for _, transport, _ in servers:
+                transport.close()
+
+    return asyncio.run(scenario())
+
+
+def test_ranks_resolvers_by_injected_delay(no_trace):
+    results, (slow, fast, medium), _ = run_benchmark(no_trace, [{"delay": 0.12}, {"delay": 0.0}, {"delay": 0.05}])
+    assert [r["resolver"] for r in results] == [fast, medium, slow]
+    by_spec = {r["resolver"]: r for r in results}
+    assert by_spec[slow]["median_ms"] >= 120
+    assert 50 <= by_spec[medium]["median_ms"] < 120
+    assert all(r["failures"] == 0 and r["failure_rate"] == 0.0 for r in results)
+
+
+def test_unreliable_resolvers_rank_after_slow_reliable_ones(no_trace):
+    results, (silent, flaky, servfail, slow), _ = run_benchmark(
+        no_trace, [{"drop_every": 1}, {"drop_every": 2}, {"rcode": 2}, {"delay": 0.08}], timeout=0.2
+    )
+    by_spec = {r["resolver"]: r for r in results}
+    assert results[0]["resolver"] == slow
+    assert by_spec[silent]["failure_rate"] == 1.0 and by_spec[silent]["median_ms"] is None
+    assert by_spec[flaky]["failures"] == 2 and by_spec[flaky]["failure_rate"] == 0.5
+    assert by_spec[servfail]["failure_rate"] == 1.0
+    assert results[-1]["resolver"] in (silent, servfail)
+
+
+def test_nxdomain_counts_as_an_answer(no_trace):
+    results, _, _ = run_benchmark(no_trace, [{"rcode": 3}])
+    assert results[0]["failures"] == 0
+
+
+def test_candidates_are_measured_concurrently(no_trace):
+    # Sequentially these would take 4 resolvers x 4 queries x 0.1 s = 1.6 s
+    results, _, elapsed = run_benchmark(no_trace, [{"delay": 0.1}] * 4)
+    assert all(r["failures"] == 0 for r in results)
+    assert elapsed < 1.0
+
+
+def test_unparseable_resolver_is_reported_as_failed(no_trace):
+    result = asyncio.run(no_trace.benchmark_resolver("not-an-address", ["example.com"], queries=2, timeout=0.1))
+    assert result["failure_rate"] == 1.0 and result["median_ms"] is None
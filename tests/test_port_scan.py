@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import socket
+import time
+
+import pytest
+
+
+@contextlib.contextmanager
+def listener(host="127.0.0.1", backlog=16):
+    """A listening TCP socket on a free port; connections are never accepted."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind((host, 0))
+    sock.listen(backlog)
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def closed_port(host="127.0.0.1"):
+    """A port nothing listens on: bound to reserve a number, then released."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def unresponsive_port(host="127.0.0.1"):
+    """A port whose accept queue is full, so further SYNs are dropped and connects time out."""
+    with listener(host, backlog=0) as port:
+        clients = []
+        try:
+            for _ in range(4):
+                client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                client.setblocking(False)
+                client.connect_ex((host, port))
+                clients.append(client)
+            time.sleep(0.1)
+            yield port
+        finally:
+            for client in clients:
+                client.close()
+
+
+def scan(no_trace, hosts, ports, concurrency=50, timeout=0.3):
+    async def collect():
+        return [r async for r in no_trace.scan_ports(iter(hosts), ports, concurrency, timeout, only_open=False)]
+    return {(r["host"], r["port"]): r["state"] for r in asyncio.run(collect())}
+
+
+def test_open_closed_and_timed_out_ports(no_trace):
+    refused = closed_port()
+    with listener() as open_port, unresponsive_port() as silent:
+        states = scan(no_trace, ["127.0.0.1"], [open_port, refused, silent])
+    assert states == {("127.0.0.1", open_port): "open", ("127.0.0.1", refused): "closed",
+                      ("127.0.0.1", silent): "filtered"}
+
+
+def test_timed_out_probes_give_up_after_timeout(no_trace):
+    with unresponsive_port() as silent:
+        started = time.perf_counter()
+        states = scan(no_trace, ["127.0.0.1"], [silent], timeout=0.2)
+        elapsed = time.perf_counter() - started
+    assert states[("127.0.0.1", silent)] == "filtered"
+    assert 0.2 <= elapsed < 1.0
+
+
+def test_concurrency_cap_bounds_probes_in_flight(no_trace, monkeypatch):
+    in_flight, peak = 0, 0
+    real_probe = no_trace.probe_port
+
+    async def counting_probe(host, port, timeout):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await real_probe(host, port, timeout)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(no_trace, "probe_port", counting_probe)
+    with contextlib.ExitStack() as stack:
+        silent = [stack.enter_context(unresponsive_port()) for _ in range(4)]
+        started = time.perf_counter()
+        states = scan(no_trace, ["127.0.0.1"], silent + [closed_port()], concurrency=3, timeout=0.2)
+        elapsed = time.perf_counter() - started
+    assert len(states) == 5
+    assert list(states.values()).count("filtered") == 4
+    assert peak == 3
+    # Four probes that each wait out the timeout, at most three at a time, need two rounds
+    assert elapsed >= 0.4
+
+
+def test_concurrency_is_capped_below_the_open_file_limit(no_trace):
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (200, hard))
+    try:
+        assert no_trace._scan_concurrency(10000) == 200 - 64
+        assert no_trace._scan_concurrency(10) == 10
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+def test_reachability_scan_reports_only_open_ports(no_trace, capsys):
+    refused = closed_port("127.0.0.2")
+    with listener("127.0.0.2") as open_port:
+        found = no_trace.run_reachability_scan("127.0.0.2/31", f"{open_port},{refused}",
+                                               concurrency=4, timeout=0.5)
+    assert [(r["host"], r["port"]) for r in found] == [("127.0.0.2", open_port)]
+    assert f"127.0.0.2:{open_port} open" in capsys.readouterr().out
+
+
+def test_hosts_are_drawn_lazily(no_trace):
+    drawn = 0
+
+    def hosts():
+        nonlocal drawn
+        for i in range(1, 100000):
+            drawn += 1
+            yield "127.0.%d.%d" % (i // 256, i % 256)
+
+    async def first_result():
+        results = no_trace.scan_ports(hosts(), [closed_port()], concurrency=4, timeout=0.3, only_open=False)
+        try:
+            return await results.__anext__()
+        finally:
+            await results.aclose()
+
+    assert asyncio.run(first_result())["state"] == "closed"
+    # Only the hosts already handed to the four workers (plus the queue slack) have been read
+    assert drawn < 20
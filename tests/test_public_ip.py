@@ -0,0 +1,110 @@
+import contextlib
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        behaviour = self.server.behaviour
+        self.server.hits += 1
+        time.sleep(behaviour.get("delay", 0))
+        body = behaviour["body"].encode()
+        self.send_response(behaviour.get("status", 200))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def endpoints(*behaviours):
+    """One HTTP stand-in on 127.0.0.1 per behaviour ({body, delay, status}); yields (urls, servers)."""
+    servers = []
+    try:
+        for behaviour in behaviours:
+            server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+            server.daemon_threads = True
+            server.behaviour, server.hits = behaviour, 0
+            threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+            servers.append(server)
+        yield [f"http://127.0.0.1:{s.server_address[1]}/" for s in servers], servers
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def hits(servers):
+    return sum(server.hits for server in servers)
+
+
+def test_quorum_returns_without_waiting_for_a_slow_endpoint(no_trace):
+    with endpoints({"body": "198.51.100.7\n"}, {"body": json.dumps({"ip": "198.51.100.7"})},
+                   {"body": "198.51.100.7", "delay": 1.5}) as (urls, _):
+        resolver = no_trace.PublicIpResolver(urls, timeout=3.0, quorum=2)
+        started = time.perf_counter()
+        result = resolver.resolve()
+        elapsed = time.perf_counter() - started
+    assert result["ip"] == "198.51.100.7"
+    assert result["consistent"] is True
+    assert sorted(result["sources"]) == sorted(urls[:2])
+    assert elapsed < 1.0
+
+
+def test_disagreeing_endpoints_are_unconfirmed(no_trace):
+    with endpoints({"body": "203.0.113.1"}, {"body": "203.0.113.2"}, {"body": "not an address"},
+                   {"body": "oops", "status": 500}) as (urls, _):
+        result = no_trace.PublicIpResolver(urls, timeout=2.0, quorum=2).resolve()
+    assert result["ip"] in ("203.0.113.1", "203.0.113.2")
+    assert result["consistent"] is False
+    assert len(result["sources"]) == 1
+    assert set(result["errors"]) == set(urls[2:])
+
+
+def test_single_endpoint_needs_no_second_opinion(no_trace):
+    with endpoints({"body": "2001:db8::1"}) as (urls, _):
+        result = no_trace.PublicIpResolver(urls, quorum=3).resolve()
+    assert (result["ip"], result["consistent"]) == ("2001:db8::1", True)
+
+
+def test_answers_are_cached_for_the_ttl(no_trace):
+    with endpoints({"body": "198.51.100.9"}, {"body": "198.51.100.9"}) as (urls, servers):
+        resolver = no_trace.PublicIpResolver(urls, timeout=2.0, ttl=0.3, quorum=2)
+        first = resolver.resolve()
+        count = hits(servers)
+        second = resolver.resolve()
+        assert hits(servers) == count
+        time.sleep(0.35)
+        third = resolver.resolve()
+        assert hits(servers) > count
+    assert (first["cached"], second["cached"], third["cached"]) == (False, True, False)
+    assert second["ip"] == "198.51.100.9"
+
+
+def test_invalidate_and_force_skip_the_cache(no_trace):
+    with endpoints({"body": "198.51.100.10"}) as (urls, servers):
+        resolver = no_trace.PublicIpResolver(urls, timeout=2.0, ttl=60, quorum=1)
+        resolver.resolve()
+        servers[0].behaviour = {"body": "198.51.100.11"}
+        assert resolver.resolve()["ip"] == "198.51.100.10"
+        resolver.invalidate()
+        assert resolver.resolve()["ip"] == "198.51.100.11"
+        servers[0].behaviour = {"body": "198.51.100.12"}
+        assert resolver.resolve(force=True)["ip"] == "198.51.100.12"
+    assert hits(servers) == 3
+
+
+def test_failures_are_not_cached(no_trace):
+    with endpoints({"body": "", "status": 503}) as (urls, servers):
+        resolver = no_trace.PublicIpResolver(urls, timeout=1.0, ttl=60, quorum=1)
+        assert resolver.resolve()["ip"] is None
+        assert resolver.resolve()["ip"] is None
+    assert hits(servers) == 2
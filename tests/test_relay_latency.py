@@ -0,0 +1,134 @@
+import asyncio
+import contextlib
+import socket
+import time
+
+
+@contextlib.contextmanager
+def listeners(count):
+    """count listening TCP sockets on 127.0.0.1; yields their ports."""
+    socks = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(("127.0.0.1", 0))
+            sock.listen(16)
+            socks.append(sock)
+        yield [sock.getsockname()[1] for sock in socks]
+    finally:
+        for sock in socks:
+            sock.close()
+
+
+def relay(name, port, ipv4="127.0.0.1"):
+    return {"hostname": name, "country": "se", "city": "got", "ipv4": ipv4, "port": port}
+
+
+class DelayedProbe:
+    """Real TCP probe to the local listeners plus an injected delay per port.
+
+    Ports missing from delays are treated as unreachable. Tracks how many
+    probes are in flight at once and how often each port was probed.
+    """
+    def __init__(self, no_trace, delays):
+        self.no_trace = no_trace
+        self.delays = delays
+        self.in_flight = self.peak = 0
+        self.calls = {}
+
+    async def __call__(self, host, port, timeout):
+        self.calls[port] = self.calls.get(port, 0) + 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            measured = await self.no_trace.tcp_connect_probe(host, port, timeout)
+            if port not in self.delays or measured is None:
+                return None
+            await asyncio.sleep(self.delays[port])
+            return measured + self.delays[port]
+        finally:
+            self.in_flight -= 1
+
+
+def test_tcp_probe_measures_listeners_and_refusals(no_trace):
+    with listeners(1) as (port,):
+        assert asyncio.run(no_trace.tcp_connect_probe("127.0.0.1", port, 1.0)) < 0.5
+    # Refused connections still prove the host answered
+    assert asyncio.run(no_trace.tcp_connect_probe("127.0.0.1", port, 1.0)) is not None
+
+
+def test_rank_orders_by_latency_and_cuts_to_top_n(no_trace):
+    with listeners(4) as ports:
+        relays = [relay(f"se-got-wg-00{i}", port) for i, port in enumerate(ports)]
+        relays.append(relay("se-got-wg-noip", ports[0], ipv4=None))
+        probe = DelayedProbe(no_trace, {ports[0]: 0.09, ports[1]: 0.01, ports[2]: 0.05})
+        prober = no_trace.RelayProber(probe=probe, timeout=1.0)
+        assert [r["hostname"] for r in asyncio.run(prober.rank(relays, top_n=2))] == ["se-got-wg-001", "se-got-wg-002"]
+        everything = asyncio.run(prober.rank(relays))
+    assert [r["hostname"] for r in everything] == ["se-got-wg-001", "se-got-wg-002", "se-got-wg-000"]
+
+
+def test_each_relay_keeps_its_best_attempt(no_trace):
+    samples = iter([0.3, 0.1, 0.2])
+
+    async def probe(host, port, timeout):
+        return next(samples)
+
+    prober = no_trace.RelayProber(probe=probe, attempts=3)
+    [(_, latency)] = asyncio.run(prober.measure([relay("se-got-wg-001", 1)]))
+    assert latency == 0.1
+
+
+def test_semaphore_caps_concurrent_probes(no_trace):
+    with listeners(10) as ports:
+        probe = DelayedProbe(no_trace, {port: 0.05 for port in ports})
+        prober = no_trace.RelayProber(probe=probe, concurrency=3, attempts=2, timeout=1.0)
+        started = time.perf_counter()
+        ranked = asyncio.run(prober.rank([relay(f"r{i}", port) for i, port in enumerate(ports)]))
+        elapsed = time.perf_counter() - started
+    assert len(ranked) == 10
+    assert probe.peak == 3
+    assert all(count == 2 for count in probe.calls.values())
+    # 20 probes of 50 ms, three relays at a time
+    assert elapsed >= 0.2
+
+
+def test_selector_reprobes_after_probe_interval(no_trace):
+    with listeners(3) as ports:
+        relays = [relay(f"se-got-wg-00{i}", port) for i, port in enumerate(ports)]
+        probe = DelayedProbe(no_trace, {ports[0]: 0.03, ports[1]: 0.01, ports[2]: 0.02})
+        selector = no_trace.LatencySelector(relays, no_trace.RelayProber(probe=probe, attempts=1, timeout=1.0),
+                                            top_n=2, probe_interval=0.3)
+
+        async def scenario():
+            first = await selector.servers()
+            cached = await selector.servers()
+            calls_before_expiry = sum(probe.calls.values())
+            probe.delays = {ports[0]: 0.0, ports[1]: 0.04, ports[2]: 0.02}
+            await asyncio.sleep(0.35)
+            return first, cached, calls_before_expiry, await selector.servers()
+
+        first, cached, calls, after = asyncio.run(scenario())
+    assert first == cached == ["se got se-got-wg-001", "se got se-got-wg-002"]
+    assert calls == 3
+    assert sum(probe.calls.values()) == 6
+    assert after == ["se got se-got-wg-000", "se got se-got-wg-002"]
+
+
+def test_selector_keeps_last_ranking_when_nothing_answers(no_trace):
+    with listeners(2) as ports:
+        relays = [relay(f"se-got-wg-00{i}", port) for i, port in enumerate(ports)]
+        probe = DelayedProbe(no_trace, {})
+        selector = no_trace.LatencySelector(relays, no_trace.RelayProber(probe=probe, attempts=1),
+                                            top_n=1, probe_interval=0)
+
+        async def scenario():
+            fallback = await selector.servers()
+            probe.delays = {ports[1]: 0.0}
+            ranked = await selector.servers()
+            probe.delays = {}
+            return fallback, ranked, await selector.servers()
+
+        fallback, ranked, kept = asyncio.run(scenario())
+    assert fallback == ["se got se-got-wg-000"]
+    assert ranked == kept == ["se got se-got-wg-001"]
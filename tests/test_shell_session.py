@@ -0,0 +1,85 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32" or shutil.which("bash") is None,
+                                reason="shell sessions need bash")
+
+
+@pytest.fixture
+def session(no_trace):
+    shell = no_trace.ShellSession()
+    yield shell
+    shell.close()
+
+
+def process_gone(pid, wait=3.0):
+    """True once pid has exited (a zombie waiting for a reaper counts as exited)."""
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+            with open(f"/proc/{pid}/stat") as f:
+                if f.read().rsplit(")", 1)[1].split()[0] == "Z":
+                    return True
+        except (ProcessLookupError, FileNotFoundError):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_output_is_framed_by_sentinels(session):
+    result = session.run_batch(["printf 'one\\ntwo\\n'; echo '__NO_TRACE_not_a_sentinel__ 9'"])[0]
+    assert result.returncode == 0
+    assert result.stdout == "one\ntwo\n__NO_TRACE_not_a_sentinel__ 9\n"
+    assert result.stderr == ""
+
+
+def test_output_without_trailing_newline(session):
+    result = session.run_batch(["printf out; printf err >&2"])[0]
+    assert (result.stdout, result.stderr) == ("out", "err")
+
+
+def test_non_zero_exit_codes_keep_the_session(session):
+    shell_pid = session.proc.pid
+    results = session.run_batch(["false", "exit 7", "echo still here"])
+    assert [r.returncode for r in results] == [1, 7, 0]
+    assert results[2].stdout == "still here\n"
+    assert session.proc.pid == shell_pid
+
+
+def test_batch_results_keep_command_order(session):
+    commands = ["echo first", "echo second >&2; exit 2", "sleep 0.1; echo third", "echo fourth"]
+    results = session.run_batch(commands)
+    assert [r.args for r in results] == commands
+    assert [(r.returncode, r.stdout, r.stderr) for r in results] == [
+        (0, "first\n", ""), (2, "", "second\n"), (0, "third\n", ""), (0, "fourth\n", "")
+    ]
+
+
+def test_timeout_kills_the_command_and_respawns(session, tmp_path):
+    pid_file = tmp_path / "child.pid"
+    shell_pid = session.proc.pid
+    with pytest.raises(subprocess.TimeoutExpired):
+        session.run_batch([f"sleep 37 & echo $! > {pid_file}; wait"], timeout=0.5)
+    child = int(pid_file.read_text())
+    assert process_gone(child)
+    assert process_gone(shell_pid)
+    assert session.proc.pid != shell_pid
+    assert session.run_batch(["echo alive"])[0].stdout == "alive\n"
+
+
+def test_dead_shell_is_respawned_and_the_command_retried(session):
+    session.proc.kill()
+    session.proc.wait()
+    result = session.run_batch(["echo again"])[0]
+    assert (result.returncode, result.stdout) == (0, "again\n")
+
+
+def test_run_command_strips_output_and_reports_failures(no_trace):
+    assert no_trace.run_command("echo '  padded  '") == "padded"
+    assert no_trace.run_command("echo oops >&2; exit 3") is None